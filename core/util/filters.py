@@ -19,6 +19,9 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import bisect
+from collections import deque
+
 import numpy as np
 from scipy.ndimage import minimum_filter1d, maximum_filter1d
 
@@ -62,3 +65,57 @@ def scan_blink_correction(image, axis=1):
         np.flip(filt_img, axis), size=2, axis=axis, mode='constant', cval=median)
     # Flip back the image to obtain original orientation and return result.
     return np.flip(filt_img, axis)
+
+
+class RunningMedian:
+    """
+    Median of the last <window> values of one or more channels, updated value by value (e.g. to
+    smooth a count trace while it is acquired).
+
+    Every channel keeps its window in order of arrival and sorted. A new value replaces the oldest
+    one in the sorted window by bisection, so the median is available at any time without sorting
+    the window again and the cost of an update does not depend on the length of the trace.
+
+    @param int channels: number of channels
+    @param int window: number of values the median is taken of
+    @param numpy.ndarray initial: optional, shape (channels, n), values to start with (the last
+                                  <window> of them are used)
+    """
+
+    def __init__(self, channels, window, initial=None):
+        self.channels = int(channels)
+        self.window = max(int(window), 1)
+        self._values = [deque() for _ in range(self.channels)]
+        self._sorted = [list() for _ in range(self.channels)]
+        self._median = np.zeros(self.channels)
+        if initial is not None:
+            for values in np.asarray(initial)[:, -self.window:].T:
+                self.add(values)
+
+    def add(self, values):
+        """ Add one value per channel, dropping the oldest values once the window is full.
+
+        @param values: array of shape (channels,)
+
+        @return numpy.ndarray: the median of every channel, shape (channels,). Only valid until the
+                               next call.
+        """
+        for channel, value in enumerate(values):
+            value = float(value)
+            arrived = self._values[channel]
+            window = self._sorted[channel]
+            if len(arrived) == self.window:
+                del window[bisect.bisect_left(window, arrived.popleft())]
+            arrived.append(value)
+            bisect.insort(window, value)
+            middle = len(window) // 2
+            if len(window) % 2 == 1:
+                self._median[channel] = window[middle]
+            else:
+                self._median[channel] = (window[middle - 1] + window[middle]) / 2
+        return self._median
+
+    @property
+    def median(self):
+        """ numpy.ndarray: the current median of every channel. """
+        return self._median
@@ -22,6 +22,8 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import numpy as np
 from scipy import signal
 
+from core.util.ring_buffer import RingBuffer
+
 
 def get_ft_windows():
     """ Retrieve the available windows to be applied on signal data before FT.
@@ -160,3 +162,134 @@ def compute_ft(x_val, y_val, zeropad_num=0, window='none', base_corr=True, psd=F
     fft_x = np.fft.fftfreq(len(zeropad_arr), d=x_spacing)
 
     return abs(fft_x[:middle]), fft_y[:middle]
+
+
+class RunningStatistics:
+    """ Online mean and variance (Welford's algorithm) of a stream of samples.
+
+    The statistics are kept element-wise for an array of the given shape, so that e.g. every point
+    of a sweep has its own mean, variance and number of samples. Adding a sample costs O(size of
+    the sample) and does not need the previous samples.
+
+    @param shape: shape of the accumulated array (int or tuple of int)
+    """
+
+    def __init__(self, shape):
+        self.count = np.zeros(shape, dtype=np.int64)
+        # The mean array is updated in place, views on it stay up to date.
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self._m2 = np.zeros(shape, dtype=np.float64)
+
+    def add(self, value, index=Ellipsis):
+        """ Add one sample.
+
+        @param value: sample value(s), broadcastable to the array selected by index
+        @param index: optional, index of the array elements the sample belongs to, e.g. the point
+                      index along a sweep. Default: the whole array.
+        """
+        count = self.count[index] + 1
+        delta = value - self.mean[index]
+        self.mean[index] += delta / count
+        self._m2[index] += delta * (value - self.mean[index])
+        self.count[index] = count
+
+    @property
+    def variance(self):
+        """ Sample variance (ddof=1), NaN where fewer than two samples were added. """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, self._m2 / (self.count - 1), np.nan)
+
+    @property
+    def standard_error(self):
+        """ Standard error of the mean, NaN where fewer than two samples were added. """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(self.variance / self.count)
+
+
+class SlidingWindowStatistics:
+    """ Mean and standard error of the last <window> lines of a stream of lines, or of all lines.
+
+    After every line the cumulative sums of the lines and of their squares are stored in a ring
+    buffer. The sums over the last n lines are the difference of the newest cumulative sums and the
+    ones n lines back, so adding a line and changing the window (also to a longer one) both cost
+    O(line size), the earlier lines are never read again. The lines are summed relative to the first
+    line, which keeps the cancellation in the variance small for lines with a large offset (e.g.
+    count rates).
+
+    @param int capacity: number of lines back the window can reach with cumulative sums held in memory
+    @param shape: shape of one line (int or tuple of int)
+    @param bool spill: optional, keep the older cumulative sums in a temporary file so that the window
+                       can reach back to the first line
+    """
+
+    def __init__(self, capacity, shape, spill=False):
+        self.line_shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        # cumulative sums of (line - offset) and (line - offset)**2, the newest first
+        self._sums = RingBuffer(capacity + 1, (2,) + self.line_shape, spill=spill)
+        self._offset = None
+        # number of lines to average, 0 means all
+        self.window = 0
+
+    @property
+    def total(self):
+        """ int: number of lines added. """
+        return self._sums.total
+
+    @property
+    def count(self):
+        """ int: number of lines in the window (limited by the lines that were kept). """
+        count = self.total if self.window <= 0 else min(self.window, self.total)
+        # the sums before the window are needed unless the window starts at the first line
+        if count < self.total:
+            count = min(count, len(self._sums) + self._sums.spilled - 1)
+        return count
+
+    def set_window(self, window):
+        """ Set the number of lines to average, 0 for all lines. """
+        self.window = max(int(window), 0)
+        return
+
+    def add(self, line):
+        """ Add one line as the newest one. """
+        if self._offset is None:
+            self._offset = np.array(line, dtype=np.float64)
+            sums = np.zeros((2,) + self.line_shape)
+        else:
+            delta = line - self._offset
+            sums = self._sums.get_line(0) + (delta, delta ** 2)
+        self._sums.append(sums)
+        return
+
+    @property
+    def mean(self):
+        """ Mean of the lines in the window, zero if no line was added. """
+        count = self.count
+        if count == 0:
+            return np.zeros(self.line_shape)
+        return self._offset + self._window_sums(count)[0] / count
+
+    @property
+    def standard_error(self):
+        """ Standard error of the mean of the lines in the window, NaN for fewer than two lines. """
+        count = self.count
+        if count < 2:
+            return np.full(self.line_shape, np.nan)
+        window_sum, window_sum_squares = self._window_sums(count)
+        variance = (window_sum_squares - window_sum ** 2 / count) / (count - 1)
+        return np.sqrt(np.maximum(variance, 0) / count)
+
+    def clear(self):
+        """ Drop all lines. """
+        self._sums.clear()
+        self._offset = None
+        return
+
+    def close(self):
+        """ Delete the spill file. """
+        self._sums.close()
+        return
+
+    def _window_sums(self, count):
+        if count == self.total:
+            return self._sums.get_line(0)
+        return self._sums.get_line(0) - self._sums.get_line(count)
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a rate limited channel for plot updates from logic modules to GUIs, which
+coalesces bursts of updates (latest wins) so that the GUI never falls behind the acquisition.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from qtpy import QtCore
+
+
+class PlotUpdate:
+    """ The pending update of a channel: the data of the latest post and the regions changed by all
+    posts since the last delivered update.
+
+    @param str channel: name of the channel
+    @param tuple data: the arguments handed to the receiving slots
+    @param tuple changed: (start, stop) index range changed by the post, None if everything changed
+    """
+
+    def __init__(self, channel, data, changed=None):
+        self.channel = channel
+        self.data = data
+        # list of disjoint (start, stop) index ranges, None if everything changed
+        self.changed = None if changed is None else [tuple(changed)]
+        # number of posts merged into this update in addition to the first one
+        self.merged = 0
+        # time of the first post, for the latency of the update
+        self.posted = time.perf_counter()
+
+    def merge(self, data, changed=None):
+        """ Replace the data by the one of a newer post and add its changed range. """
+        self.data = data
+        if self.changed is None or changed is None:
+            self.changed = None
+        else:
+            ranges = sorted(self.changed + [tuple(changed)])
+            self.changed = [ranges[0]]
+            for start, stop in ranges[1:]:
+                if start <= self.changed[-1][1]:
+                    self.changed[-1] = (self.changed[-1][0], max(stop, self.changed[-1][1]))
+                else:
+                    self.changed.append((start, stop))
+        self.merged += 1
+        return
+
+
+class PlotUpdateBus(QtCore.QObject):
+    """ Rate limited, coalescing channel for plot updates from a logic module to its GUIs.
+
+    The logic posts every new data set with post(channel, *data) instead of emitting its plot signal
+    directly. Posts are delivered at most <max_rate> times per second; posts arriving in between
+    are merged into the pending update of their channel, which keeps the latest data and the union
+    of the changed index ranges (latest wins).
+
+    The GUI connects its slots with connect(channel, slot) instead of connecting to the logic
+    signal. A new update of a channel is only sent when all its receivers have handled the previous
+    one, so that updates never queue up in the GUI thread, however fast the acquisition is.
+
+    Channels can also forward every delivered update to a signal (e.g. the former plot signal of the
+    logic, for other modules or scripts connected to it), rate limited but without waiting for its
+    receivers.
+
+    Logic modules which keep their data in buffers they overwrite (e.g. circular buffers) must not
+    post views of them, the GUI would draw memory the logic is writing. Such channels get a
+    snapshot function instead, which the bus calls in its own thread when an update is delivered
+    and which returns the data for the receivers, e.g. copies in preallocated display arrays. The
+    snapshot is taken only when all receivers are done with the previous update, so the display
+    arrays can be reused for every other update. The forward signal then gets a copy of the
+    snapshot, made only if the signal is connected (the bus must be a child of the signal owner).
+
+    Create the bus in on_activate of the logic, so that it lives in the thread of the logic.
+
+    @param float max_rate: maximum number of updates per second and channel, 0 for no limit
+    @param QtCore.QObject parent: optional, parent of the bus, usually the logic module
+    """
+    sigUpdate = QtCore.Signal(object)
+    _sigAcknowledged = QtCore.Signal(str)
+    _sigSchedule = QtCore.Signal()
+
+    def __init__(self, max_rate=20., parent=None):
+        super().__init__(parent)
+        self._lock = threading.RLock()
+        self._max_rate = 0.
+        self.max_rate = max_rate
+        self._pending = OrderedDict()
+        self._forward = dict()
+        self._snapshot = dict()
+        self._receivers = dict()
+        # channel -> number of receivers which have not handled the last update yet
+        self._in_flight = dict()
+        self._last_flush = -math.inf
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._schedule)
+        self._sigAcknowledged.connect(self._acknowledged, QtCore.Qt.QueuedConnection)
+        self._sigSchedule.connect(self._schedule, QtCore.Qt.QueuedConnection)
+        self.reset_statistics()
+
+    @property
+    def max_rate(self):
+        return self._max_rate
+
+    @max_rate.setter
+    def max_rate(self, value):
+        self._max_rate = max(float(value), 0.)
+
+    def add_channel(self, channel, forward=None, snapshot=None):
+        """ Declare a channel and optionally a signal to emit with the data of every update.
+
+        @param str channel: name of the channel
+        @param QtCore.SignalInstance forward: optional, emitted with the data of every update
+        @param callable snapshot: optional, called as snapshot(*data) with the data of the latest
+                                  post when an update is delivered, returns the data handed to
+                                  the receivers. The returned arrays must not be written again
+                                  until the next but one call.
+        """
+        with self._lock:
+            self._forward[channel] = forward
+            self._snapshot[channel] = snapshot
+            self._receivers.setdefault(channel, list())
+        return
+
+    def connect(self, channel, slot, with_changes=False):
+        """ Call slot with the data of every update of channel, in the thread calling this method
+        (i.e. call it from the GUI thread).
+
+        @param str channel: name of the channel
+        @param callable slot: called as slot(*data)
+        @param bool with_changes: optional, call slot(*data, changed=changed) with the list of
+                                  changed (start, stop) index ranges (None: everything changed)
+        """
+        receiver = _UpdateReceiver(self, channel, slot, with_changes)
+        self.sigUpdate.connect(receiver.receive, QtCore.Qt.QueuedConnection)
+        with self._lock:
+            self._receivers.setdefault(channel, list()).append(receiver)
+        return
+
+    def disconnect(self, channel=None):
+        """ Disconnect all the slots of a channel.
+
+        @param str channel: optional, name of the channel. Default: all channels
+        """
+        with self._lock:
+            channels = list(self._receivers) if channel is None else [channel]
+            for name in channels:
+                for receiver in self._receivers.get(name, list()):
+                    self.sigUpdate.disconnect(receiver.receive)
+                self._receivers[name] = list()
+                self._in_flight.pop(name, None)
+        return
+
+    def post(self, channel, *data, changed=None):
+        """ Hand over the latest data of a channel, to be delivered with the next update.
+
+        @param str channel: name of the channel
+        @param data: the arguments of the receiving slots
+        @param tuple changed: optional, (start, stop) index range which changed. Default:
+                              everything changed
+        """
+        with self._lock:
+            self.statistics['posted'] += 1
+            update = self._pending.get(channel)
+            if update is None:
+                self._pending[channel] = PlotUpdate(channel, data, changed)
+            else:
+                update.merge(data, changed)
+                self.statistics['merged'] += 1
+        self._request_schedule()
+        return
+
+    def flush(self):
+        """ Deliver the pending updates now, regardless of the rate limit (e.g. at the end of a
+        measurement). Updates of channels whose receivers are still busy follow as soon as they are
+        done.
+        """
+        if QtCore.QThread.currentThread() is not self.thread():
+            self._sigSchedule.emit()
+            return
+        self._timer.stop()
+        self._deliver()
+        return
+
+    def clear(self):
+        """ Drop the pending updates (counted as dropped) and stop waiting for busy receivers. """
+        with self._lock:
+            for update in self._pending.values():
+                self.statistics['dropped'] += update.merged + 1
+            self._pending.clear()
+            self._in_flight.clear()
+        if QtCore.QThread.currentThread() is self.thread():
+            self._timer.stop()
+        return
+
+    def reset_statistics(self):
+        """ Reset the update counts: posted, delivered updates, posts merged into a later update and
+        posts dropped without being delivered, and the latency of the updates. """
+        self.statistics = {'posted': 0, 'delivered': 0, 'merged': 0, 'dropped': 0,
+                           'mean_latency': math.nan, 'max_latency': math.nan}
+        return
+
+    def statistics_message(self):
+        """ The statistics as one line for the log. """
+        stats = self.statistics
+        return ('{0:d} posted, {1:d} delivered, {2:d} merged, {3:d} dropped, latency {4:.3f} s (mean), '
+                '{5:.3f} s (max)'.format(stats['posted'], stats['delivered'], stats['merged'], stats['dropped'],
+                                         stats['mean_latency'], stats['max_latency']))
+
+    def acknowledge(self, channel):
+        """ Called by the receivers (in any thread) when they handled an update. """
+        self._sigAcknowledged.emit(channel)
+        return
+
+    def _request_schedule(self):
+        if QtCore.QThread.currentThread() is self.thread():
+            self._schedule()
+        else:
+            self._sigSchedule.emit()
+        return
+
+    @QtCore.Slot()
+    def _schedule(self):
+        """ Deliver the pending updates if the rate limit allows it, otherwise start the timer for
+        the next update.
+        """
+        with self._lock:
+            if not any(self._in_flight.get(channel, 0) == 0 for channel in self._pending):
+                return
+            wait_time = self._last_flush + (1 / self._max_rate if self._max_rate > 0 else 0) - time.perf_counter()
+        if wait_time <= 0:
+            self._deliver()
+        elif not self._timer.isActive():
+            self._timer.start(int(math.ceil(wait_time * 1000)))
+        return
+
+    def _deliver(self):
+        now = time.perf_counter()
+        deliver = list()
+        with self._lock:
+            for channel in list(self._pending):
+                if self._in_flight.get(channel, 0) > 0:
+                    continue
+                update = self._pending.pop(channel)
+                receivers = len(self._receivers.get(channel, ()))
+                forward = self._forward.get(channel)
+                if receivers == 0 and forward is None:
+                    self.statistics['dropped'] += update.merged + 1
+                    continue
+                self._in_flight[channel] = receivers
+                deliver.append((update, receivers, forward))
+                self._add_latency(now - update.posted)
+            if deliver:
+                self._last_flush = now
+        for update, receivers, forward in deliver:
+            snapshot = self._snapshot.get(update.channel)
+            if forward is not None and not self._is_connected(forward):
+                forward = None
+            if snapshot is not None and (receivers > 0 or forward is not None):
+                update.data = snapshot(*update.data)
+            if receivers > 0:
+                self.sigUpdate.emit(update)
+            if forward is not None:
+                # the snapshot is reused, receivers which do not acknowledge get their own copy
+                forward.emit(*(_copy_data(update.data) if snapshot is not None else update.data))
+        return
+
+    def _is_connected(self, signal):
+        """ Whether a signal of the parent has receivers. True if the bus has no parent. """
+        parent = self.parent()
+        if parent is None:
+            return True
+        try:
+            return parent.receivers(signal) > 0
+        except TypeError:
+            return True
+
+    def _add_latency(self, latency):
+        stats = self.statistics
+        stats['delivered'] += 1
+        if stats['delivered'] == 1:
+            stats['mean_latency'] = stats['max_latency'] = latency
+        else:
+            stats['mean_latency'] += (latency - stats['mean_latency']) / stats['delivered']
+            stats['max_latency'] = max(stats['max_latency'], latency)
+        return
+
+    @QtCore.Slot(str)
+    def _acknowledged(self, channel):
+        with self._lock:
+            if self._in_flight.get(channel, 0) > 0:
+                self._in_flight[channel] -= 1
+        self._schedule()
+        return
+
+
+def _copy_data(data):
+    """ Copy of the arrays in the data of an update, also inside tuples, lists and dicts. """
+    if isinstance(data, np.ndarray):
+        return data.copy()
+    if isinstance(data, dict):
+        return type(data)((key, _copy_data(value)) for key, value in data.items())
+    if isinstance(data, (tuple, list)):
+        return type(data)(_copy_data(value) for value in data)
+    return data
+
+
+class _UpdateReceiver(QtCore.QObject):
+    """ Calls a slot with the updates of one channel in the thread it was created in and tells the
+    bus when it is done.
+    """
+
+    def __init__(self, bus, channel, slot, with_changes=False):
+        super().__init__()
+        self._bus = bus
+        self._channel = channel
+        self._slot = slot
+        self._with_changes = with_changes
+
+    @QtCore.Slot(object)
+    def receive(self, update):
+        if update.channel != self._channel:
+            return
+        try:
+            if self._with_changes:
+                self._slot(*update.data, changed=update.changed)
+            else:
+                self._slot(*update.data)
+        finally:
+            self._bus.acknowledge(self._channel)
+        return
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains fixed capacity circular buffers for line wise acquired data (e.g. the sweeps of
+an ODMR measurement), with optional spilling of the evicted lines to disk, and for sample wise
+acquired time traces.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import tempfile
+
+import numpy as np
+
+
+class RingBuffer:
+    """ Circular buffer of the last <capacity> lines, newest line first.
+
+    Every line is written twice, at position p and p + capacity of an array of 2 * capacity lines,
+    with p running backwards. The newest n lines are then always the contiguous block [p, p + n),
+    so view() returns them without copying and appending a line costs O(line size), independent of
+    the number of lines acquired so far.
+
+    With spill=True the lines pushed out of the buffer are appended to a temporary file, so that the
+    whole history can still be read with get_lines() (e.g. to save it at the end of a measurement).
+    Without spilling only the last <capacity> lines are kept.
+
+    @param int capacity: number of lines kept in memory
+    @param shape: shape of one line (int or tuple of int)
+    @param dtype: data type of the lines
+    @param bool spill: optional, keep the evicted lines in a temporary file
+    """
+
+    def __init__(self, capacity, shape, dtype=np.float64, spill=False):
+        self.capacity = max(int(capacity), 1)
+        self.line_shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        self._buffer = np.zeros((2 * self.capacity,) + self.line_shape, dtype=dtype)
+        self._position = 0
+        # number of lines appended since the last clear, including the spilled ones
+        self.total = 0
+        self._spill_file = tempfile.TemporaryFile() if spill else None
+        self.spilled = 0
+
+    def __len__(self):
+        """ Number of lines held in memory. """
+        return min(self.total, self.capacity)
+
+    @property
+    def dtype(self):
+        return self._buffer.dtype
+
+    @property
+    def spill(self):
+        """ bool: whether the evicted lines are kept on disk. """
+        return self._spill_file is not None
+
+    def append(self, line):
+        """ Add a line as the newest one. The oldest line is dropped (or spilled) if the buffer is full.
+
+        @param line: array of the line shape (or broadcastable to it)
+        """
+        position = (self._position - 1) % self.capacity
+        if self.total >= self.capacity and self._spill_file is not None:
+            # the oldest line is at the position we are about to overwrite
+            self._spill_file.write(self._buffer[position].tobytes())
+            self.spilled += 1
+        self._buffer[position] = line
+        self._buffer[position + self.capacity] = line
+        self._position = position
+        self.total += 1
+        return
+
+    def view(self, n=None):
+        """ The newest n lines, newest first, as a view into the buffer (no copy). Lines that were
+        not acquired yet read as zero.
+
+        @param int n: optional, number of lines, at most capacity. Default: capacity.
+
+        @return numpy.ndarray: shape (n,) + line shape. Only valid until the next append.
+        """
+        n = self.capacity if n is None else min(int(n), self.capacity)
+        return self._buffer[self._position:self._position + n]
+
+    def get_lines(self, n=None):
+        """ The newest n lines, newest first, including the lines spilled to disk.
+
+        Only reads from disk (and copies) if more lines than held in memory are requested.
+
+        @param int n: optional, number of lines. Default: all lines kept.
+
+        @return numpy.ndarray: shape (m,) + line shape with m = min(n, number of lines kept)
+        """
+        kept = len(self) + self.spilled
+        n = kept if n is None else min(int(n), kept)
+        if n <= len(self):
+            return self.view(n)
+        self._spill_file.seek(0)
+        spilled = np.fromfile(self._spill_file, dtype=self.dtype, count=self.spilled * self._line_size)
+        self._spill_file.seek(0, 2)
+        spilled = spilled.reshape((self.spilled,) + self.line_shape)
+        # the spill file holds the oldest line first
+        return np.concatenate((self.view(len(self)), spilled[::-1][:n - len(self)]), axis=0)
+
+    def get_line(self, index):
+        """ A single line, index 0 being the newest one, from memory or from the spill file.
+
+        @param int index: age of the line, must be smaller than the number of lines kept
+
+        @return numpy.ndarray: the line (a view if held in memory)
+        """
+        if index < len(self):
+            return self._buffer[self._position + index]
+        spill_index = self.spilled - 1 - (index - len(self))
+        if self._spill_file is None or spill_index < 0:
+            raise IndexError('Line {0:d} is not kept, only {1:d} lines are available.'
+                             ''.format(index, len(self) + self.spilled))
+        line_bytes = self._line_size * self.dtype.itemsize
+        self._spill_file.seek(spill_index * line_bytes)
+        line = np.frombuffer(self._spill_file.read(line_bytes), dtype=self.dtype)
+        self._spill_file.seek(0, 2)
+        return line.reshape(self.line_shape)
+
+    def clear(self):
+        """ Drop all lines (also the spilled ones). """
+        self._buffer[:] = 0
+        self._position = 0
+        self.total = 0
+        self.spilled = 0
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+        return
+
+    def close(self):
+        """ Delete the spill file. The lines in memory stay readable. """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            self.spilled = 0
+        return
+
+    @property
+    def _line_size(self):
+        return int(np.prod(self.line_shape, dtype=np.int64))
+
+
+class TraceBuffer:
+    """ Circular buffer of the last <length> samples of one or more channels (e.g. a time trace),
+    oldest sample first.
+
+    Like RingBuffer, every sample is written twice, at position p and p + length of an array of
+    2 * length samples per channel. The last <length> samples are then always the contiguous block
+    [p, p + length), so view() returns them without copying and appending n samples costs O(n),
+    independent of the trace length.
+
+    @param int channels: number of channels
+    @param int length: number of samples kept per channel
+    @param dtype: data type of the samples
+    """
+
+    def __init__(self, channels, length, dtype=np.float64):
+        self.channels = max(int(channels), 0)
+        self.length = max(int(length), 1)
+        self._buffer = np.zeros((self.channels, 2 * self.length), dtype=dtype)
+        # position of the oldest sample, the next sample is written here
+        self._position = 0
+        # number of samples appended since the last clear
+        self.total = 0
+
+    def __len__(self):
+        """ Number of samples per channel held in the buffer. """
+        return min(self.total, self.length)
+
+    @property
+    def dtype(self):
+        return self._buffer.dtype
+
+    def extend(self, samples):
+        """ Append samples as the newest ones, dropping the oldest samples. If more than <length>
+        samples are given, only the last <length> of them are kept.
+
+        @param numpy.ndarray samples: shape (channels, n)
+        """
+        samples = samples[:, -self.length:]
+        n = samples.shape[1]
+        start = self._position
+        stop = start + n
+        self._buffer[:, start:stop] = samples
+        # write the mirror, the block may wrap around the end of the first half
+        if stop <= self.length:
+            self._buffer[:, start + self.length:stop + self.length] = samples
+        else:
+            split = self.length - start
+            self._buffer[:, start + self.length:] = samples[:, :split]
+            self._buffer[:, :stop - self.length] = samples[:, split:]
+        self._position = stop % self.length
+        self.total += n
+        return
+
+    def fill_last(self, n, values):
+        """ Set the last n samples of every channel to a value, e.g. a filtered value which applies
+        to the newest samples.
+
+        @param int n: number of samples, at most <length>
+        @param values: one value per channel (shape (channels,)) or a scalar for all channels
+        """
+        n = min(int(n), self.length)
+        if n <= 0:
+            return
+        if not np.isscalar(values):
+            values = np.reshape(values, (-1, 1))
+        start = self._position + self.length - n
+        stop = self._position + self.length
+        self._buffer[:, start:stop] = values
+        # write the mirror, the block may wrap around the middle of the buffer
+        if start >= self.length:
+            self._buffer[:, start - self.length:stop - self.length] = values
+        else:
+            self._buffer[:, start + self.length:] = values
+            self._buffer[:, :self._position] = values
+        return
+
+    def view(self):
+        """ The last <length> samples, oldest first, as a view into the buffer (no copy). Samples
+        that were not acquired yet read as zero.
+
+        @return numpy.ndarray: shape (channels, length). Only valid until the next extend.
+        """
+        return self._buffer[:, self._position:self._position + self.length]
+
+    def clear(self):
+        """ Set all samples to zero. """
+        self._buffer[:] = 0
+        self._position = 0
+        self.total = 0
+        return
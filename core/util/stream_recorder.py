@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains a recorder which writes continuously acquired multi channel data to raw binary
+files while it arrives, and a decimated min/max overview of the recorded data for figures.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import datetime
+import json
+import os
+
+import numpy as np
+
+
+class StreamRecorder:
+    """
+    Writes chunks of multi channel samples to raw binary files as they arrive, with a json sidecar
+    file describing the recording (channels, units, sample rate, data type and the files).
+
+    The samples are stored interleaved (sample after sample, all channels of a sample next to each
+    other) in native byte order, so every file can be read with
+    numpy.fromfile(filename, dtype).reshape(-1, channels) or memory mapped with numpy.memmap, see
+    StreamRecorder.load(). When a file reaches max_file_size bytes, the recording continues in a new
+    file <name>_part<n>.bin.
+
+    Only the current chunk is held in memory, so the length of a recording is only limited by the
+    disk space.
+
+    @param str filepath: directory of the files
+    @param str filelabel: the files are called <timestamp>_<filelabel>.bin
+    @param list channels: names of the channels
+    @param float sample_rate: samples per second and channel
+    @param dict metadata: optional, json serializable description of the recording (e.g. units)
+    @param int max_file_size: optional, maximum size of one file in bytes, 0 for no limit
+    @param dtype: optional, data type of the stored samples
+    """
+
+    def __init__(self, filepath, filelabel, channels, sample_rate, metadata=None, max_file_size=0,
+                 dtype=np.float64):
+        self.channels = list(channels)
+        self.dtype = np.dtype(dtype)
+        self._sample_size = self.dtype.itemsize * max(len(self.channels), 1)
+        # whole samples per file
+        self.max_samples_per_file = max(int(max_file_size) // self._sample_size, 1) if max_file_size > 0 else 0
+        # samples written into all files
+        self.total = 0
+
+        timestamp = datetime.datetime.now()
+        basename = os.path.join(filepath, timestamp.strftime('%Y%m%d-%H%M-%S') + '_' + filelabel)
+        self._basename = basename
+        # Never overwrite the files of a recording started in the same second
+        counter = 1
+        while os.path.exists(self._basename + '.bin'):
+            self._basename = '{0}_{1}'.format(basename, counter)
+            counter += 1
+        self.metadata = {'channels': self.channels,
+                         'sample_rate': sample_rate,
+                         'dtype': self.dtype.str,
+                         'layout': 'samples x channels',
+                         'started': timestamp.isoformat(),
+                         'finished': False,
+                         'files': list()}
+        if metadata is not None:
+            self.metadata.update(metadata)
+        # transposed copy of the current chunk, reused for every chunk
+        self._chunk_buffer = np.empty((0, len(self.channels)), dtype=self.dtype)
+        self._file = None
+        self._file_samples = 0
+        self._open_next_file()
+
+    @property
+    def filename(self):
+        """ str: the file currently written. """
+        return self.metadata['files'][-1]['filename']
+
+    @property
+    def metadata_filename(self):
+        return self._basename + '_metadata.json'
+
+    @property
+    def filenames(self):
+        """ list: all the files of the recording, in order. """
+        return [os.path.join(os.path.dirname(self._basename), entry['filename'])
+                for entry in self.metadata['files']]
+
+    def write(self, data):
+        """ Append a chunk of samples to the recording.
+
+        @param numpy.ndarray data: shape (channels, n)
+        """
+        if self._file is None:
+            raise ValueError('Can not write into a closed recording.')
+        samples = data.shape[1]
+        if self._chunk_buffer.shape[0] < samples:
+            self._chunk_buffer = np.empty((samples, len(self.channels)), dtype=self.dtype)
+        chunk = self._chunk_buffer[:samples]
+        np.copyto(chunk, data.T, casting='unsafe')
+        start = 0
+        while start < samples:
+            if self.max_samples_per_file > 0:
+                if self._file_samples >= self.max_samples_per_file:
+                    self._open_next_file()
+                stop = min(samples, start + self.max_samples_per_file - self._file_samples)
+            else:
+                stop = samples
+            chunk[start:stop].tofile(self._file)
+            self._file_samples += stop - start
+            self.metadata['files'][-1]['samples'] = self._file_samples
+            start = stop
+        self.total += samples
+        return
+
+    def flush(self, metadata=True):
+        """ Write the buffered samples to disk and update the metadata file.
+
+        @param bool metadata: optional, False to only write the samples, e.g. to map them while
+                              recording
+        """
+        if self._file is not None:
+            self._file.flush()
+        if metadata:
+            self._write_metadata()
+        return
+
+    def close(self, **metadata):
+        """ Close the file and mark the recording as finished, optionally with additional metadata
+        (e.g. the stop time).
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.metadata.update(metadata)
+        self.metadata['finished'] = True
+        self._write_metadata()
+        return
+
+    @classmethod
+    def load(cls, metadata_filename, mmap_mode='r'):
+        """ Open the files of a recording as memory mapped arrays, without reading them.
+
+        @param str metadata_filename: the json file of the recording
+        @param str mmap_mode: optional, numpy.memmap mode, None to read the files into memory
+
+        @return tuple(dict, list): the metadata and one array of shape (samples, channels) per file
+        """
+        with open(metadata_filename, 'r') as file:
+            metadata = json.load(file)
+        directory = os.path.dirname(metadata_filename)
+        dtype = np.dtype(metadata['dtype'])
+        shape = (-1, len(metadata['channels']))
+        parts = list()
+        for entry in metadata['files']:
+            filename = os.path.join(directory, entry['filename'])
+            if os.path.getsize(filename) == 0:
+                parts.append(np.empty((0, shape[1]), dtype=dtype))
+            elif mmap_mode is None:
+                parts.append(np.fromfile(filename, dtype=dtype).reshape(shape))
+            else:
+                parts.append(np.memmap(filename, dtype=dtype, mode=mmap_mode).reshape(shape))
+        return metadata, parts
+
+    def _open_next_file(self):
+        if self._file is not None:
+            self._file.close()
+        part = len(self.metadata['files'])
+        filename = self._basename + ('.bin' if part == 0 else '_part{0:03d}.bin'.format(part + 1))
+        self._file = open(filename, 'wb')
+        self._file_samples = 0
+        self.metadata['files'].append({'filename': os.path.basename(filename), 'samples': 0})
+        self._write_metadata()
+        return
+
+    def _write_metadata(self):
+        # Write to a temporary file first, the metadata stays readable if we crash while writing
+        tmp_filename = self.metadata_filename + '.tmp'
+        with open(tmp_filename, 'w') as file:
+            json.dump(self.metadata, file, indent=1)
+        os.replace(tmp_filename, self.metadata_filename)
+        return
+
+
+class DecimatedOverview:
+    """
+    Minimum and maximum of every block of <block_size> samples of a stream of multi channel data,
+    updated while the data arrives, to plot the envelope of a recording of any length.
+
+    The number of blocks is kept between max_points / 2 and max_points: whenever max_points blocks
+    are complete, neighbouring blocks are merged and the block size doubles. Adding n samples costs
+    O(n), the overview needs O(max_points) memory.
+
+    @param int channels: number of channels
+    @param int max_points: optional, maximum number of blocks, even
+    """
+
+    def __init__(self, channels, max_points=4096):
+        self.channels = int(channels)
+        self.max_points = max(2 * (int(max_points) // 2), 2)
+        self._minimum = np.empty((self.channels, self.max_points))
+        self._maximum = np.empty((self.channels, self.max_points))
+        self.clear()
+
+    def clear(self):
+        self.block_size = 1
+        # number of complete blocks
+        self.blocks = 0
+        # samples added so far
+        self.total = 0
+        # the incomplete block
+        self._partial_min = np.full(self.channels, np.inf)
+        self._partial_max = np.full(self.channels, -np.inf)
+        self._partial_samples = 0
+        return
+
+    def add(self, data):
+        """ Add a chunk of samples.
+
+        @param numpy.ndarray data: shape (channels, n)
+        """
+        samples = data.shape[1]
+        self.total += samples
+        start = 0
+        while start < samples:
+            if self._partial_samples > 0 or samples - start < self.block_size:
+                # fill the incomplete block first
+                stop = min(samples, start + self.block_size - self._partial_samples)
+                np.minimum(self._partial_min, data[:, start:stop].min(axis=1), out=self._partial_min)
+                np.maximum(self._partial_max, data[:, start:stop].max(axis=1), out=self._partial_max)
+                self._partial_samples += stop - start
+                start = stop
+                if self._partial_samples == self.block_size:
+                    self._minimum[:, self.blocks] = self._partial_min
+                    self._maximum[:, self.blocks] = self._partial_max
+                    self._partial_min[:] = np.inf
+                    self._partial_max[:] = -np.inf
+                    self._partial_samples = 0
+                    self.blocks += 1
+            else:
+                # as many complete blocks at once as fit into the overview
+                count = min((samples - start) // self.block_size, self.max_points - self.blocks)
+                stop = start + count * self.block_size
+                blocks = data[:, start:stop].reshape((self.channels, count, self.block_size))
+                blocks.min(axis=2, out=self._minimum[:, self.blocks:self.blocks + count])
+                blocks.max(axis=2, out=self._maximum[:, self.blocks:self.blocks + count])
+                self.blocks += count
+                start = stop
+            if self.blocks == self.max_points:
+                self._merge_blocks()
+        return
+
+    def get_envelope(self, sample_rate=1.):
+        """ The envelope of the data added so far, including the incomplete block.
+
+        @param float sample_rate: optional, samples per second, to get the time axis in seconds
+
+        @return tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray): time of the block centers,
+            minimum and maximum of every block (shape (channels, blocks))
+        """
+        minimum = self._minimum[:, :self.blocks]
+        maximum = self._maximum[:, :self.blocks]
+        if self._partial_samples > 0:
+            minimum = np.concatenate((minimum, self._partial_min[:, np.newaxis]), axis=1)
+            maximum = np.concatenate((maximum, self._partial_max[:, np.newaxis]), axis=1)
+        times = (np.arange(minimum.shape[1]) * self.block_size + (self.block_size - 1) / 2)
+        if self._partial_samples > 0:
+            times[-1] = self.blocks * self.block_size + (self._partial_samples - 1) / 2
+        return times / sample_rate, minimum.copy(), maximum.copy()
+
+    def _merge_blocks(self):
+        half = self.max_points // 2
+        np.minimum(self._minimum[:, 0::2], self._minimum[:, 1::2], out=self._minimum[:, :half])
+        np.maximum(self._maximum[:, 0::2], self._maximum[:, 1::2], out=self._maximum[:, :half])
+        self.blocks = half
+        self.block_size *= 2
+        return
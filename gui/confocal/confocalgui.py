@@ -879,6 +879,9 @@ class ConfocalGui(GUIBase):
         self._scanning_logic.set_clock_frequency(self._sd.clock_frequency_InputWidget.value())
         self._scanning_logic.return_slowness = self._sd.return_slowness_InputWidget.value()
         self._scanning_logic.permanent_scan = self._sd.loop_scan_CheckBox.isChecked()
+        self._scanning_logic.bidirectional_scan = self._sd.bidirectional_scan_CheckBox.isChecked()
+        self._scanning_logic.retrace_lag = self._sd.retrace_lag_DoubleSpinBox.value()
+        self._scanning_logic.skip_adjacent_ramp = self._sd.skip_adjacent_ramp_CheckBox.isChecked()
         self._scanning_logic.depth_scan_dir_is_xz = self._sd.depth_dir_x_radioButton.isChecked()
         self.fixed_aspect_ratio_xy = self._sd.fixed_aspect_xy_checkBox.isChecked()
         self.fixed_aspect_ratio_depth = self._sd.fixed_aspect_depth_checkBox.isChecked()
@@ -897,6 +900,9 @@ class ConfocalGui(GUIBase):
         self._sd.clock_frequency_InputWidget.setValue(int(self._scanning_logic._clock_frequency))
         self._sd.return_slowness_InputWidget.setValue(int(self._scanning_logic.return_slowness))
         self._sd.loop_scan_CheckBox.setChecked(self._scanning_logic.permanent_scan)
+        self._sd.bidirectional_scan_CheckBox.setChecked(self._scanning_logic.bidirectional_scan)
+        self._sd.retrace_lag_DoubleSpinBox.setValue(float(self._scanning_logic.retrace_lag))
+        self._sd.skip_adjacent_ramp_CheckBox.setChecked(self._scanning_logic.skip_adjacent_ramp)
         if self._scanning_logic.depth_scan_dir_is_xz:
             self._sd.depth_dir_x_radioButton.setChecked(True)
         else:
@@ -176,7 +176,8 @@ class CounterGui(GUIBase):
         ##################
         # Handling signals from the logic
 
-        self._counting_logic.sigCounterUpdated.connect(self.updateData)
+        # Rate limited, a new plot update is only sent when the previous one is drawn
+        self._counting_logic.plot_updates.connect('counts', self.updateData)
 
         # ToDo:
         # self._counting_logic.sigCountContinuousNext.connect()
@@ -245,7 +246,7 @@ class CounterGui(GUIBase):
         self._mw.restore_default_view_Action.triggered.disconnect()
         self.sigStartCounter.disconnect()
         self.sigStopCounter.disconnect()
-        self._counting_logic.sigCounterUpdated.disconnect()
+        self._counting_logic.plot_updates.disconnect('counts')
         self._counting_logic.sigCountingSamplesChanged.disconnect()
         self._counting_logic.sigCountLengthChanged.disconnect()
         self._counting_logic.sigCountFrequencyChanged.disconnect()
@@ -385,7 +385,8 @@ class EPRoCGui(GUIBase):
         self._eproc_logic.sigStatusUpdated.connect(self.update_status,
                                                    QtCore.Qt.QueuedConnection)
         self._eproc_logic.sigSetLabelEprocPlots.connect(self.set_label_eproc_plots, QtCore.Qt.QueuedConnection)
-        self._eproc_logic.sigEprocPlotsUpdated.connect(self.update_plots, QtCore.Qt.QueuedConnection)
+        # Rate limited, a new plot update is only sent when the previous one is drawn
+        self._eproc_logic.plot_updates.connect('plots', self.update_plots)
         self._eproc_logic.sigEprocRemainingTimeUpdated.connect(self.update_remainingtime,
                                                                QtCore.Qt.QueuedConnection)
 
@@ -420,7 +421,7 @@ class EPRoCGui(GUIBase):
         self._eproc_logic.sigParameterUpdated.disconnect()
         self._eproc_logic.sigStatusUpdated.disconnect()
         self._eproc_logic.sigSetLabelEprocPlots.disconnect()
-        self._eproc_logic.sigEprocPlotsUpdated.disconnect()
+        self._eproc_logic.plot_updates.disconnect('plots')
         self._eproc_logic.sigEprocRemainingTimeUpdated.disconnect()
 
         self.sigStartEproc.disconnect()
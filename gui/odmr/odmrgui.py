@@ -395,7 +395,8 @@ class ODMRGui(GUIBase):
                                                      QtCore.Qt.QueuedConnection)
         self._odmr_logic.sigOutputStateUpdated.connect(self.update_status,
                                                        QtCore.Qt.QueuedConnection)
-        self._odmr_logic.sigOdmrPlotsUpdated.connect(self.update_plots, QtCore.Qt.QueuedConnection)
+        # Rate limited, a new plot update is only sent when the previous one is drawn
+        self._odmr_logic.plot_updates.connect('plots', self.update_plots)
         self._odmr_logic.sigOdmrFitUpdated.connect(self.update_fit, QtCore.Qt.QueuedConnection)
         self._odmr_logic.sigOdmrElapsedTimeUpdated.connect(self.update_elapsedtime,
                                                            QtCore.Qt.QueuedConnection)
@@ -423,7 +424,7 @@ class ODMRGui(GUIBase):
         self._mw.action_Settings.triggered.disconnect()
         self._odmr_logic.sigParameterUpdated.disconnect()
         self._odmr_logic.sigOutputStateUpdated.disconnect()
-        self._odmr_logic.sigOdmrPlotsUpdated.disconnect()
+        self._odmr_logic.plot_updates.disconnect('plots')
         self._odmr_logic.sigOdmrFitUpdated.disconnect()
         self._odmr_logic.sigOdmrElapsedTimeUpdated.disconnect()
         self.sigCwMwOn.disconnect()
@@ -849,7 +850,7 @@ class ODMRGui(GUIBase):
         self.update_plots(
             self._odmr_logic.odmr_plot_x,
             self._odmr_logic.odmr_plot_y,
-            self._odmr_logic.odmr_plot_xy)
+            self._odmr_logic.odmr_plot_xy.copy())
 
     def average_level_changed(self):
         """
@@ -974,7 +975,7 @@ class ODMRGui(GUIBase):
         self._odmr_logic.matrix_range = self._mw.odmr_control_DockWidget.matrix_range_SpinBox.value()
         # need to update the plot that is showed
         key = 'Matrix range: {}'.format(self._odmr_logic.matrix_range)
-        self.odmr_matrix_image.setImage(self._odmr_logic.select_odmr_matrix_data(self._odmr_logic.odmr_plot_xy,
+        self.odmr_matrix_image.setImage(self._odmr_logic.select_odmr_matrix_data(self._odmr_logic.odmr_plot_xy.copy(),
                                                                                  self.display_channel,
                                                                                  self._odmr_logic.matrix_range))
         return
@@ -239,8 +239,8 @@ class TimeSeriesGui(GUIBase):
 
         ##################
         # Handling signals from the logic
-        self._time_series_logic.sigDataChanged.connect(
-            self.update_data, QtCore.Qt.QueuedConnection)
+        # Rate limited, a new frame is only sent when the previous one is drawn
+        self._time_series_logic.plot_updates.connect('data', self.update_data)
         self._time_series_logic.sigSettingsChanged.connect(
             self.update_settings, QtCore.Qt.QueuedConnection)
         self._time_series_logic.sigStatusChanged.connect(
@@ -281,7 +281,7 @@ class TimeSeriesGui(GUIBase):
         self.sigStartRecording.disconnect()
         self.sigStopRecording.disconnect()
         self.sigSettingsChanged.disconnect()
-        self._time_series_logic.sigDataChanged.disconnect()
+        self._time_series_logic.plot_updates.disconnect('data')
         self._time_series_logic.sigSettingsChanged.disconnect()
         self._time_series_logic.sigStatusChanged.disconnect()
 
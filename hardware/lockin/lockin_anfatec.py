@@ -1,4 +1,5 @@
 import time
+import numpy as np
 import requests
 from core.module import Base
 from core.configoption import ConfigOption
@@ -28,14 +29,36 @@ class LockinAnfatec(Base, LockinInterface):
 
     def on_activate(self):
         """ Initialisation performed during activation of the module. """
-        r = requests.get('http://' + self._address + '/cgi-bin/login.cgi?username=' + self._username + '&password=' + self._password)
+        # One session for all the requests, so that the TCP connection is kept alive between commands and polls
+        self._session = requests.Session()
+        self._base_url = 'http://' + self._address
+        # Lines of lockin.ini, downloaded once and invalidated by the setters of this module
+        self._ini_lines = None
+        self._ini_values = dict()
+
+        r = self._session.get(self._base_url + '/cgi-bin/login.cgi?username=' + self._username
+                              + '&password=' + self._password)
         if 'no_authentication' in r.text:
             self.log.error('Could not connect to the address >>{}<<.'.format(self._address))
             raise Exception('Could not connect to the address >>{}<<.'.format(self._address))
         return
 
     def on_deactivate(self):
-        """Connection is not closed because the Anfatec lockin is connected via LAN and not VISA"""
+        """ Close the HTTP session (the Anfatec lockin is connected via LAN and not VISA). """
+        self._session.close()
+        return
+
+    def _send_command(self, query):
+        """
+        Send a remote command to the lockin and wait until it is processed. The cached copy of lockin.ini is
+        invalidated, because the command changes at least one of its values.
+
+        :param query: str remote command, e.g. '8D9_0.1_'
+        """
+        self._session.get(self._base_url + '/cgi-bin/remote.cgi?' + query)
+        self._ini_lines = None
+        self._ini_values.clear()
+        time.sleep(self._delay)
         return
 
     def get_actual_value(self, param):
@@ -49,12 +72,15 @@ class LockinAnfatec(Base, LockinInterface):
         :return: str parameter value
         """
 
-        url = ('http://' + self._address + '/setup/lockin.ini')
-        r = requests.get(url)
-        lines = r.text.split('\n')
-        for line in lines:
+        if param in self._ini_values:
+            return self._ini_values[param]
+        if self._ini_lines is None:
+            r = self._session.get(self._base_url + '/setup/lockin.ini')
+            self._ini_lines = r.text.split('\n')
+        for line in self._ini_lines:
             if param in line:
-                return line.split(' ')[1]
+                self._ini_values[param] = line.split(' ')[1]
+                return self._ini_values[param]
         return -1
 
     def set_input_range(self, r):
@@ -69,9 +95,7 @@ class LockinAnfatec(Base, LockinInterface):
         else:
             r = str(10 * float(r))
         query = '899_' + r + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_range = self.get_actual_value('InputRange')
         if actual_range == '1':
             actual_range = '0.1'
@@ -91,9 +115,7 @@ class LockinAnfatec(Base, LockinInterface):
         else:
             coupl = 1
         query = '89D_' + str(coupl) + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_coupl = int(self.get_actual_value('InputCoupl'))
         if actual_coupl == 0:
             actual_coupl = 'dc'
@@ -108,14 +130,10 @@ class LockinAnfatec(Base, LockinInterface):
         """
         if tauA is not None:
             query = '8959_' + str(self.tau_values.index(tauA) + 1) + '_'
-            url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-            r = requests.get(url)
-            time.sleep(self._delay)
+            self._send_command(query)
         if tau1 is not None:
             query = '8955_' + str(self.tau_values.index(tau1) + 1) + '_'
-            url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-            r = requests.get(url)
-            time.sleep(self._delay)
+            self._send_command(query)
         actual_tauA = self.tau_values[int(self.get_actual_value('Timeconstant')) - 1]
         actual_tau1 = self.tau_values[int(self.get_actual_value('TimeConstLoL')) - 1]
         return actual_tauA, actual_tau1
@@ -127,9 +145,7 @@ class LockinAnfatec(Base, LockinInterface):
         :return:
         """
         query = '895D_' + str(val) + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_val = int(self.get_actual_value('Sync0'))
         syncLoL = int(self.get_actual_value('SyncLoL'))  # confused about this syncLoL thing that changes accordingly to Sync0
         return actual_val, syncLoL
@@ -141,9 +157,7 @@ class LockinAnfatec(Base, LockinInterface):
         :return:
         """
         query = '891_' + str(dB) + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_slope = self.get_actual_value('Rolloff')
         return actual_slope
 
@@ -159,9 +173,7 @@ class LockinAnfatec(Base, LockinInterface):
         elif config == 'A&B':
             config = '2'
         query = '89A_' + config + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_config = int(self.get_actual_value('InputMode'))
         if actual_config == 0:
             actual_config = 'A'
@@ -177,9 +189,7 @@ class LockinAnfatec(Base, LockinInterface):
         :return actual_uac: actual_amplitude
         """
         query = '8D9_' + str(uac) + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_uac = float(self.get_actual_value('Amplitude'))
         return actual_uac
 
@@ -190,9 +200,7 @@ class LockinAnfatec(Base, LockinInterface):
         :return: act_f
         """
         query = '8DD_' + str(f) + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_freq = float(self.get_actual_value('Frequency'))
         return actual_freq
 
@@ -203,14 +211,10 @@ class LockinAnfatec(Base, LockinInterface):
         """
         if phase is not None:
             query = '8D59_' + str(phase) + '_'
-            url = ('http://'+self._address+'/cgi-bin/remote.cgi?' + query)
-            r = requests.get(url)
-            time.sleep(self._delay)
+            self._send_command(query)
         if phase0 is not None:
             query = '8D5D_' + str(phase0) + '_'
-            url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-            r = requests.get(url)
-            time.sleep(self._delay)
+            self._send_command(query)
         actual_phase = float(self.get_actual_value('Phase'))
         actual_phase0 = float(self.get_actual_value('Phase0'))
         return actual_phase, actual_phase0
@@ -220,9 +224,7 @@ class LockinAnfatec(Base, LockinInterface):
         :param: i: {1|...|15}
         """
         query = '8D1_' + str(i) + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_harmonic = int(self.get_actual_value('Harmonic'))
         return actual_harmonic
 
@@ -241,9 +243,7 @@ class LockinAnfatec(Base, LockinInterface):
         else:
             ref = '1'
         query = '8DA_' + ref + '_'
-        url = ('http://' + self._address + '/cgi-bin/remote.cgi?' + query)
-        r = requests.get(url)
-        time.sleep(self._delay)
+        self._send_command(query)
         actual_ref = int(self.get_actual_value('RefInFlag'))
         return actual_ref
 
@@ -251,11 +251,26 @@ class LockinAnfatec(Base, LockinInterface):
         """
         Download the measured values on the screen of the lockin from the server
         """
-        url = ('http://' + self._address + '/data/lia.dat')
-        r = requests.get(url)
+        r = self._session.get(self._base_url + '/data/lia.dat')
         data_raw = r.text.replace(" ", "")
         data = data_raw.split("\r\n")
         for i in range(0, 4):
             data[i] = float(data[i])
         return data
 
+    def get_data_lia_block(self, n_samples, interval=0):
+        """
+        Download n_samples consecutive readings of the four channels over the same connection.
+
+        :param n_samples: int number of readings
+        :param interval: float waiting time in s before each reading
+        :return: numpy.ndarray of shape (n_samples, 4)
+        """
+        url = self._base_url + '/data/lia.dat'
+        data = np.empty((n_samples, 4))
+        for i in range(n_samples):
+            if interval > 0:
+                time.sleep(interval)
+            data[i] = self._session.get(url).text.replace(" ", "").split("\r\n")[:4]
+        return data
+
@@ -119,3 +119,8 @@ class LockinDummy(Base, LockinInterface):
     def get_data_lia(self):
         return np.random.rand(4)*2-1
 
+    def get_data_lia_block(self, n_samples, interval=0):
+        if interval > 0:
+            time.sleep(interval * n_samples)
+        return np.random.rand(n_samples, 4)*2-1
+
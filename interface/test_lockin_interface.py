@@ -71,4 +71,12 @@ class LockinInterface(metaclass=InterfaceMetaclass):
 
     @abstract_interface_method
     def change_reference(self, ref):
-        pass
\ No newline at end of file
+        pass
+
+    @abstract_interface_method
+    def get_data_lia(self):
+        pass
+
+    @abstract_interface_method
+    def get_data_lia_block(self, n_samples, interval=0):
+        pass
@@ -261,6 +261,12 @@ class ConfocalLogic(GenericLogic):
     _clock_frequency = StatusVar('clock_frequency', 500)
     return_slowness = StatusVar(default=50)
     max_history_length = StatusVar(default=10)
+    # scan every second line on the way back (trace and retrace) instead of a return line
+    bidirectional_scan = StatusVar(default=False)
+    # shift of the retrace lines against the trace lines in pixels, corrects the lag of the scanner
+    retrace_lag = StatusVar(default=0.)
+    # in bidirectional scans move directly to the adjacent line instead of a return_slowness ramp
+    skip_adjacent_ramp = StatusVar(default=False)
 
     # signals
     signal_start_scanning = QtCore.Signal(str)
@@ -768,14 +774,7 @@ class ConfocalLogic(GenericLogic):
                 image[self._scan_counter, :, 2] = self._current_z * np.ones(z_shape)
 
             # make a line in the scan, _scan_counter says which one it is
-            lsx = image[self._scan_counter, :, 0]
-            lsy = image[self._scan_counter, :, 1]
-            lsz = image[self._scan_counter, :, 2]
-            if n_ch <= 3:
-                line = np.vstack([lsx, lsy, lsz][0:n_ch])
-            else:
-                line = np.vstack(
-                    [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
+            line = self._make_scan_line(image, self._scan_counter)
 
             # scan the line in the scan
             line_counts = self._scanning_device.scan_line(line, pixel_clock=True)
@@ -784,56 +783,87 @@ class ConfocalLogic(GenericLogic):
                 self.signal_scan_lines_next.emit()
                 return
 
-            # make a line to go to the starting position of the next scan line
-            if self.depth_img_is_xz or not self._zscan:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                        self._return_XL,
-                        image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                        image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape)
-                    ][0:n_ch])
-                else:
-                    return_line = np.vstack([
+            retrace_row = self._scan_counter + 1
+            if self.bidirectional_scan and retrace_row < np.size(self._image_vert_axis):
+                # scan the next line backwards instead of returning to the start of this one
+                if not self._zscan:
+                    image[retrace_row, :, 2] = self._current_z
+                retrace_line = self._make_scan_line(image, retrace_row, reverse=True)
+                if not self.skip_adjacent_ramp:
+                    # approach the end of the next line, counts are thrown away
+                    ramp_counts = self._scanning_device.scan_line(
+                        self._make_ramp(line[:, -1], retrace_line[:, 0]))
+                    if np.any(ramp_counts == -1):
+                        self.stopRequested = True
+                        self.signal_scan_lines_next.emit()
+                        return
+                retrace_counts = self._scanning_device.scan_line(retrace_line, pixel_clock=True)
+                if np.any(retrace_counts == -1):
+                    self.stopRequested = True
+                    self.signal_scan_lines_next.emit()
+                    return
+                next_row = retrace_row + 1
+                if not self.skip_adjacent_ramp and next_row < np.size(self._image_vert_axis):
+                    # approach the start of the line after, counts are thrown away
+                    if not self._zscan:
+                        image[next_row, :, 2] = self._current_z
+                    ramp_counts = self._scanning_device.scan_line(
+                        self._make_ramp(retrace_line[:, -1],
+                                        self._make_scan_line(image, next_row)[:, 0]))
+                    if np.any(ramp_counts == -1):
+                        self.stopRequested = True
+                        self.signal_scan_lines_next.emit()
+                        return
+            else:
+                retrace_counts = None
+                # make a line to go to the starting position of the next scan line
+                if self.depth_img_is_xz or not self._zscan:
+                    if n_ch <= 3:
+                        return_line = np.vstack([
                             self._return_XL,
                             image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
-                            np.ones(self._return_XL.shape) * self._current_a
-                        ])
-            else:
-                if n_ch <= 3:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape)
+                            image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape)
                         ][0:n_ch])
+                    else:
+                        return_line = np.vstack([
+                                self._return_XL,
+                                image[self._scan_counter, 0, 1] * np.ones(self._return_XL.shape),
+                                image[self._scan_counter, 0, 2] * np.ones(self._return_XL.shape),
+                                np.ones(self._return_XL.shape) * self._current_a
+                            ])
                 else:
-                    return_line = np.vstack([
-                            image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
-                            self._return_YL,
-                            image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
-                            np.ones(self._return_YL.shape) * self._current_a
-                        ])
-
-            # return the scanner to the start of next line, counts are thrown away
-            return_line_counts = self._scanning_device.scan_line(return_line)
-            if np.any(return_line_counts == -1):
-                self.stopRequested = True
-                self.signal_scan_lines_next.emit()
-                return
+                    if n_ch <= 3:
+                        return_line = np.vstack([
+                                image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
+                                self._return_YL,
+                                image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape)
+                            ][0:n_ch])
+                    else:
+                        return_line = np.vstack([
+                                image[self._scan_counter, 0, 1] * np.ones(self._return_YL.shape),
+                                self._return_YL,
+                                image[self._scan_counter, 0, 2] * np.ones(self._return_YL.shape),
+                                np.ones(self._return_YL.shape) * self._current_a
+                            ])
+
+                # return the scanner to the start of next line, counts are thrown away
+                return_line_counts = self._scanning_device.scan_line(return_line)
+                if np.any(return_line_counts == -1):
+                    self.stopRequested = True
+                    self.signal_scan_lines_next.emit()
+                    return
 
-            # update image with counts from the line we just scanned
+            # update image with counts from the line(s) we just scanned
+            image[self._scan_counter, :, 3:3 + s_ch] = line_counts
+            if retrace_counts is not None:
+                image[retrace_row, :, 3:3 + s_ch] = self._correct_retrace_lag(retrace_counts[::-1])
             if self._zscan:
-                if self.depth_img_is_xz:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
-                else:
-                    self.depth_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
                 self.signal_depth_image_updated.emit()
             else:
-                self.xy_image[self._scan_counter, :, 3:3 + s_ch] = line_counts
                 self.signal_xy_image_updated.emit()
 
             # next line in scan
-            self._scan_counter += 1
+            self._scan_counter += 1 if retrace_counts is None else 2
 
             # stop scanning when last line scan was performed and makes scan not continuable
             if self._scan_counter >= np.size(self._image_vert_axis):
@@ -852,6 +882,54 @@ class ConfocalLogic(GenericLogic):
             self.stop_scanning()
             self.signal_scan_lines_next.emit()
 
+    def _make_scan_line(self, image, row, reverse=False):
+        """ The scanner path of an image row, from its first to its last pixel or reversed.
+
+        @param numpy.ndarray image: xy or depth image
+        @param int row: index of the row
+        @param bool reverse: optional, path from the last to the first pixel
+
+        @return numpy.ndarray: positions of the scanner axes, shape (axes, pixels)
+        """
+        n_ch = len(self.get_scanner_axes())
+        lsx = image[row, :, 0]
+        lsy = image[row, :, 1]
+        lsz = image[row, :, 2]
+        if n_ch <= 3:
+            line = np.vstack([lsx, lsy, lsz][0:n_ch])
+        else:
+            line = np.vstack(
+                [lsx, lsy, lsz, np.ones(lsx.shape) * self._current_a])
+        return line[:, ::-1] if reverse else line
+
+    def _make_ramp(self, start, stop):
+        """ A path of return_slowness points between two scanner positions.
+
+        @param numpy.ndarray start: position of the scanner axes
+        @param numpy.ndarray stop: position of the scanner axes
+
+        @return numpy.ndarray: positions of the scanner axes, shape (axes, return_slowness)
+        """
+        return np.linspace(start, stop, self.return_slowness, axis=1)
+
+    def _correct_retrace_lag(self, counts):
+        """ Shift the counts of a retrace line by retrace_lag pixels towards the start of the line
+        (negative values: towards the end), to line them up with the trace lines. The scanner
+        follows its path with a delay, which shifts the trace and the retrace lines in opposite
+        directions. Fractions of a pixel are interpolated, the edge pixels are repeated.
+
+        @param numpy.ndarray counts: counts of the retrace line in image order, shape (pixels, channels)
+
+        @return numpy.ndarray: the corrected counts
+        """
+        if self.retrace_lag == 0:
+            return counts
+        pixels = np.arange(counts.shape[0])
+        corrected = np.empty(counts.shape)
+        for channel in range(counts.shape[1]):
+            corrected[:, channel] = np.interp(pixels + self.retrace_lag, pixels, counts[:, channel])
+        return corrected
+
     def save_xy_data(self, colorscale_range=None, percentile_range=None, block=True):
         """ Save the current confocal xy data to file.
 
@@ -896,6 +974,9 @@ class ConfocalLogic(GenericLogic):
 
         parameters['Clock frequency of scanner (Hz)'] = self._clock_frequency
         parameters['Return Slowness (Steps during retrace line)'] = self.return_slowness
+        parameters['Bidirectional scan'] = self.bidirectional_scan
+        if self.bidirectional_scan:
+            parameters['Retrace lag (pixels)'] = self.retrace_lag
 
         # Prepare a figure to be saved
         figure_data = self.xy_image[:, :, 3]
@@ -1000,6 +1081,9 @@ class ConfocalLogic(GenericLogic):
 
         parameters['Clock frequency of scanner (Hz)'] = self._clock_frequency
         parameters['Return Slowness (Steps during retrace line)'] = self.return_slowness
+        parameters['Bidirectional scan'] = self.bidirectional_scan
+        if self.bidirectional_scan:
+            parameters['Retrace lag (pixels)'] = self.retrace_lag
 
         if self.depth_img_is_xz:
             horizontal_range = [self.image_x_range[0], self.image_x_range[1]]
@@ -22,14 +22,22 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 from qtpy import QtCore
 from collections import OrderedDict
 import numpy as np
+import os
+import shutil
+import tempfile
 import time
 import matplotlib.pyplot as plt
 
 from core.connector import Connector
+from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
 from logic.generic_logic import GenericLogic
 from interface.slow_counter_interface import CountingMode
 from core.util.mutex import Mutex
+from core.util.plot_updates import PlotUpdateBus
+from core.util.ring_buffer import TraceBuffer
+from core.util.filters import RunningMedian
+from core.util.stream_recorder import StreamRecorder, DecimatedOverview
 
 
 class CounterLogic(GenericLogic):
@@ -59,6 +67,10 @@ class CounterLogic(GenericLogic):
     counter1 = Connector(interface='SlowCounterInterface')
     savelogic = Connector(interface='SaveLogic')
 
+    # config options
+    # maximum number of plot updates per second, faster count data is merged into the next update
+    _max_plot_rate = ConfigOption('max_plot_rate', 20., missing='nothing')
+
     # status vars
     _count_length = StatusVar('count_length', 300)
     _smooth_window_length = StatusVar('smooth_window_length', 10)
@@ -66,6 +78,8 @@ class CounterLogic(GenericLogic):
     _count_frequency = StatusVar('count_frequency', 50)
     _saving = StatusVar('saving', False)
 
+    # number of saved samples collected in memory before they are written to the recording file
+    _save_chunk_length = 1024
 
     def __init__(self, config, **kwargs):
         """ Create CounterLogic object with connectors.
@@ -112,17 +126,29 @@ class CounterLogic(GenericLogic):
         number_of_detectors = constraints.max_detectors
 
         # initialize data arrays
-        self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-        self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
+        self._init_trace_buffers()
         self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
         self._already_counted_samples = 0  # For gated counting
-        self._data_to_save = []
+
+        # The saved samples are collected in a chunk and appended to a temporary recording file
+        self._save_recorder = None
+        self._save_chunk = None
+        self._save_chunk_fill = 0
+        self._save_overview = None
+        # memory map of the recording file, mapped again only when samples were written
+        self._saved_data = None
+        # recording directories which could not be removed yet (their file was still mapped)
+        self._stale_save_directories = list()
 
         # Flag to stop the loop
         self.stopRequested = False
 
         self._saving_start_time = time.time()
 
+        # Rate limited plot updates, sigCounterUpdated is emitted through it
+        self.plot_updates = PlotUpdateBus(self._max_plot_rate, parent=self)
+        self.plot_updates.add_channel('counts', self.sigCounterUpdated)
+
         # connect signals
         self.sigCountDataNext.connect(self.count_loop_body, QtCore.Qt.QueuedConnection)
         return
@@ -138,6 +164,9 @@ class CounterLogic(GenericLogic):
             self._stopCount_wait()
 
         self.sigCountDataNext.disconnect()
+        self.plot_updates.disconnect()
+        self.plot_updates.clear()
+        self._remove_save_recording()
         return
 
     def get_hardware_constraints(self):
@@ -262,11 +291,12 @@ class CounterLogic(GenericLogic):
 
         @return bool: saving state
         """
-        if not resume:
-            self._data_to_save = []
-            self._saving_start_time = time.time()
+        with self.threadlock:
+            if not resume or self._save_recorder is None:
+                self._start_save_recording()
+                self._saving_start_time = time.time()
 
-        self._saving = True
+            self._saving = True
 
         # If the counter is not running, then it should start running so there is data to save
         if self.module_state() != 'locked':
@@ -276,7 +306,8 @@ class CounterLogic(GenericLogic):
         return self._saving
 
     def save_data(self, to_file=True, postfix='', save_figure=True):
-        """ Save the counter trace data and writes it to a file.
+        """ Save the counter trace data and writes it to a file. Once written to a file, the
+        temporary recording of the samples is removed.
 
         @param bool to_file: indicate, whether data have to be saved to file
         @param str postfix: an additional tag, which will be added to the filename upon save
@@ -287,6 +318,7 @@ class CounterLogic(GenericLogic):
         # stop saving thus saving state has to be set to False
         self._saving = False
         self._saving_stop_time = time.time()
+        saved_data = self.get_saved_data()
 
         # write the parameters:
         parameters = OrderedDict()
@@ -308,19 +340,61 @@ class CounterLogic(GenericLogic):
             for i, detector in enumerate(self.get_channels()):
                 header = header + ',Signal{0} (counts/s)'.format(i)
 
-            data = {header: self._data_to_save}
+            # the recording file is written to the text file row by row, without loading it
+            data = {header: saved_data}
             filepath = self._save_logic.get_path_for_module(module_name='Counter')
 
-            if save_figure:
-                fig = self.draw_figure(data=np.array(self._data_to_save))
+            if save_figure and len(saved_data) > 0:
+                fig = self.draw_figure(data=self._get_saved_envelope())
             else:
                 fig = None
             self._save_logic.save_data(data, filepath=filepath, parameters=parameters,
                                        filelabel=filelabel, plotfig=fig, delimiter='\t')
             self.log.info('Counter Trace saved to:\n{0}'.format(filepath))
+            # the samples are in the data file now, the temporary recording is not needed anymore
+            with self.threadlock:
+                if not self._saving:
+                    self._remove_save_recording()
 
         self.sigSavingStatusChanged.emit(self._saving)
-        return self._data_to_save, parameters
+        return saved_data, parameters
+
+    def get_saved_data(self, samples=None):
+        """ The data saved since start_saving: the time since the start of saving and the counts
+        of every channel.
+
+        @param int samples: optional, number of the newest samples. Default: all samples
+
+        @return numpy.ndarray: shape (samples, 1 + channels), read only and memory mapped from the
+                               recording file (until save_data wrote it to a file)
+        """
+        with self.threadlock:
+            if self._save_recorder is None:
+                return np.empty((0, len(self.get_channels()) + 1))
+            self._write_save_chunk()
+            total = self._save_recorder.total
+            if self._saved_data is None or len(self._saved_data) != total:
+                self._save_recorder.flush(metadata=False)
+                columns = len(self._save_recorder.channels)
+                if total == 0:
+                    self._saved_data = np.empty((0, columns), dtype=self._save_recorder.dtype)
+                else:
+                    self._saved_data = np.memmap(self._save_recorder.filenames[0], mode='r',
+                                                 dtype=self._save_recorder.dtype,
+                                                 shape=(total, columns))
+            data = self._saved_data
+        if samples is not None:
+            data = data[max(len(data) - int(samples), 0):]
+        return data
+
+    def get_saved_samples(self):
+        """ The number of samples saved since start_saving.
+
+        @return int: number of samples
+        """
+        if self._save_recorder is None:
+            return 0
+        return self._save_recorder.total + self._save_chunk_fill
 
     def draw_figure(self, data):
         """ Draw figure to save with data file.
@@ -426,12 +500,11 @@ class CounterLogic(GenericLogic):
 
             # initialising the data arrays
             self.rawdata = np.zeros([len(self.get_channels()), self._counting_samples])
-            self.countdata = np.zeros([len(self.get_channels()), self._count_length])
-            self.countdata_smoothed = np.zeros([len(self.get_channels()), self._count_length])
-            self._sampling_data = np.empty([len(self.get_channels()), self._counting_samples])
+            self._init_trace_buffers()
 
             # the sample index for gated counting
             self._already_counted_samples = 0
+            self.plot_updates.reset_statistics()
 
             # Start data reader loop
             self.sigCountStatusChanged.emit(True)
@@ -464,7 +537,9 @@ class CounterLogic(GenericLogic):
                     # switch the state variable off again
                     self.stopRequested = False
                     self.module_state.unlock()
-                    self.sigCounterUpdated.emit()
+                    self.plot_updates.post('counts')
+                    self.plot_updates.flush()
+                    self.log.debug('Plot updates: {0}.'.format(self.plot_updates.statistics_message()))
                     return
 
                 # read the current counter value
@@ -483,7 +558,7 @@ class CounterLogic(GenericLogic):
                         self.log.error('No valid counting mode set! Can not process counter data.')
 
             # call this again from event loop
-            self.sigCounterUpdated.emit()
+            self.plot_updates.post('counts')
             self.sigCountDataNext.emit()
         return
 
@@ -510,8 +585,8 @@ class CounterLogic(GenericLogic):
             filelabel = 'snapshot_count_trace_' + name_tag
 
         stop_time = self._count_length / self._count_frequency
-        time_step_size = stop_time / len(self.countdata)
-        x_axis = np.arange(0, stop_time, time_step_size)
+        time_step_size = stop_time / self.countdata.shape[-1]
+        x_axis = np.arange(self.countdata.shape[-1]) * time_step_size
 
         # prepare the data in a dict or in an OrderedDict:
         data = OrderedDict()
@@ -553,39 +628,25 @@ class CounterLogic(GenericLogic):
         Processes the raw data from the counting device
         @return:
         """
-        for i, ch in enumerate(self.get_channels()):
-            # remember the new count data in circular array
-            self.countdata[i, 0] = np.average(self.rawdata[i])
-        # move the array to the left to make space for the new data
-        self.countdata = np.roll(self.countdata, -1, axis=1)
-        # also move the smoothing array
-        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1, axis=1)
-        # calculate the median and save it
-        window = -int(self._smooth_window_length / 2) - 1
-        for i, ch in enumerate(self.get_channels()):
-            self.countdata_smoothed[i, window:] = np.median(self.countdata[i,
-                                                            -self._smooth_window_length:])
+        # add the new count data to the circular trace
+        self._count_buffer.extend(np.mean(self.rawdata, axis=1, keepdims=True))
+        self.countdata = self._count_buffer.view()
+
+        # median of the last smooth_window_length samples, shown for the newest half window
+        window = max(int(self._smooth_window_length), 1)
+        if self._running_median.window != window:
+            self._running_median = RunningMedian(self.countdata.shape[0], window,
+                                                 initial=self.countdata)
+            median = self._running_median.median
+        else:
+            median = self._running_median.add(self.countdata[:, -1])
+        self._smoothed_buffer.extend(median[:, np.newaxis])
+        self._smoothed_buffer.fill_last(window // 2 + 1, median)
+        self.countdata_smoothed = self._smoothed_buffer.view()
 
         # save the data if necessary
         if self._saving:
-             # if oversampling is necessary
-            if self._counting_samples > 1:
-                chans = self.get_channels()
-                self._sampling_data = np.empty([len(chans) + 1, self._counting_samples])
-                self._sampling_data[0, :] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    self._sampling_data[i+1, 0] = self.rawdata[i]
-
-                self._data_to_save.extend(list(self._sampling_data))
-            # if we don't want to use oversampling
-            else:
-                # append tuple to data stream (timestamp, average counts)
-                chans = self.get_channels()
-                newdata = np.empty((len(chans) + 1, ))
-                newdata[0] = time.time() - self._saving_start_time
-                for i, ch in enumerate(chans):
-                    newdata[i+1] = self.countdata[i, -1]
-                self._data_to_save.append(newdata)
+            self._save_samples(self.rawdata)
         return
 
     def _process_data_gated(self):
@@ -605,17 +666,7 @@ class CounterLogic(GenericLogic):
 
         # save the data if necessary
         if self._saving:
-            # if oversampling is necessary
-            if self._counting_samples > 1:
-                self._sampling_data = np.empty((self._counting_samples, 2))
-                self._sampling_data[:, 0] = time.time() - self._saving_start_time
-                self._sampling_data[:, 1] = self.rawdata[0]
-                self._data_to_save.extend(list(self._sampling_data))
-            # if we don't want to use oversampling
-            else:
-                # append tuple to data stream (timestamp, average counts)
-                self._data_to_save.append(np.array((time.time() - self._saving_start_time,
-                                                    self.countdata[-1])))
+            self._save_samples(self.rawdata)
         return
 
     def _process_data_finite_gated(self):
@@ -638,6 +689,93 @@ class CounterLogic(GenericLogic):
             self._already_counted_samples += len(self.rawdata[0])
         return
 
+    def _init_trace_buffers(self):
+        """ Create the circular count traces and the running median for the current settings. """
+        channels = len(self.get_channels())
+        self._count_buffer = TraceBuffer(channels, self._count_length)
+        self._smoothed_buffer = TraceBuffer(channels, self._count_length)
+        self.countdata = self._count_buffer.view()
+        self.countdata_smoothed = self._smoothed_buffer.view()
+        # start like the trace, from zeros
+        self._running_median = RunningMedian(channels, self._smooth_window_length,
+                                             initial=self.countdata)
+        return
+
+    def _start_save_recording(self):
+        """ Open a new temporary recording file for the saved samples, replacing the last one. """
+        self._remove_save_recording()
+        columns = ['Time (s)'] + ['Signal{0} (counts/s)'.format(i)
+                                  for i, detector in enumerate(self.get_channels())]
+        self._save_recorder = StreamRecorder(tempfile.mkdtemp(prefix='qudi_counter_'), 'count_trace',
+                                             columns, self._count_frequency,
+                                             metadata={'oversampling': self._counting_samples})
+        self._save_chunk = np.empty((len(columns), self._save_chunk_length))
+        self._save_chunk_fill = 0
+        self._save_overview = DecimatedOverview(len(columns))
+        return
+
+    def _remove_save_recording(self):
+        """ Close and delete the temporary recording file of the saved samples. """
+        self._saved_data = None
+        if self._save_recorder is not None:
+            self._save_recorder.close()
+            self._stale_save_directories.append(
+                os.path.dirname(self._save_recorder.metadata_filename))
+            self._save_recorder = None
+        # on Windows the file stays as long as arrays returned by get_saved_data map it, it is
+        # removed with the next recording
+        for directory in list(self._stale_save_directories):
+            shutil.rmtree(directory, ignore_errors=True)
+            if not os.path.exists(directory):
+                self._stale_save_directories.remove(directory)
+        return
+
+    def _save_samples(self, samples):
+        """ Append samples with the current time since the start of saving to the save chunk and
+        write the chunk to the recording file when it is full.
+
+        @param numpy.ndarray samples: shape (channels, n)
+        """
+        now = time.time() - self._saving_start_time
+        start = 0
+        while start < samples.shape[1]:
+            stop = min(samples.shape[1], start + self._save_chunk_length - self._save_chunk_fill)
+            chunk = self._save_chunk[:, self._save_chunk_fill:self._save_chunk_fill + stop - start]
+            chunk[0] = now
+            chunk[1:] = samples[:, start:stop]
+            self._save_chunk_fill += stop - start
+            start = stop
+            if self._save_chunk_fill == self._save_chunk_length:
+                self._write_save_chunk()
+        return
+
+    def _write_save_chunk(self):
+        if self._save_chunk_fill > 0:
+            chunk = self._save_chunk[:, :self._save_chunk_fill]
+            try:
+                self._save_recorder.write(chunk)
+            except OSError:
+                self.log.exception('Writing the counts to the recording file failed, saving '
+                                   'stopped.')
+                self._saving = False
+                self.sigSavingStatusChanged.emit(self._saving)
+            self._save_overview.add(chunk)
+            self._save_chunk_fill = 0
+        return
+
+    def _get_saved_envelope(self):
+        """ The saved data reduced to the minimum and maximum of at most a few thousand blocks of
+        samples, as alternating rows at the mean time of the block, to plot it.
+
+        @return numpy.ndarray: shape (2 * blocks, 1 + channels)
+        """
+        times, minimum, maximum = self._save_overview.get_envelope()
+        envelope = np.empty((2 * minimum.shape[1], minimum.shape[0]))
+        envelope[0::2] = minimum.T
+        envelope[1::2] = maximum.T
+        envelope[:, 0] = np.repeat((minimum[0] + maximum[0]) / 2, 2)
+        return envelope
+
     def _stopCount_wait(self, timeout=5.0):
         """
         Stops the counter and waits until it actually has stopped.
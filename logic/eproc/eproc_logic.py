@@ -30,8 +30,12 @@ import time
 import datetime
 import matplotlib.pyplot as plt
 import os
+from logic.fit_logic import LiveFitWorker
 from logic.generic_logic import GenericLogic
+from logic.eproc.raw_data_file import RawDataFile
+from core.util.math import RunningStatistics
 from core.util.mutex import Mutex
+from core.util.plot_updates import PlotUpdateBus
 from core.connector import Connector
 from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
@@ -47,6 +51,7 @@ class EPRoCLogic(GenericLogic):
     magnet = Connector(interface='EprocMagnetInterface')
     powersupply1 = Connector(interface='ProcessControlInterface')
     powersupply2 = Connector(interface='ProcessControlInterface')
+    fitlogic = Connector(interface='FitLogic', optional=True)
 
     # config option
     mw_scanmode = ConfigOption(
@@ -54,6 +59,8 @@ class EPRoCLogic(GenericLogic):
         'SWEEP',
         missing='warn',
         converter=lambda x: MicrowaveMode[x.upper()])
+    # maximum number of plot updates per second, faster data points are merged into the next update
+    max_plot_rate = ConfigOption('max_plot_rate', 20., missing='nothing')
 
     # these go here or in on_activate()?
     n_sweep = StatusVar('n_sweep', 1)
@@ -87,6 +94,13 @@ class EPRoCLogic(GenericLogic):
     lia_slope = StatusVar('lia_slope', '6')
     lia_configuration = StatusVar('lia_configuration', 'A&B')
 
+    # Validity check of the lockin data: values closer to zero than the threshold are not real data and are measured
+    # again, at most lia_max_retries times and for at most lia_retry_timeout seconds. Only checked channels are tested.
+    lia_invalid_threshold = StatusVar('lia_invalid_threshold', 1e-7)
+    lia_max_retries = StatusVar('lia_max_retries', 100)
+    lia_retry_timeout = StatusVar('lia_retry_timeout', 1.)
+    lia_checked_channels = StatusVar('lia_checked_channels', [True, True, True, True])
+
     # Parameters for reference signal from microwave hardware (ref)
     ref_freq = StatusVar('ref_freq', 1000000)
     ref_mode = StatusVar('ref_mode', 'HBAN')
@@ -107,6 +121,24 @@ class EPRoCLogic(GenericLogic):
     is_fs = StatusVar('is_fs', True)    # True if microwave sweep is set, false if magnetic field sweep is set
     is_lia_ext_ref = StatusVar('is_lia_ext_ref', True)
 
+    # Batched acquisition: acquire several complete points per event loop pass instead of one sample
+    is_batch_acquisition = StatusVar('is_batch_acquisition', False)
+    batch_points = StatusVar('batch_points', 10)
+
+    # If False, the single lockin samples are not kept in eproc_raw_data (only the running averages per point and per
+    # sweep), which keeps the memory constant for long scans
+    keep_raw_data = StatusVar('keep_raw_data', True)
+    # If True, the kept raw data is written into a memory mapped file in the eproc data directory while it arrives
+    # instead of being held in RAM, so that a crashed scan can be resumed with resume_eproc
+    use_raw_data_file = StatusVar('use_raw_data_file', False)
+
+    # Fits of the spectra (only with a connected fitlogic). With live_fit_enabled the spectrum of live_fit_channel is
+    # fitted continuously in a background thread, at most every live_fit_interval seconds
+    fc = StatusVar('fits', None)
+    live_fit_enabled = StatusVar('live_fit_enabled', False)
+    live_fit_interval = StatusVar('live_fit_interval', 1.)
+    live_fit_channel = StatusVar('live_fit_channel', 0)
+
     # Internal signals
     sigNextDataPoint = QtCore.Signal()
 
@@ -116,6 +148,7 @@ class EPRoCLogic(GenericLogic):
     sigEprocPlotsUpdated = QtCore.Signal(np.ndarray, np.ndarray)
     sigSetLabelEprocPlots = QtCore.Signal()
     sigEprocRemainingTimeUpdated = QtCore.Signal(float, int)
+    sigEprocFitUpdated = QtCore.Signal(np.ndarray, np.ndarray, dict, str)
 
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
@@ -147,6 +180,15 @@ class EPRoCLogic(GenericLogic):
         self.elapsed_accumulations = 0
 
         self.is_eproc_running = False
+        self._is_hw_sweep = False
+        self._mw_was_running = False
+        self._raw_data_file = None
+        # Whether the scan keeps the single samples, set at the start of every scan
+        self._keep_raw_data = False
+
+        # Rate limited plot updates, sigEprocPlotsUpdated is emitted through it
+        self.plot_updates = PlotUpdateBus(self.max_plot_rate, parent=self)
+        self.plot_updates.add_channel('plots', self.sigEprocPlotsUpdated)
 
         # Set flag for stopping a measurement
         self.stopRequested = False
@@ -154,13 +196,8 @@ class EPRoCLogic(GenericLogic):
 
         # Initalize the data arrays
         self._initialize_eproc_plots()
-        # Raw data array
-        self.eproc_raw_data = np.zeros(
-            [self.n_sweep,
-             self.n_accumulation,
-             self.eproc_plot_x.size,
-             4]  # writing it for 2 channels, but this should become a method get_lockin_channels of some sort
-        )
+        self._initialize_eproc_data()
+        self._initialize_lia_validity_counters()
 
         # Switch off microwave and set CW frequency and power
         self.mw_off()
@@ -180,6 +217,15 @@ class EPRoCLogic(GenericLogic):
         self.set_psa_parameters(self.psa_voltage_outp1, self.psa_voltage_outp2,
                                 self.psa_current_max_outp1, self.psa_current_max_outp2)
 
+        # Background fitting of the latest spectrum
+        self.fits_performed = {}
+        self._live_fit = None
+        if self.fc is not None:
+            self._live_fit = LiveFitWorker(self.fc, self.live_fit_interval)
+            self._live_fit.sigNewFitResult.connect(self._live_fit_updated, QtCore.Qt.QueuedConnection)
+            if self.live_fit_enabled:
+                self._live_fit.start()
+
         # Connect signals
         self.sigNextDataPoint.connect(self._next_data_point, QtCore.Qt.QueuedConnection)
         return
@@ -202,8 +248,54 @@ class EPRoCLogic(GenericLogic):
                 break
         # Switch off microwave source for sure (also if CW mode is active or module is still locked)
         self._mw_device.off()
+        self._close_raw_data_file()
         # Disconnect signals
         self.sigNextDataPoint.disconnect()
+        self.plot_updates.disconnect()
+        self.plot_updates.clear()
+        if self._live_fit is not None:
+            self._live_fit.stop()
+            self._live_fit.sigNewFitResult.disconnect()
+
+    @fc.constructor
+    def sv_set_fits(self, val):
+        # Setup fit container, only if a fitlogic is connected
+        if self.fitlogic() is None:
+            return None
+        fc = self.fitlogic().make_fit_container('EPRoC', '1d')
+        fc.set_units(['Hz' if self.is_fs else 'G', 'V'])
+        if isinstance(val, dict) and len(val) > 0:
+            fc.load_from_dict(val)
+        else:
+            d1 = OrderedDict()
+            d1['Lorentzian peak'] = {
+                'fit_function': 'lorentzian',
+                'estimator': 'peak'
+            }
+            d1['Gaussian peak'] = {
+                'fit_function': 'gaussian',
+                'estimator': 'peak'
+            }
+            d1['Lorentzian derivative'] = {
+                'fit_function': 'lorentzianderivative',
+                'estimator': 'zerocrossing'
+            }
+            d1['Gaussian derivative'] = {
+                'fit_function': 'gaussianderivative',
+                'estimator': 'zerocrossing'
+            }
+            default_fits = OrderedDict()
+            default_fits['1d'] = d1
+            fc.load_from_dict(default_fits)
+        return fc
+
+    @fc.representer
+    def sv_get_fits(self, val):
+        """ save configured fits """
+        if val is not None and len(val.fit_list) > 0:
+            return val.save_to_dict()
+        else:
+            return None
 
     def _initialize_eproc_plots(self):
         """ Initializing the eproc plots. """
@@ -211,9 +303,11 @@ class EPRoCLogic(GenericLogic):
             self.eproc_plot_x = np.array(np.arange(self.fs_start, self.fs_stop + self.fs_step, self.fs_step))
         else:
             self.eproc_plot_x = np.array(np.arange(self.bs_start, self.bs_stop + self.bs_step, self.bs_step))
-        self.eproc_plot_y = np.zeros([self.eproc_plot_x.size, 4])
+        # Running mean over sweeps and accumulations of every point, eproc_plot_y is a view on it
+        self._point_statistics = RunningStatistics([self.eproc_plot_x.size, 4])
+        self.eproc_plot_y = self._point_statistics.mean
 
-        self.sigEprocPlotsUpdated.emit(self.eproc_plot_x, self.eproc_plot_y)
+        self.plot_updates.post('plots', self.eproc_plot_x, self.eproc_plot_y)
         self.sigSetLabelEprocPlots.emit()
         return
 
@@ -384,6 +478,85 @@ class EPRoCLogic(GenericLogic):
         self.sigParameterUpdated.emit(param_dict)
         return self.n_sweep, self.n_accumulation
 
+    def set_batch_acquisition(self, is_batch, batch_points):
+        """ Switch between the stepwise acquisition (one lockin sample per event loop pass) and the batched
+        acquisition (batch_points complete points per event loop pass, hardware sweep of the microwave if supported).
+        """
+        if self.module_state() != 'locked' and not self.is_eproc_running:
+            if isinstance(is_batch, bool) and isinstance(batch_points, int) and batch_points > 0:
+                self.is_batch_acquisition = is_batch
+                self.batch_points = batch_points
+            else:
+                self.log.warning('set_batch_acquisition failed. Batch points must be a positive integer.')
+        else:
+            self.log.warning('set_batch_acquisition failed. Logic is locked or eproc scan is running.')
+
+        param_dict = {'is_batch_acquisition': self.is_batch_acquisition, 'batch_points': self.batch_points}
+        self.sigParameterUpdated.emit(param_dict)
+        return self.is_batch_acquisition, self.batch_points
+
+    def set_keep_raw_data(self, keep):
+        """ Choose if every single lockin sample is kept in eproc_raw_data (memory n_sweep * n_accumulation * points)
+        or only the running averages per point and per sweep, which are all that is saved.
+        """
+        if self.module_state() != 'locked' and not self.is_eproc_running:
+            self.keep_raw_data = bool(keep)
+        else:
+            self.log.warning('set_keep_raw_data failed. Logic is locked or eproc scan is running.')
+        self.sigParameterUpdated.emit({'keep_raw_data': self.keep_raw_data})
+        return self.keep_raw_data
+
+    def set_use_raw_data_file(self, use):
+        """ Choose if the kept raw data is written into a memory mapped file (see RawDataFile) in the eproc data
+        directory or held in RAM. Only the file allows to resume a crashed scan with resume_eproc.
+        """
+        if self.module_state() != 'locked' and not self.is_eproc_running:
+            self.use_raw_data_file = bool(use)
+        else:
+            self.log.warning('set_use_raw_data_file failed. Logic is locked or eproc scan is running.')
+        self.sigParameterUpdated.emit({'use_raw_data_file': self.use_raw_data_file})
+        return self.use_raw_data_file
+
+    def set_lia_validity_parameters(self, threshold, max_retries, retry_timeout, checked_channels):
+        """ Set the policy used to measure again lockin data which is not real data (value close to zero).
+
+        @param float threshold: values with an absolute value below the threshold are invalid
+        @param int max_retries: maximum number of new measurements for one sample
+        @param float retry_timeout: maximum time in s spent measuring again one sample
+        @param list checked_channels: four bool, only the channels set to True are checked (e.g. False for an unused
+                                      channel, which is always zero)
+        """
+        if self.module_state() != 'locked' and not self.is_eproc_running:
+            if isinstance(threshold, (int, float)) and isinstance(max_retries, int) \
+                    and isinstance(retry_timeout, (int, float)) and len(checked_channels) == 4 \
+                    and threshold >= 0 and max_retries >= 0 and retry_timeout >= 0:
+                self.lia_invalid_threshold = threshold
+                self.lia_max_retries = max_retries
+                self.lia_retry_timeout = retry_timeout
+                self.lia_checked_channels = [bool(checked) for checked in checked_channels]
+            else:
+                self.log.warning('set_lia_validity_parameters failed. At least one value is not of the correct type '
+                                 'or negative.')
+        else:
+            self.log.warning('set_lia_validity_parameters failed. Logic is locked or eproc scan is running.')
+
+        param_dict = {'lia_invalid_threshold': self.lia_invalid_threshold, 'lia_max_retries': self.lia_max_retries,
+                      'lia_retry_timeout': self.lia_retry_timeout, 'lia_checked_channels': self.lia_checked_channels}
+        self.sigParameterUpdated.emit(param_dict)
+        return self.lia_invalid_threshold, self.lia_max_retries, self.lia_retry_timeout, self.lia_checked_channels
+
+    def get_lia_validity_status(self):
+        """ Counters of the validity check for the sweeps of the current (or last) scan.
+
+        @return dict: 'lia_retries': new measurements per sweep,
+                      'lia_invalid_reads': samples which were still invalid after the retry budget, per sweep,
+                      'lia_retry_time': time in s spent measuring again, per sweep
+        """
+        n_sweeps = min(self.elapsed_sweeps + 1, self.lia_retries.size)
+        return {'lia_retries': self.lia_retries[:n_sweeps].tolist(),
+                'lia_invalid_reads': self.lia_invalid_reads[:n_sweeps].tolist(),
+                'lia_retry_time': self.lia_retry_time[:n_sweeps].tolist()}
+
     def set_frequency_multiplier(self, multiplier):
         if self.module_state() != 'locked':
             self.f_multiplier = multiplier
@@ -517,6 +690,40 @@ class EPRoCLogic(GenericLogic):
         return
 
     def start_eproc(self):
+        return self._start_eproc()
+
+    def resume_eproc(self, filename):
+        """ Continue a scan from its raw data file, e.g. after a crash. The scan parameters are taken from the file
+        and the scan goes on with the first sweep that was not completed (flushed) in the file.
+
+        @param str filename: the .npy raw data file of the scan
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if self.module_state() == 'locked' or self.is_eproc_running:
+            self.log.error('Can not resume eproc scan. Logic is locked or eproc scan is running.')
+            return -1
+        try:
+            raw_data_file = RawDataFile.open(filename)
+        except (OSError, ValueError) as err:
+            self.log.error('Can not resume eproc scan, raw data file {0} can not be opened: {1}'.format(filename, err))
+            return -1
+        metadata = raw_data_file.metadata
+        if raw_data_file.progress.get('elapsed_sweeps', 0) >= metadata['n_sweep']:
+            self.log.error('Can not resume eproc scan, all the sweeps in {0} are completed.'.format(filename))
+            raw_data_file.close()
+            return -1
+
+        self.is_fs = metadata['is_fs']
+        for key, value in metadata['scan_parameters'].items():
+            setattr(self, key, value)
+        self.n_sweep = metadata['n_sweep']
+        self.n_accumulation = metadata['n_accumulation']
+        # A resumed scan writes into the raw data file, whatever keep_raw_data is set to
+        return self._start_eproc(raw_data_file)
+
+    def _start_eproc(self, raw_data_file=None):
+        """ Start a new scan, or continue the scan of raw_data_file after its completed sweeps. """
         with self.threadlock:
             if self.module_state() == 'locked':
                 self.log.error('Can not start eproc scan. Logic is already locked.')
@@ -546,18 +753,34 @@ class EPRoCLogic(GenericLogic):
                                                       * self.eproc_plot_x.size * self.n_sweep)
             self._startTime = time.time()
 
+            self._close_raw_data_file()
             self._initialize_eproc_plots()
-            self.eproc_raw_data = np.zeros(
-                [self.n_sweep,
-                 self.n_accumulation,
-                 self.eproc_plot_x.size,
-                 4]  # number of channels {2 or 4}
-            )
+            if raw_data_file is not None:
+                if raw_data_file.data.shape != (self.n_sweep, self.n_accumulation, self.eproc_plot_x.size, 4):
+                    self.log.error('Can not resume eproc scan, the scan parameters do not match the shape of the '
+                                   'raw data file {0}.'.format(raw_data_file.filename))
+                    raw_data_file.close()
+                    return -1
+            elif self.keep_raw_data and self.use_raw_data_file:
+                raw_data_file = self._create_raw_data_file()
+            self._initialize_eproc_data(raw_data_file)
+            self._initialize_lia_validity_counters()
+            if raw_data_file is not None:
+                self.elapsed_sweeps = self._restore_raw_data()
+                remaining_time *= (self.n_sweep - self.elapsed_sweeps) / self.n_sweep
+
+            self._is_hw_sweep = self.is_batch_acquisition and self.is_fs and self._use_mw_sweep()
+            if self._is_hw_sweep:
+                self._start_mw_sweep()
 
             # self.module_state.lock()
             self.stopRequested = False
             self.stopNextSweepRequested = False
             # self.fc.clear_result()
+            if self._live_fit is not None:
+                self.fc.set_units(['Hz' if self.is_fs else 'G', 'V'])
+                self._live_fit.reset_statistics()
+            self.plot_updates.reset_statistics()
 
             self.is_eproc_running = True
             self.sigEprocRemainingTimeUpdated.emit(remaining_time, self.elapsed_sweeps)
@@ -596,62 +819,235 @@ class EPRoCLogic(GenericLogic):
 
             if self.stopRequested:
                 self.stopRequested = False
+                if self._is_hw_sweep:
+                    self._stop_mw_sweep()
+                if self._raw_data_file is not None:
+                    self._raw_data_file.flush(elapsed_sweeps=self.elapsed_sweeps)
                 self.is_eproc_running = False
                 self.measurement_duration = time.time() - self._startTime
                 # self.module_state.unlock()
+                self.plot_updates.flush()
                 self.sigStatusUpdated.emit()
+                self.log.debug('Plot updates: {0}.'.format(self.plot_updates.statistics_message()))
+                if self._live_fit is not None and self._live_fit.statistics['fits'] > 0:
+                    stats = self._live_fit.statistics
+                    self.log.info('Live fit: {0:d} fits, {1:d} skipped, latency {2:.3f} s (mean), {3:.3f} s (max), '
+                                  'fit time {4:.3f} s (mean).'.format(stats['fits'], stats['skipped'],
+                                                                      stats['mean_latency'], stats['max_latency'],
+                                                                      stats['mean_fit_time']))
                 return
 
-            # Between two accumulations on the same point wait for an arbitrary value of tau/10
-            time.sleep(self.lia_waiting_time)
-            self._get_data_lia()
+            first_index = self.actual_index
+            if self.is_batch_acquisition:
+                self._acquire_batch()
+            else:
+                # Between two accumulations on the same point wait for an arbitrary value of tau/10
+                time.sleep(self.lia_waiting_time)
+                self._get_data_lia()
 
-            self.elapsed_accumulations += 1
-            self._set_new_parameters()
+                self.elapsed_accumulations += 1
+                self._set_new_parameters()
 
             self._update_remaining_time()
-            self.sigEprocPlotsUpdated.emit(self.eproc_plot_x, self.eproc_plot_y)
+            # Only the points from first_index on changed, unless the sweep started over
+            changed = (first_index, self.actual_index + 1) if self.actual_index >= first_index else None
+            self.plot_updates.post('plots', self.eproc_plot_x, self.eproc_plot_y, changed=changed)
+            # Hand the spectrum to the live fit once every point has data, returns immediately
+            if self._live_fit is not None and self._live_fit.is_running and self.elapsed_sweeps > 0:
+                self._live_fit.submit(self.eproc_plot_x, self.eproc_plot_y[:, self.live_fit_channel],
+                                      tag=self.live_fit_channel)
             self.sigNextDataPoint.emit()
             return
 
+    def _acquire_batch(self):
+        """ Acquire up to batch_points complete points (all the accumulations) without going through the event
+        loop. The batch ends early at the end of a sweep or if a stop was requested, so that the sweep counter and the
+        stop buttons still respond once per sweep at the latest.
+        """
+        for point in range(self.batch_points):
+            # All the remaining accumulations of the point are read in one block
+            block = self._lia_device.get_data_lia_block(self.n_accumulation - self.elapsed_accumulations,
+                                                        self.lia_waiting_time)
+            for data in block:
+                self._store_data_lia(self._validate_data_lia(data))
+                self.elapsed_accumulations += 1
+            self._set_new_parameters()
+            if self.stopRequested or self.actual_index == 0:
+                break
+        return 0
+
+    def _use_mw_sweep(self):
+        """ Check if the microwave source can step through the frequency sweep on its own (SWEEP mode). """
+        return self.mw_scanmode == MicrowaveMode.SWEEP \
+            and MicrowaveMode.SWEEP in self.get_hw_constraints().supported_modes
+
+    def _start_mw_sweep(self):
+        """ Program the whole frequency sweep into the microwave source. Every trigger moves to the next point, so
+        stepping costs one trigger instead of a full set_cw (mode check, frequency, power and read back).
+        """
+        mode, self._mw_was_running = self._mw_device.get_status()
+        self._mw_device.set_sweep(self.fs_start, self.fs_stop, self.fs_step, self.fs_mw_power)
+        if self._mw_was_running:
+            self._mw_device.sweep_on()
+        # The sweep is programmed to start one step before fs_start, the first trigger moves to fs_start
+        self._mw_device.trigger()
+        self.fs_actual_frequency = self.fs_start
+        return
+
+    def _stop_mw_sweep(self):
+        """ Go back to cw mode at the start frequency, with the output state found before the sweep. """
+        self._is_hw_sweep = False
+        self.fs_actual_frequency, self.fs_mw_power, mode = self._mw_device.set_cw(self.fs_start, self.fs_mw_power)
+        if self._mw_was_running:
+            self._mw_device.cw_on()
+        else:
+            self._mw_device.off()
+        return
+
     def _get_data_lia(self):
         """ Get data from the lockin amplifier. The number of channels is four."""
-        self.eproc_raw_data[
-            self.elapsed_sweeps, self.elapsed_accumulations,
-            self.actual_index, :] = self._lia_device.get_data_lia()
-
-        # Measure again if data from Lia is not real data (when this happens the value is really close to zero)
-        for i in range(len(self.eproc_raw_data[0, 0, 0, :])):
-            while abs(self.eproc_raw_data[
-                          self.elapsed_sweeps, self.elapsed_accumulations, self.actual_index, i]) < 1e-7:
-                time.sleep(0.01)
-                self.eproc_raw_data[self.elapsed_sweeps, self.elapsed_accumulations,
-                                    self.actual_index, :] = self._lia_device.get_data_lia()
+        self._store_data_lia(self._validate_data_lia(self._lia_device.get_data_lia()))
         return 0
 
+    def _store_data_lia(self, data):
+        """ Add one sample of the four channels at the actual sweep, accumulation and point to the running averages
+        (and to the raw data if it is kept). The plot data is a view on the running average, so it is up to date
+        without averaging again over the previous sweeps.
+        """
+        if self._keep_raw_data:
+            self.eproc_raw_data[self.elapsed_sweeps, self.elapsed_accumulations, self.actual_index, :] = data
+        self._point_statistics.add(data, self.actual_index)
+        self._sweep_statistics.add(data, (self.elapsed_sweeps, self.actual_index))
+        return 0
+
+    def _initialize_eproc_data(self, raw_data_file=None):
+        """ Allocate the running averages per sweep and, if requested, the raw data array.
+
+        @param RawDataFile raw_data_file: optional, the raw data is written into this file instead of RAM
+        """
+        # Average over the accumulations of every point of every sweep, this is what is saved as raw data
+        self._sweep_statistics = RunningStatistics([self.n_sweep, self.eproc_plot_x.size, 4])
+        self._keep_raw_data = self.keep_raw_data or raw_data_file is not None
+        if raw_data_file is not None:
+            self._raw_data_file = raw_data_file
+            self.eproc_raw_data = raw_data_file.data
+        elif self.keep_raw_data:
+            self.eproc_raw_data = np.zeros(
+                [self.n_sweep,
+                 self.n_accumulation,
+                 self.eproc_plot_x.size,
+                 4]  # number of channels {2 or 4}
+            )
+        else:
+            self.eproc_raw_data = np.zeros([0, 0, self.eproc_plot_x.size, 4])
+        return
+
+    def _create_raw_data_file(self):
+        """ Create the raw data file of a new scan, with everything needed to resume it in its metadata. """
+        if self.is_fs:
+            scan_parameters = {'fs_start': self.fs_start, 'fs_step': self.fs_step, 'fs_stop': self.fs_stop,
+                               'fs_field': self.fs_field, 'fs_mw_power': self.fs_mw_power}
+        else:
+            scan_parameters = {'bs_start': self.bs_start, 'bs_step': self.bs_step, 'bs_stop': self.bs_stop,
+                               'bs_frequency': self.bs_frequency, 'bs_mw_power': self.bs_mw_power}
+        metadata = {'is_fs': self.is_fs,
+                    'scan_parameters': scan_parameters,
+                    'n_sweep': self.n_sweep,
+                    'n_accumulation': self.n_accumulation,
+                    'x': self.eproc_plot_x.tolist()}
+        return RawDataFile.create(self._save_logic.get_path_for_module(module_name='eproc'),
+                                  'eproc_rawdata',
+                                  [self.n_sweep, self.n_accumulation, self.eproc_plot_x.size, 4],
+                                  ['sweep', 'accumulation', 'point', 'channel'],
+                                  metadata)
+
+    def _restore_raw_data(self):
+        """ Rebuild the running averages from the completed sweeps of the raw data file.
+
+        @return int: number of completed sweeps
+        """
+        completed_sweeps = self._raw_data_file.progress.get('elapsed_sweeps', 0)
+        for sweep in range(completed_sweeps):
+            for accumulation in range(self.n_accumulation):
+                data = self.eproc_raw_data[sweep, accumulation]
+                self._point_statistics.add(data)
+                self._sweep_statistics.add(data, sweep)
+        return completed_sweeps
+
+    def _close_raw_data_file(self):
+        if self._raw_data_file is not None:
+            self._raw_data_file.close()
+            self._raw_data_file = None
+        return
+
+    def _validate_data_lia(self, data):
+        """ Measure again if data from Lia is not real data (when this happens the value is really close to zero).
+
+        Only the checked channels are tested. The new measurements are bounded by lia_max_retries and
+        lia_retry_timeout; if the data is still invalid afterwards it is kept and counted as invalid read.
+
+        @param data: the four channel values read from the lockin
+        @return numpy.ndarray: the four channel values to store
+        """
+        data = np.asarray(data, dtype=np.float64)
+        checked = np.asarray(self.lia_checked_channels, dtype=bool)
+        if not np.any(np.abs(data[checked]) < self.lia_invalid_threshold):
+            return data
+
+        start_time = time.time()
+        retries = 0
+        is_valid = False
+        while not is_valid and retries < self.lia_max_retries \
+                and time.time() - start_time < self.lia_retry_timeout:
+            time.sleep(0.01)
+            retries += 1
+            data = np.asarray(self._lia_device.get_data_lia(), dtype=np.float64)
+            is_valid = not np.any(np.abs(data[checked]) < self.lia_invalid_threshold)
+
+        self.lia_retries[self.elapsed_sweeps] += retries
+        self.lia_retry_time[self.elapsed_sweeps] += time.time() - start_time
+        if not is_valid:
+            self.lia_invalid_reads[self.elapsed_sweeps] += 1
+        return data
+
+    def _initialize_lia_validity_counters(self):
+        """ Reset the per sweep counters of the validity check. """
+        self.lia_retries = np.zeros(self.n_sweep, dtype=int)
+        self.lia_invalid_reads = np.zeros(self.n_sweep, dtype=int)
+        self.lia_retry_time = np.zeros(self.n_sweep)
+        return
+
     def _set_new_parameters(self):
         """Set new field and microwave parameters if necessary.
 
-        1. If all accumulations are completed: perform average and set new x position.
+        1. If all accumulations are completed: set new x position.
         2. If the x position reached the stop value: go back to initial x position.
         3. If all sweeps are completed or stopNextSweepRequested: stop.
         """
         if self.elapsed_accumulations == self.n_accumulation:
-            self._average_data()  # average over accumulations for the current x and the current sweep to update the plots
-
             self.elapsed_accumulations = 0
             if self.actual_index == self.eproc_plot_x.size - 1:
-                if self.is_fs:
+                if self._is_hw_sweep:
+                    self._mw_device.reset_sweeppos()
+                    self._mw_device.trigger()
+                    self.fs_actual_frequency = self.fs_start
+                elif self.is_fs:
                     self.fs_actual_frequency, self.fs_mw_power, mode = \
                         self._mw_device.set_cw(self.fs_start, self.fs_mw_power)
                 else:
                     self.bs_actual_field = self._magnet.set_central_field(self.bs_start)
+                self._log_lia_validity()
                 self.elapsed_sweeps += 1
+                if self._raw_data_file is not None:
+                    self._raw_data_file.flush(elapsed_sweeps=self.elapsed_sweeps)
                 self.actual_index = 0
                 if self.elapsed_sweeps == self.n_sweep or self.stopNextSweepRequested:
                     self.stopRequested = True
             else:
-                if self.is_fs:
+                if self._is_hw_sweep:
+                    self._mw_device.trigger()
+                    self.fs_actual_frequency += self.fs_step
+                elif self.is_fs:
                     self.fs_actual_frequency, self.fs_mw_power, mode = \
                         self._mw_device.set_cw(self.fs_actual_frequency + self.fs_step, self.fs_mw_power)
                 else:
@@ -659,14 +1055,124 @@ class EPRoCLogic(GenericLogic):
                 self.actual_index += 1
         return 0
 
-    def _average_data(self):
-        """Average over the sweeps that were already performed and the accumulations at fixed value of index."""
-        self.eproc_plot_y[self.actual_index] = np.mean(
-            self.eproc_raw_data[:self.elapsed_sweeps + 1, :, self.actual_index, :],
-            axis=(0, 1),
-            dtype=np.float64
-        )
-        return 0
+    def _log_lia_validity(self):
+        """ Publish the validity counters of the sweep that just ended and warn about invalid reads. """
+        sweep = self.elapsed_sweeps
+        if self.lia_invalid_reads[sweep] > 0:
+            self.log.warning('Sweep {0}: {1} lockin reads were still invalid after {2} retries or {3} s. Check the '
+                             'channels and lia_checked_channels.'.format(sweep + 1, self.lia_invalid_reads[sweep],
+                                                                         self.lia_max_retries,
+                                                                         self.lia_retry_timeout))
+        self.sigParameterUpdated.emit(self.get_lia_validity_status())
+        return
+
+    def get_eproc_plot_errors(self):
+        """ Standard error of eproc_plot_y, from the spread of all the samples (sweeps and accumulations) of every
+        point. NaN for points with less than two samples.
+
+        @return numpy.ndarray: same shape as eproc_plot_y
+        """
+        return self._point_statistics.standard_error
+
+    def get_fit_functions(self):
+        """ Return the names of all configured fit functions (empty without fitlogic).
+        @return list(str): list of fit function names
+        """
+        if self.fc is None:
+            return []
+        return list(self.fc.fit_list)
+
+    def do_fit(self, fit_function=None, x_data=None, y_data=None, channel_index=0):
+        """
+        Execute the currently configured fit on the measurement data. Optionally on passed data
+
+        @param str fit_function: optional, name of the configured fit to use, default: the current fit
+        @param x_data: optional, x values, default: eproc_plot_x
+        @param y_data: optional, y values, default: eproc_plot_y of the channel
+        @param int channel_index: lockin channel of eproc_plot_y to fit
+
+        @return tuple: fit x, fit y and lmfit ModelResult (None if no fit was done)
+        """
+        if self.fc is None:
+            self.log.error('No fitlogic connected to the EPRoC logic, can not fit.')
+            return None, None, None
+        if (x_data is None) or (y_data is None):
+            x_data = self.eproc_plot_x
+            y_data = self.eproc_plot_y[:, channel_index]
+        if fit_function is not None and isinstance(fit_function, str):
+            if fit_function in self.get_fit_functions():
+                self.fc.set_current_fit(fit_function)
+            else:
+                self.fc.set_current_fit('No Fit')
+                if fit_function != 'No Fit':
+                    self.log.warning('Fit function "{0}" not available in EPRoC logic fit container.'
+                                     ''.format(fit_function))
+
+        fit_x, fit_y, result = self.fc.do_fit(x_data, y_data)
+        self._store_fit(fit_x, fit_y, result, self.fc.current_fit, channel_index)
+        return fit_x, fit_y, result
+
+    def set_live_fit(self, enabled, interval=None, channel_index=None):
+        """
+        Switch the continuous fit of the averaged spectrum on or off. The current fit is done in a background thread
+        at most every interval seconds on the latest spectrum (from the second sweep on, when every point has data),
+        the acquisition never waits for it. The results are emitted with sigEprocFitUpdated like the ones of do_fit.
+
+        @param bool enabled: fit continuously during the scan
+        @param float interval: optional, minimum time between two fits in s
+        @param int channel_index: optional, lockin channel to fit
+
+        @return dict: the actually set live fit parameters
+        """
+        if interval is not None:
+            self.live_fit_interval = max(float(interval), 0.)
+        if channel_index is not None:
+            self.live_fit_channel = int(channel_index)
+        self.live_fit_enabled = bool(enabled)
+        if self._live_fit is None:
+            if self.live_fit_enabled:
+                self.log.warning('No fitlogic connected to the EPRoC logic, live fit is not available.')
+            self.live_fit_enabled = False
+        else:
+            self._live_fit.interval = self.live_fit_interval
+            if self.live_fit_enabled:
+                self._live_fit.start()
+            else:
+                self._live_fit.stop()
+
+        update_dict = {'live_fit_enabled': self.live_fit_enabled,
+                       'live_fit_interval': self.live_fit_interval,
+                       'live_fit_channel': self.live_fit_channel}
+        self.sigParameterUpdated.emit(update_dict)
+        return update_dict
+
+    def get_live_fit_statistics(self):
+        """ Statistics of the live fit since the start of the scan, see LiveFitWorker.statistics.
+
+        @return dict: number of fits, skipped and failed fits, latencies and fit duration in s
+        """
+        if self._live_fit is None:
+            return {}
+        return dict(self._live_fit.statistics)
+
+    def _live_fit_updated(self, fit_name, fit_x, fit_y, result, info):
+        """ Take over a result of the live fit (in the logic thread). """
+        if result is None:
+            return
+        self.fc.current_fit_param = result.params
+        self.fc.current_fit_result = result
+        self._store_fit(fit_x, fit_y, result, fit_name, info['tag'])
+        return
+
+    def _store_fit(self, fit_x, fit_y, result, fit_name, channel_index):
+        key = 'channel: {0}'.format(channel_index)
+        if result is not None:
+            self.fits_performed[key] = (fit_x, fit_y, result, fit_name)
+        else:
+            self.fits_performed.pop(key, None)
+        result_str_dict = {} if result is None else result.result_str_dict
+        self.sigEprocFitUpdated.emit(fit_x, fit_y, result_str_dict, fit_name)
+        return
 
     def _update_remaining_time(self):
         """Compute new remaining time and emit signal to the gui."""
@@ -701,35 +1207,29 @@ class EPRoCLogic(GenericLogic):
         tag_raw = tag + '_rawdata'
         ending = '.txt'
 
-        # Data, on which the average on accumulations and sweeps was performed
+        n_channels = self.eproc_plot_y.shape[1]
+        # Data, on which the average on accumulations and sweeps was performed, followed by its standard error
+        eproc_plot_y_error = self.get_eproc_plot_errors()
         eproc_data_list = [self.eproc_plot_x]
-
-        for channel in range(len(self.eproc_raw_data[0, 0, 0, :])):
+        for channel in range(n_channels):
             eproc_data_list.append(self.eproc_plot_y[:, channel])
+        for channel in range(n_channels):
+            eproc_data_list.append(eproc_plot_y_error[:, channel])
 
-        # Raw data, only the average on the accumulations was performed
+        # Raw data, only the average on the accumulations was performed (running average per sweep)
+        n_saved_sweeps = min(self.elapsed_sweeps + 1, self.n_sweep)
         eproc_raw_data_list = [self.eproc_plot_x]
-        for channel in range(len(self.eproc_raw_data[0, 0, 0, :])):
-            # fix: this works if the sweep is not finished, otherwise it doesnt work!!
-            if self.elapsed_sweeps == self.n_sweep:
-                for sweep in range(self.elapsed_sweeps):
-                    eproc_raw_data_list.append(np.mean(self.eproc_raw_data[sweep, :, :, channel],
-                                                       axis=0,
-                                                       # axis = 0 in this case means an average over accumulations
-                                                       dtype=np.float64))
-            else:
-                for sweep in range(self.elapsed_sweeps + 1):
-                    eproc_raw_data_list.append(np.mean(self.eproc_raw_data[sweep, :, :, channel],
-                                                       axis=0,
-                                                       # axis = 0 in this case means an average over accumulations
-                                                       dtype=np.float64))
+        for channel in range(n_channels):
+            for sweep in range(n_saved_sweeps):
+                eproc_raw_data_list.append(self._sweep_statistics.mean[sweep, :, channel])
 
         eproc_data = OrderedDict()
         eproc_raw_data = OrderedDict()
         parameters = OrderedDict()
 
         if self.is_fs:
-            eproc_data['Frequency\t\tChannel 1\t\tChannel 2\t\tChannel 3\t\tChannel 4'] = np.array(
+            eproc_data['Frequency\t\tChannel 1\t\tChannel 2\t\tChannel 3\t\tChannel 4'
+                       '\t\tError 1\t\tError 2\t\tError 3\t\tError 4'] = np.array(
                 eproc_data_list).transpose()
             eproc_raw_data['Column 0: frequency\n'
                            'From column 1 to column {0}: channel 1, sweep 1 to sweep {0}\n'
@@ -747,7 +1247,8 @@ class EPRoCLogic(GenericLogic):
             parameters['Step Size (Hz)'] = str(self.fs_step)
             parameters['Stop Frequency (Hz)'] = str(self.fs_stop)
         else:
-            eproc_data['Field\t\tChannel 1\t\tChannel 2\t\tChannel 3\t\tChannel 4'] = np.array(
+            eproc_data['Field\t\tChannel 1\t\tChannel 2\t\tChannel 3\t\tChannel 4'
+                       '\t\tError 1\t\tError 2\t\tError 3\t\tError 4'] = np.array(
                 eproc_data_list).transpose()
             eproc_raw_data['Column 0: field\n'
                            'From column 1 to column {0}: channel 1, sweep 1 to sweep {0}\n'
@@ -783,6 +1284,12 @@ class EPRoCLogic(GenericLogic):
         parameters['Lockin Slope (dB/oct)'] = self.lia_slope
         parameters['Lockin Configuration'] = self.lia_configuration
 
+        validity_status = self.get_lia_validity_status()
+        parameters['Lockin Checked Channels'] = self.lia_checked_channels
+        parameters['Lockin Retries Per Sweep'] = validity_status['lia_retries']
+        parameters['Lockin Invalid Reads Per Sweep'] = validity_status['lia_invalid_reads']
+        parameters['Lockin Retry Time Per Sweep (s)'] = [round(t, 3) for t in validity_status['lia_retry_time']]
+
         if self.is_lia_ext_ref:
             parameters['Modulation Frequency (Hz)'] = str(self.ref_freq)
             parameters['Modulation Deviation (Hz)'] = str(self.ref_dev)
@@ -790,6 +1297,15 @@ class EPRoCLogic(GenericLogic):
         else:
             parameters['Lockin Internal Modulation Frequency (Hz)'] = self.lia_int_freq
 
+        if self._raw_data_file is not None:
+            parameters['Raw Data File'] = self._raw_data_file.filename
+            # The single samples are already on disk, only the metadata is completed. A running scan goes on
+            # writing into the file, its parameters are written with the flush after the next sweep.
+            if self.is_eproc_running:
+                self._raw_data_file.set_parameters(parameters)
+            else:
+                self._raw_data_file.finalize(parameters, elapsed_sweeps=self.elapsed_sweeps)
+
         self._save_logic.save_data(eproc_data,
                                    filepath=filepath,
                                    parameters=parameters,
@@ -30,7 +30,11 @@ import time
 import datetime
 import matplotlib.pyplot as plt
 import os
+import threading
 from logic.generic_logic import GenericLogic
+from logic.eproc.mapping_dataset import MappingDataset
+from logic.eproc.mapping_scan_order import SCAN_ORDERS, get_scan_order, refine_positions, estimate_motion_time
+from logic.eproc.raw_data_file import RawDataFile
 from core.util.mutex import Mutex
 from core.connector import Connector
 from core.configoption import ConfigOption
@@ -57,6 +61,14 @@ class EPRoCLogic(GenericLogic):
         'SWEEP',
         missing='warn',
         converter=lambda x: MicrowaveMode[x.upper()])
+    # Motion of the motors for the estimate of the motion time of the mapping (KDC101 defaults, mm and s)
+    motor_velocity = ConfigOption('motor_velocity', 0.5)
+    motor_acceleration = ConfigOption('motor_acceleration', 0.1)
+    motor_move_overhead = ConfigOption('motor_move_overhead', 0.2)
+    # After a move the position is read until it is within the tolerance of the target (at most for the timeout)
+    motor_position_tolerance = ConfigOption('motor_position_tolerance', 1e-3)
+    motor_settle_timeout = ConfigOption('motor_settle_timeout', 5.)
+    motor_poll_interval = ConfigOption('motor_poll_interval', 0.05)
 
     # these go here or in on_activate()?
     number_of_sweeps = StatusVar('number_of_sweeps', 1)
@@ -131,11 +143,26 @@ class EPRoCLogic(GenericLogic):
     z_step = StatusVar('z_step', 0)
     z_stop = StatusVar('z_stop', 0)
 
+    # If True, the raw data of a mapping is written into one memory mapped file (one entry per position) in the eproc
+    # data directory while it arrives
+    use_raw_data_file = StatusVar('use_raw_data_file', False)
+
+    # Order of the positions of the mapping, one of SCAN_ORDERS. The adaptive order measures a coarse grid (every
+    # adaptive_initial_step-th position) and halves the step where the signal of adaptive_channel changes by more than
+    # adaptive_threshold times its range
+    scan_order = StatusVar('scan_order', 'raster')
+    adaptive_initial_step = StatusVar('adaptive_initial_step', 4)
+    adaptive_threshold = StatusVar('adaptive_threshold', 0.1)
+    adaptive_channel = StatusVar('adaptive_channel', 0)
+    # Move the motors of different axes at the same time
+    parallel_motor_moves = StatusVar('parallel_motor_moves', True)
+
     # Internal signals
     sigNextMeasure = QtCore.Signal()
     sigStartNextEproc = QtCore.Signal()
     sigNextPosition = QtCore.Signal()
     sigNextMeasureMapping = QtCore.Signal()
+    sigMotorsSettled = QtCore.Signal(bool)
 
     # Update signals, e.g. for GUI module
     sigParameterUpdated = QtCore.Signal(dict)
@@ -178,6 +205,11 @@ class EPRoCLogic(GenericLogic):
 
         self.is_eproc_running = False
         self.is_eproc_mapping_running = False
+        self._raw_data_file = None
+        self.mapping_dataset = None
+        self._position_index = 0
+        self.position_timings = list()
+        self._move_thread = None
 
         # Set flag for stopping a measurement
         self.stopRequested = False
@@ -218,6 +250,7 @@ class EPRoCLogic(GenericLogic):
         self.sigNextMeasure.connect(self._next_measure, QtCore.Qt.QueuedConnection)
         self.sigStartNextEproc.connect(self.start_eproc, QtCore.Qt.QueuedConnection)
         self.sigNextPosition.connect(self._next_position, QtCore.Qt.QueuedConnection)
+        self.sigMotorsSettled.connect(self._start_position, QtCore.Qt.QueuedConnection)
         return
 
     def on_deactivate(self):
@@ -238,10 +271,13 @@ class EPRoCLogic(GenericLogic):
                 break
         # Switch off microwave source for sure (also if CW mode is active or module is still locked)
         self._mw_device.off()
+        self._close_raw_data_file()
+        self._close_mapping_dataset()
         # Disconnect signals
         self.sigNextMeasure.disconnect()
         self.sigStartNextEproc.disconnect()
         self.sigNextPosition.disconnect()
+        self.sigMotorsSettled.disconnect()
 
     def _initialize_eproc_plots(self):
         """ Initializing the eproc plots. """
@@ -431,6 +467,49 @@ class EPRoCLogic(GenericLogic):
         self.sigParameterUpdated.emit(param_dict)
         return self.number_of_sweeps, self.number_of_accumulations
 
+    def set_use_raw_data_file(self, use):
+        """ Choose if the raw data of a mapping is written into a memory mapped file (see RawDataFile). """
+        if self.module_state() != 'locked' and not self.is_eproc_mapping_running:
+            self.use_raw_data_file = bool(use)
+        else:
+            self.log.warning('set_use_raw_data_file failed. Logic is locked or eproc mapping is running.')
+        self.sigParameterUpdated.emit({'use_raw_data_file': self.use_raw_data_file})
+        return self.use_raw_data_file
+
+    def set_scan_order(self, order, adaptive_initial_step=None, adaptive_threshold=None, adaptive_channel=None):
+        """ Set the order of the positions of the mapping (see SCAN_ORDERS) and the parameters of the adaptive order.
+        """
+        if self.module_state() == 'locked' or self.is_eproc_mapping_running:
+            self.log.warning('set_scan_order failed. Logic is locked or eproc mapping is running.')
+        elif order not in SCAN_ORDERS:
+            self.log.warning('set_scan_order failed. Scan order must be one of {0}.'.format(SCAN_ORDERS))
+        else:
+            self.scan_order = order
+            if adaptive_initial_step is not None:
+                self.adaptive_initial_step = max(int(adaptive_initial_step), 1)
+            if adaptive_threshold is not None:
+                self.adaptive_threshold = float(adaptive_threshold)
+            if adaptive_channel is not None:
+                self.adaptive_channel = int(adaptive_channel)
+
+        param_dict = {'scan_order': self.scan_order, 'adaptive_initial_step': self.adaptive_initial_step,
+                      'adaptive_threshold': self.adaptive_threshold, 'adaptive_channel': self.adaptive_channel}
+        self.sigParameterUpdated.emit(param_dict)
+        return self.scan_order
+
+    def get_motion_time_estimates(self):
+        """ Estimated motion time of the motors through the actual grid for every scan order. The adaptive order
+        is estimated for its coarse grid, the refinement adds to it.
+
+        @return dict: scan order -> time in s
+        """
+        coordinates = self._get_grid_coordinates()
+        shape = tuple(len(axis_coordinates) for axis_coordinates in coordinates)
+        return {order: estimate_motion_time(get_scan_order(order, shape, self.adaptive_initial_step), coordinates,
+                                            self.motor_velocity, self.motor_acceleration, self.motor_move_overhead,
+                                            parallel=self.parallel_motor_moves)
+                for order in SCAN_ORDERS}
+
     def set_frequency_multiplier(self, multiplier):
         if self.module_state() != 'locked':
             self.frequency_multiplier = multiplier
@@ -594,12 +673,16 @@ class EPRoCLogic(GenericLogic):
             self._startTime = time.time()
 
             self._initialize_eproc_plots()
-            self.eproc_raw_data = np.zeros(
-                [self.number_of_sweeps,
-                 self.number_of_accumulations,
-                 self.eproc_plot_x.size,
-                 4]  # number of channels {2 or 4}
-            )
+            if self.is_eproc_mapping_running and self._raw_data_file is not None:
+                # Write straight into the entry of the actual position in the raw data file of the mapping
+                self.eproc_raw_data = self._raw_data_file.data[self._position_index]
+            else:
+                self.eproc_raw_data = np.zeros(
+                    [self.number_of_sweeps,
+                     self.number_of_accumulations,
+                     self.eproc_plot_x.size,
+                     4]  # number of channels {2 or 4}
+                )
 
             # self.module_state.lock()
             self.stopRequested = False
@@ -643,6 +726,10 @@ class EPRoCLogic(GenericLogic):
 
             if self.stopRequested:
                 self.stopRequested = False
+                if self.is_eproc_mapping_running and self._raw_data_file is not None:
+                    self._raw_data_file.flush(elapsed_positions=self._position_index,
+                                              elapsed_sweeps=self.elapsed_sweeps)
+                self.is_eproc_mapping_running = False
                 self.is_eproc_running = False
                 self.measurement_duration = time.time() - self._startTime
                 # self.module_state.unlock()
@@ -695,6 +782,9 @@ class EPRoCLogic(GenericLogic):
                 else:
                     self.fs_actual_field = self._magnet.set_central_field(self.fs_start)
                 self.elapsed_sweeps += 1
+                if self.is_eproc_mapping_running and self._raw_data_file is not None:
+                    self._raw_data_file.flush(elapsed_positions=self._position_index,
+                                              elapsed_sweeps=self.elapsed_sweeps)
                 self.actual_index = 0
                 if self.elapsed_sweeps == self.number_of_sweeps or self.stopNextSweepRequested:
                     if self.is_eproc_mapping_running:
@@ -997,13 +1087,24 @@ class EPRoCLogic(GenericLogic):
                                   self.y_motor_set_position, self.y_start, self.y_step, self.y_stop,
                                   self.z_motor_set_position, self.z_start, self.z_step, self.z_stop)
 
-        self._x_motor.move(self.x_start)
-        self._y_motor.move(self.y_start)
-        self._z_motor.move(self.z_start)
-
-        self.actual_x = self.x_start
-        self.actual_y = self.y_start
-        self.actual_z = self.z_start
+        self.check_ranges()
+        self._initialize_eproc_plots()
+        self._close_raw_data_file()
+        self._close_mapping_dataset()
+
+        self._grid_coordinates = self._get_grid_coordinates()
+        shape = tuple(len(axis_coordinates) for axis_coordinates in self._grid_coordinates)
+        self._scan_positions = get_scan_order(self.scan_order, shape, self.adaptive_initial_step)
+        self._adaptive_step = self.adaptive_initial_step if self.scan_order == 'adaptive' else 1
+        motion_time_estimates = self.get_motion_time_estimates()
+        self.log.info('Estimated motion time of the mapping: {0}'.format(
+            ', '.join('{0} {1:.0f} s'.format(order, motion_time) for order, motion_time in motion_time_estimates.items())))
+        self.sigParameterUpdated.emit({'motion_time_estimates': motion_time_estimates})
+
+        self._position_index = 0
+        if self.use_raw_data_file:
+            self._raw_data_file = self._create_raw_data_file()
+        self.mapping_dataset = self._create_mapping_dataset()
 
         self.stopRequested = False
         self.stopNextSweepRequested = False
@@ -1012,10 +1113,9 @@ class EPRoCLogic(GenericLogic):
 
         # self.sigEprocRemainingTimeUpdated.emit(remaining_time, self.elapsed_sweeps)
         self.is_eproc_mapping_running = True
-        param_dict = {'x_position': self.actual_x, 'y_position': self.actual_y, 'z_position': self.actual_z}
-        self.sigParameterUpdated.emit(param_dict)
-        self.sigStartNextEproc.emit()
-
+        self.position_timings = list()
+        # The actual motor positions are not known, all the motors are moved. The scan starts at sigMotorsSettled.
+        self._start_move(*self._get_position_coordinates(self._scan_positions[0]), move_all=True)
         return 0
 
     def check_ranges_motors(self):
@@ -1033,36 +1133,234 @@ class EPRoCLogic(GenericLogic):
         self.z_stop = round(self.z_start + self.n_step_z * self.z_step, 4)
         return
 
+    def _get_mapping_metadata(self):
+        """ Parameters of the mapping for the metadata of its files. """
+        if self.is_ms:
+            scan_parameters = {'ms_start': self.ms_start, 'ms_step': self.ms_step, 'ms_stop': self.ms_stop,
+                               'ms_field': self.ms_field, 'ms_mw_power': self.ms_mw_power}
+        else:
+            scan_parameters = {'fs_start': self.fs_start, 'fs_step': self.fs_step, 'fs_stop': self.fs_stop,
+                               'fs_mw_frequency': self.fs_mw_frequency, 'fs_mw_power': self.fs_mw_power}
+        metadata = {'is_ms': self.is_ms,
+                    'scan_parameters': scan_parameters,
+                    'motor_parameters': {'x_start': self.x_start, 'x_step': self.x_step, 'x_stop': self.x_stop,
+                                         'y_start': self.y_start, 'y_step': self.y_step, 'y_stop': self.y_stop,
+                                         'z_start': self.z_start, 'z_step': self.z_step, 'z_stop': self.z_stop},
+                    'number_of_sweeps': self.number_of_sweeps,
+                    'number_of_accumulations': self.number_of_accumulations,
+                    'scan_order': self.scan_order}
+        return metadata
+
+    def _get_grid_coordinates(self):
+        """ x, y and z positions of the motor grid of the mapping. """
+        self.n_step_x = 0
+        self.n_step_y = 0
+        self.n_step_z = 0
+        self.check_ranges_motors()
+        return [np.round(self.x_start + self.x_step * np.arange(self.n_step_x + 1), 4),
+                np.round(self.y_start + self.y_step * np.arange(self.n_step_y + 1), 4),
+                np.round(self.z_start + self.z_step * np.arange(self.n_step_z + 1), 4)]
+
+    def _get_position_coordinates(self, position):
+        """ Motor coordinates (x, y, z) of the grid position (ix, iy, iz). """
+        return tuple(float(self._grid_coordinates[axis][position[axis]]) for axis in range(3))
+
+    def _create_raw_data_file(self):
+        """ Create the raw data file of a mapping, with one entry per grid position. The position axis follows
+        the scan order, scan_positions in the metadata maps every entry to its grid indices (ix, iy, iz).
+        """
+        n_positions = (self.n_step_x + 1) * (self.n_step_y + 1) * (self.n_step_z + 1)
+        metadata = self._get_mapping_metadata()
+        metadata['x'] = self.eproc_plot_x.tolist()
+        # The position axis of the file follows the scan order, its grid indices are in scan_positions
+        metadata['scan_positions'] = self._scan_positions
+        return RawDataFile.create(self._save_logic.get_path_for_module(module_name='eproc'),
+                                  'eproc_mapping_rawdata',
+                                  [n_positions, self.number_of_sweeps, self.number_of_accumulations,
+                                   self.eproc_plot_x.size, 4],
+                                  ['position', 'sweep', 'accumulation', 'point', 'channel'],
+                                  metadata)
+
+    def _close_raw_data_file(self):
+        if self._raw_data_file is not None:
+            self._raw_data_file.close()
+            self._raw_data_file = None
+        return
+
+    def _create_mapping_dataset(self):
+        """ Create the dataset that collects the averaged spectrum of every position of the mapping. """
+        return MappingDataset.create(self._save_logic.get_path_for_module(module_name='eproc'),
+                                     'eproc_mapping',
+                                     *self._grid_coordinates,
+                                     self.eproc_plot_x,
+                                     metadata=self._get_mapping_metadata())
+
+    def _close_mapping_dataset(self):
+        if self.mapping_dataset is not None:
+            self.mapping_dataset.close()
+            self.mapping_dataset = None
+        return
+
+    def load_mapping(self, filename):
+        """ Load a saved mapping (the .npy file of its MappingDataset) for the analysis.
+
+        @param str filename: the .npy file of the mapping
+
+        @return MappingDataset: the mapping, opened read only
+        """
+        return MappingDataset.load(filename)
+
     def _next_position(self):
-        self.save_eproc_data_mapping()
-
-        if self.actual_x == self.x_stop:
-            self.actual_x = self.x_start
-            if self.actual_y == self.y_stop:
-                self.actual_y = self.y_start
-                if self.actual_z == self.z_stop:
-                    self.actual_z = self.z_start
-                    self.stopRequested = True
-                    self.is_eproc_mapping_running = False
-                else:
-                    self.actual_z = self.actual_z + self.z_step
+        """ Hand the data of the finished position over to the background saving, then start the move to the next
+        position in the background. The next scan starts at sigMotorsSettled.
+        """
+        timing = self._position_timing
+        timing['acquire'] = time.time() - self._acquire_start_time
 
-            else:
-                self.actual_y = self.actual_y + self.y_step
+        start_time = time.time()
+
+        def record_save_time(job_id, error):
+            timing['save'] = time.time() - start_time
+
+        self.save_eproc_data_mapping(callback=record_save_time)
+        self.mapping_dataset.write(self.actual_x, self.actual_y, self.actual_z, self.eproc_plot_y)
+        self._position_index += 1
+        self.mapping_dataset.flush(elapsed_positions=self._position_index)
+        timing['save_handoff'] = time.time() - start_time
+
+        # The adaptive order adds the next finer level where the signal changes, when a level is done
+        while self._position_index == len(self._scan_positions) and self._adaptive_step > 1:
+            self._adaptive_step, new_positions = refine_positions(
+                self.mapping_dataset.get_map(self.adaptive_channel), self.mapping_dataset.measured,
+                self._adaptive_step, self.adaptive_threshold)
+            self._scan_positions.extend(new_positions)
+            self.log.info('Adaptive mapping: {0} positions added with grid step {1}.'.format(len(new_positions),
+                                                                                          self._adaptive_step))
+
+        if self._position_index == len(self._scan_positions):
+            self.is_eproc_mapping_running = False
+            self.is_eproc_running = False
+            if self._raw_data_file is not None:
+                self._raw_data_file.finalize(elapsed_positions=self._position_index, elapsed_sweeps=0)
+            self.mapping_dataset.metadata['position_timings'] = self.position_timings
+            self.mapping_dataset.finalize()
+            self._log_position_timings()
+            self.sigStatusUpdated.emit()
+            return
+
+        if self._raw_data_file is not None:
+            self._raw_data_file.flush(elapsed_positions=self._position_index, elapsed_sweeps=0)
+        self._start_move(*self._get_position_coordinates(self._scan_positions[self._position_index]))
+        return
+
+    def _start_move(self, x, y, z, move_all=False):
+        """ Move to the motor coordinates x, y, z in a background thread, so that the logic thread (and the saving
+        of the previous position) goes on meanwhile. Only the motors whose coordinate changes are commanded, unless
+        move_all. sigMotorsSettled is emitted when all the motors are at the position.
+        """
+        if move_all:
+            moves = [(self._x_motor, x), (self._y_motor, y), (self._z_motor, z)]
         else:
-            self.actual_x = self.actual_x + self.x_step
+            moves = [(motor, target) for motor, target, actual in ((self._x_motor, x, self.actual_x),
+                                                                    (self._y_motor, y, self.actual_y),
+                                                                    (self._z_motor, z, self.actual_z))
+                     if target != actual]
+        self.actual_x, self.actual_y, self.actual_z = x, y, z
+        self._position_timing = OrderedDict([('x', x), ('y', y), ('z', z)])
+        self.position_timings.append(self._position_timing)
+        self._move_thread = threading.Thread(target=self._move_and_settle, args=(moves, self._position_timing),
+                                             name='MagnetMappingMove', daemon=True)
+        self._move_thread.start()
+        return
 
-        self._x_motor.move(self.actual_x)
-        self._y_motor.move(self.actual_y)
-        self._z_motor.move(self.actual_z)
+    def _move_and_settle(self, moves, timing):
+        """ Run in the move thread: move the motors (at the same time if parallel_motor_moves) and wait until they
+        reached the target positions. sigMotorsSettled is emitted with False if a move failed or a motor did not
+        settle within motor_settle_timeout, which stops the mapping before this position is measured.
+        """
+        try:
+            start_time = time.time()
+            if self.parallel_motor_moves and len(moves) > 1:
+                threads = [threading.Thread(target=motor.move, args=(target,)) for motor, target in moves]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            else:
+                for motor, target in moves:
+                    motor.move(target)
+            timing['move'] = time.time() - start_time
+
+            start_time = time.time()
+            settled = [self._wait_for_motor(motor, target, start_time + self.motor_settle_timeout)
+                       for motor, target in moves]
+            timing['settle'] = time.time() - start_time
+            if not all(settled):
+                # the scan would be taken at the wrong position
+                self.log.error('The motors did not settle at x={0}, y={1}, z={2}, the mapping is stopped.'
+                               ''.format(timing['x'], timing['y'], timing['z']))
+                self.sigMotorsSettled.emit(False)
+                return
+        except Exception:
+            self.log.exception('Moving the motors to x={0}, y={1}, z={2} failed:'.format(timing['x'], timing['y'],
+                                                                                        timing['z']))
+            self.sigMotorsSettled.emit(False)
+            return
+        self.sigMotorsSettled.emit(True)
+        return
 
+    def _wait_for_motor(self, motor, target, deadline):
+        """ Read the motor position until it is within motor_position_tolerance of the target or the deadline
+        is passed.
+
+        @return bool: True if the motor reached the target
+        """
+        while abs(motor.read_position() - target) > self.motor_position_tolerance:
+            if time.time() > deadline:
+                self.log.warning('Motor did not reach the position {0} within {1} s.'.format(target,
+                                                                                        self.motor_settle_timeout))
+                return False
+            time.sleep(self.motor_poll_interval)
+        return True
+
+    def _start_position(self, is_settled):
+        """ The motors are at the next position: start its scan, unless the move failed or a stop was requested. """
+        if not is_settled or self.stopRequested:
+            self.stopRequested = False
+            self.is_eproc_mapping_running = False
+            self.is_eproc_running = False
+            if self._raw_data_file is not None:
+                self._raw_data_file.flush(elapsed_positions=self._position_index, elapsed_sweeps=0)
+            self.sigStatusUpdated.emit()
+            return
         param_dict = {'x_position': self.actual_x, 'y_position': self.actual_y, 'z_position': self.actual_z}
+        if len(self.position_timings) > 1:
+            param_dict['position_timing'] = self.position_timings[-2]
         self.sigParameterUpdated.emit(param_dict)
+        self._acquire_start_time = time.time()
         self.sigStartNextEproc.emit()
         return
 
-    def save_eproc_data_mapping(self):
-        """ Saves the current eproc data to a file."""
+    def get_position_timings(self):
+        """ Time spent at every position of the mapping: move and settle of the motors, acquire (the eproc scan),
+        save_handoff (time the scan waits for the saving) and save (until the data is written in the background).
+
+        @return list: one dict per position with the keys x, y, z, move, settle, acquire, save_handoff, save (in s)
+        """
+        return list(self.position_timings)
+
+    def _log_position_timings(self):
+        totals = OrderedDict((key, sum(timing.get(key, 0.) for timing in self.position_timings))
+                             for key in ('move', 'settle', 'acquire', 'save_handoff', 'save'))
+        self.log.info('Mapping of {0} positions: {1}'.format(
+            len(self.position_timings), ', '.join('{0} {1:.1f} s'.format(key, total) for key, total in totals.items())))
+        return
+
+    def save_eproc_data_mapping(self, callback=None):
+        """ Saves the current eproc data to a file (in the background).
+
+        @param callable callback: optional, called by the save logic as callback(job_id, error) when written
+        """
 
         filepath = self._save_logic.get_path_for_module(module_name='eproc')
 
@@ -1076,11 +1374,14 @@ class EPRoCLogic(GenericLogic):
         eproc_data = OrderedDict()
         parameters = OrderedDict()
 
+        # The file is written in the background, so it can still be missing after the first position
+        is_new_file = self._position_index == 0 and not os.path.isfile(os.path.join(filepath, self.tag))
+
         if self.is_ms:
             eproc_data['Frequency\t\tChannel 1\t\tChannel 2\t\tChannel 3\t\tChannel 4'] = np.array(
                 eproc_data_list).transpose()
 
-            if not os.path.isfile(os.path.join(filepath, self.tag)):
+            if is_new_file:
                 # Saving parameters as str for readability
                 parameters['Magnetic Field (G)'] = str(self.ms_field)
                 parameters['Microwave Power (dBm)'] = str(self.ms_mw_power)
@@ -1090,7 +1391,7 @@ class EPRoCLogic(GenericLogic):
         else:
             eproc_data['Field\t\tChannel 1\t\tChannel 2\t\tChannel 3\t\tChannel 4'] = np.array(
                 eproc_data_list).transpose()
-            if not os.path.isfile(os.path.join(filepath, self.tag)):
+            if is_new_file:
                 # Saving parameters as str for readability
                 parameters['Microwave Frequency (Hz)'] = str(self.fs_mw_frequency)
                 parameters['Microwave Power (dBm)'] = str(self.fs_mw_power)
@@ -1098,7 +1399,7 @@ class EPRoCLogic(GenericLogic):
                 parameters['Step Size (Hz)'] = str(self.fs_step)
                 parameters['Stop Field (Hz)'] = str(self.fs_stop)
 
-        if not os.path.isfile(os.path.join(filepath, self.tag)):
+        if is_new_file:
             # parameters['Duration Of The Experiment'] = time.strftime('%Hh%Mm%Ss', time.gmtime(self.measurement_duration))
             parameters['Elapsed Sweeps'] = self.elapsed_sweeps
             parameters['Accumulations Per Point'] = self.number_of_accumulations
@@ -1130,12 +1431,13 @@ class EPRoCLogic(GenericLogic):
             parameters['y_pos'] = self.actual_y
             parameters['z_pos'] = self.actual_z
 
-            self._save_logic.save_data(eproc_data,
-                                       filepath=filepath,
-                                       parameters=parameters,
-                                       filename=self.tag,
-                                       fmt='%.6e',
-                                       delimiter='\t')
+            self._save_logic.save_data_async(eproc_data,
+                                             filepath=filepath,
+                                             parameters=parameters,
+                                             filename=self.tag,
+                                             fmt='%.6e',
+                                             delimiter='\t',
+                                             callback=callback)
 
         else:
 
@@ -1143,12 +1445,13 @@ class EPRoCLogic(GenericLogic):
             parameters['y_pos'] = self.actual_y
             parameters['z_pos'] = self.actual_z
 
-            self._save_logic.save_data(eproc_data,
-                                       filepath=filepath,
-                                       parameters=parameters,
-                                       filename=self.tag,
-                                       fmt='%.6e',
-                                       delimiter='\t')
+            self._save_logic.save_data_async(eproc_data,
+                                             filepath=filepath,
+                                             parameters=parameters,
+                                             filename=self.tag,
+                                             fmt='%.6e',
+                                             delimiter='\t',
+                                             callback=callback)
 
         self.log.info('eproc data saved to:\n{0}'.format(filepath))
         return
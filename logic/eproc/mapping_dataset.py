@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi helper class to keep all the spectra of a magnet mapping in one memory
+mapped file, indexed by the motor coordinates.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+
+import numpy as np
+
+from logic.eproc.raw_data_file import RawDataFile
+
+
+class MappingDataset(RawDataFile):
+    """
+    Spectra of a magnet mapping in one memory mapped .npy file of shape
+    (n_x, n_y, n_z, n_points, n_channels), with the motor and sweep coordinates in the metadata.
+
+    Every position writes its spectrum into its own entry, so the file can be read at any time and
+    in any order. The positions already measured are marked in the boolean array measured (a second
+    small memory mapped file), unmeasured positions read as NaN in get_map() and projection().
+
+    A whole map is loaded for analysis with MappingDataset.load(filename).
+    """
+
+    axes = ['x', 'y', 'z', 'point', 'channel']
+
+    def __init__(self, filename, data, metadata, measured):
+        super().__init__(filename, data, metadata)
+        self.measured = measured
+
+    @classmethod
+    def create(cls, filepath, filelabel, x, y, z, sweep, n_channels=4, metadata=None):
+        """ Create a new mapping dataset.
+
+        @param str filepath: directory of the file
+        @param str filelabel: the file is called <timestamp>_<filelabel>.npy
+        @param x: motor x positions of the grid (list or 1D array), same for y and z
+        @param sweep: x values of the spectra (frequencies or fields)
+        @param int n_channels: optional, number of lockin channels
+        @param dict metadata: optional, json serializable description of the mapping
+
+        @return MappingDataset: the opened dataset
+        """
+        full_metadata = {'coordinates': {'x': [float(value) for value in x],
+                                         'y': [float(value) for value in y],
+                                         'z': [float(value) for value in z],
+                                         'sweep': [float(value) for value in sweep]}}
+        if metadata is not None:
+            full_metadata.update(metadata)
+        raw_file = RawDataFile.create(filepath, filelabel, [len(x), len(y), len(z), len(sweep), n_channels],
+                                      cls.axes, full_metadata)
+        measured = np.lib.format.open_memmap(cls.measured_filename(raw_file.filename), mode='w+', dtype=bool,
+                                             shape=(len(x), len(y), len(z)))
+        return cls(raw_file.filename, raw_file.data, raw_file.metadata, measured)
+
+    @classmethod
+    def open(cls, filename, mmap_mode='r+'):
+        """ Open an existing mapping dataset, by default for reading and writing.
+
+        @param str filename: the .npy file
+        @param str mmap_mode: optional, 'r' to only read the data
+
+        @return MappingDataset: the opened dataset
+        """
+        raw_file = RawDataFile.open(filename, mmap_mode)
+        measured = np.load(cls.measured_filename(filename), mmap_mode=mmap_mode)
+        return cls(raw_file.filename, raw_file.data, raw_file.metadata, measured)
+
+    @classmethod
+    def load(cls, filename):
+        """ Open a mapping dataset read only, e.g. for the analysis of a finished (or running) mapping. """
+        return cls.open(filename, mmap_mode='r')
+
+    @staticmethod
+    def measured_filename(filename):
+        return os.path.splitext(filename)[0] + '_measured.npy'
+
+    @property
+    def x(self):
+        return np.array(self.metadata['coordinates']['x'])
+
+    @property
+    def y(self):
+        return np.array(self.metadata['coordinates']['y'])
+
+    @property
+    def z(self):
+        return np.array(self.metadata['coordinates']['z'])
+
+    @property
+    def sweep(self):
+        return np.array(self.metadata['coordinates']['sweep'])
+
+    def index(self, x, y, z):
+        """ Index of the grid position at the motor coordinates x, y, z.
+
+        @return tuple(int, int, int): index into the first three axes of data
+        """
+        return self._axis_index('x', x), self._axis_index('y', y), self._axis_index('z', z)
+
+    def write(self, x, y, z, spectrum):
+        """ Store the spectrum (shape (n_points, n_channels)) measured at the motor coordinates x, y, z. """
+        index = self.index(x, y, z)
+        self.data[index] = spectrum
+        self.measured[index] = True
+        return
+
+    def get_spectrum(self, x, y, z):
+        """ Spectrum measured at the motor coordinates x, y, z, shape (n_points, n_channels). """
+        return np.array(self.data[self.index(x, y, z)])
+
+    def slice(self, x=None, y=None, z=None):
+        """ Spectra of the grid with some of the motor coordinates fixed, e.g. slice(z=0.5) is the
+        xy plane at z=0.5 with shape (n_x, n_y, n_points, n_channels).
+
+        @return numpy.ndarray: the free motor axes in the order x, y, z, then points and channels
+        """
+        index = tuple(slice(None) if value is None else self._axis_index(axis, value)
+                      for axis, value in (('x', x), ('y', y), ('z', z)))
+        return np.array(self.data[index])
+
+    def get_map(self, channel, sweep_value=None, reduce=np.ptp):
+        """ One value per grid position: the channel at the sweep point closest to sweep_value, or if
+        sweep_value is None the spectrum of the channel reduced to one value (default peak to peak,
+        the amplitude of a derivative EPR line).
+
+        @return numpy.ndarray: shape (n_x, n_y, n_z), NaN where not measured yet
+        """
+        if sweep_value is None:
+            values = reduce(self.data[..., channel], axis=-1)
+        else:
+            values = np.array(self.data[..., np.argmin(np.abs(self.sweep - sweep_value)), channel])
+        return np.where(self.measured, values, np.nan)
+
+    def projection(self, channel, axes=('z',), sweep_value=None, reduce=np.ptp, project=np.nanmax):
+        """ Map of get_map(channel, sweep_value, reduce) projected along the motor axes, e.g. the
+        maximum along z (default) is an xy image.
+
+        @param tuple axes: motor axes ('x', 'y', 'z') projected away
+        @param callable project: numpy function with axis argument used for the projection
+
+        @return numpy.ndarray: the remaining motor axes in the order x, y, z
+        """
+        return project(self.get_map(channel, sweep_value, reduce),
+                       axis=tuple('xyz'.index(axis) for axis in axes))
+
+    def flush(self, **progress):
+        """ Write the spectra and the measured positions to disk and record the progress. """
+        self.measured.flush()
+        super().flush(**progress)
+        return
+
+    def close(self):
+        if self.measured.mode != 'r':
+            self.measured.flush()
+        self.measured = None
+        super().close()
+        return
+
+    def _axis_index(self, axis, value):
+        coordinates = np.array(self.metadata['coordinates'][axis])
+        index = int(np.argmin(np.abs(coordinates - value)))
+        # The motor positions are sums of steps, allow for rounding
+        if abs(coordinates[index] - value) > 1e-6 * max(1., abs(value)):
+            raise ValueError('{0}={1} is not a position of the mapping grid.'.format(axis, value))
+        return index
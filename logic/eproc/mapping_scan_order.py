@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the orders in which the magnet mapping walks through its motor grid, the
+adaptive refinement of the grid and the estimate of the motion time.
+
+The positions are index triples (ix, iy, iz) into the grid of the x, y and z motor positions.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import itertools
+
+import numpy as np
+
+SCAN_ORDERS = ('raster', 'serpentine', 'hilbert', 'adaptive')
+
+
+def raster_order(shape):
+    """ x fastest, every row starts again at the first x (and every layer at the first y). """
+    nx, ny, nz = shape
+    return [(ix, iy, iz) for iz in range(nz) for iy in range(ny) for ix in range(nx)]
+
+
+def serpentine_order(shape):
+    """ Boustrophedon: every row (and every layer) runs back from where the previous one ended, so
+    that consecutive positions are always neighbours.
+    """
+    nx, ny, nz = shape
+    positions = []
+    row = 0
+    for iz in range(nz):
+        for iy in (range(ny) if iz % 2 == 0 else reversed(range(ny))):
+            for ix in (range(nx) if row % 2 == 0 else reversed(range(nx))):
+                positions.append((ix, iy, iz))
+            row += 1
+    return positions
+
+
+def hilbert_order(shape):
+    """ Hilbert curve through every xy layer, every other layer backwards. The curve is taken on the
+    smallest square of size 2^n containing the layer, positions outside of the grid are skipped.
+    """
+    nx, ny, nz = shape
+    size = 1
+    while size < max(nx, ny):
+        size *= 2
+    layer = [xy for xy in (_hilbert_d2xy(size, d) for d in range(size * size)) if xy[0] < nx and xy[1] < ny]
+    positions = []
+    for iz in range(nz):
+        for ix, iy in (layer if iz % 2 == 0 else reversed(layer)):
+            positions.append((ix, iy, iz))
+    return positions
+
+
+def _hilbert_d2xy(size, d):
+    """ Coordinates of the point d along the Hilbert curve filling a size x size square. """
+    x = y = 0
+    s = 1
+    while s < size:
+        rx = 1 & (d // 2)
+        ry = 1 & (d ^ rx)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        x += s * rx
+        y += s * ry
+        d //= 4
+        s *= 2
+    return x, y
+
+
+def get_scan_order(order, shape, initial_step=1):
+    """ Positions of the grid in the order of the given strategy.
+
+    @param str order: one of SCAN_ORDERS. 'adaptive' returns the coarse grid (every initial_step-th
+                      position along every axis, plus the last one) in serpentine order, which is
+                      refined afterwards with refine_positions.
+    @param tuple shape: number of positions along x, y and z
+    @param int initial_step: grid step of the coarse grid of the adaptive order
+
+    @return list: index triples (ix, iy, iz)
+    """
+    if order == 'raster':
+        return raster_order(shape)
+    elif order == 'serpentine':
+        return serpentine_order(shape)
+    elif order == 'hilbert':
+        return hilbert_order(shape)
+    elif order == 'adaptive':
+        levels = [_levels(n, initial_step) for n in shape]
+        return [tuple(level[index] for level, index in zip(levels, position))
+                for position in serpentine_order([len(level) for level in levels])]
+    raise ValueError('Unknown scan order "{0}", use one of {1}.'.format(order, SCAN_ORDERS))
+
+
+def _levels(n, step):
+    """ Indices of a grid of n points taken with the given step, always including the last point. """
+    levels = list(range(0, n, step))
+    if levels[-1] != n - 1:
+        levels.append(n - 1)
+    return levels
+
+
+def refine_positions(values, measured, step, threshold):
+    """ Next level of the adaptive order: the cells of the grid with the given step, whose corner
+    values change by more than threshold times the range of all values, are filled with the
+    positions of the grid with half the step.
+
+    @param numpy.ndarray values: one value per grid position (e.g. MappingDataset.get_map), NaN where
+                                 not measured
+    @param numpy.ndarray measured: bool, same shape as values
+    @param int step: grid step of the measured level
+    @param float threshold: relative change of the signal in a cell above which it is refined
+
+    @return tuple(int, list): grid step of the new level, new positions in serpentine order
+    """
+    new_step = max(step // 2, 1)
+    if step <= 1 or np.all(np.isnan(values)):
+        return new_step, []
+    value_range = np.nanmax(values) - np.nanmin(values)
+    cells = [list(zip(levels[:-1], levels[1:])) or [(0, 0)]
+             for levels in (_levels(n, step) for n in values.shape)]
+    fine_levels = [_levels(n, new_step) for n in values.shape]
+
+    new_positions = set()
+    for cell in itertools.product(*cells):
+        corners = values[np.ix_(*[sorted(set(bounds)) for bounds in cell])]
+        if np.any(np.isnan(corners)) or np.ptp(corners) <= threshold * value_range:
+            continue
+        indices = [[index for index in levels if low <= index <= high]
+                   for levels, (low, high) in zip(fine_levels, cell)]
+        new_positions.update(position for position in itertools.product(*indices) if not measured[position])
+    return new_step, [position for position in serpentine_order(values.shape) if position in new_positions]
+
+
+def move_time(distance, velocity, acceleration):
+    """ Duration of a move with trapezoidal velocity profile (triangular for short moves). """
+    distance = abs(distance)
+    if distance * acceleration > velocity ** 2:
+        return distance / velocity + velocity / acceleration
+    return 2 * np.sqrt(distance / acceleration)
+
+
+def estimate_motion_time(positions, coordinates, velocity, acceleration, overhead, start=None, parallel=False):
+    """ Estimated total time of the motor moves through the positions. The motors are moved only if
+    their coordinate changes, one after the other or, with parallel, at the same time.
+
+    @param list positions: index triples (ix, iy, iz)
+    @param list coordinates: the x, y and z positions of the grid
+    @param float velocity: maximum velocity of the motors
+    @param float acceleration: acceleration of the motors
+    @param float overhead: fixed time of every commanded move (communication, move completed check)
+    @param tuple start: optional, motor coordinates before the first position. Default: the first
+                        position (the first move is not counted)
+    @param bool parallel: optional, the motors move at the same time, a position takes as long as
+                          the longest of its moves
+
+    @return float: time in s
+    """
+    if len(positions) == 0:
+        return 0.
+    actual = list(start) if start is not None else [coordinates[axis][positions[0][axis]] for axis in range(3)]
+    total = 0.
+    for position in positions:
+        times = [0.]
+        for axis in range(3):
+            target = coordinates[axis][position[axis]]
+            if target != actual[axis]:
+                times.append(move_time(target - actual[axis], velocity, acceleration) + overhead)
+                actual[axis] = target
+        total += max(times) if parallel else sum(times)
+    return total
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the Qudi helper class to keep the raw data of EPRoC scans in a memory mapped
+file, written while the samples arrive.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import datetime
+import json
+import os
+
+import numpy as np
+
+
+class RawDataFile:
+    """
+    Raw data array backed by a memory mapped .npy file, with a json sidecar file holding the
+    metadata of the scan and its progress.
+
+    Writing into RawDataFile.data writes into the page cache of the file, so the data is on disk as
+    soon as the operating system writes the pages back, at the latest at flush(). The array is never
+    held in RAM as a whole. Since a .npy file describes its own shape and dtype, the data of a
+    crashed scan can be loaded with numpy.load(filename, mmap_mode='r') or reopened with
+    RawDataFile.open() to resume the scan.
+
+    Use RawDataFile.create() for a new file and RawDataFile.open() for an existing one.
+    """
+
+    def __init__(self, filename, data, metadata):
+        self.filename = filename
+        self.data = data
+        self.metadata = metadata
+
+    @classmethod
+    def create(cls, filepath, filelabel, shape, axes, metadata=None):
+        """ Create a new raw data file filled with zeros.
+
+        @param str filepath: directory of the file
+        @param str filelabel: the file is called <timestamp>_<filelabel>.npy
+        @param tuple shape: shape of the raw data array
+        @param list axes: name of every axis of the array, e.g. ['sweep', 'accumulation', 'point', 'channel']
+        @param dict metadata: optional, json serializable description of the scan
+
+        @return RawDataFile: the opened file
+        """
+        timestamp = datetime.datetime.now()
+        basename = os.path.join(filepath, timestamp.strftime('%Y%m%d-%H%M-%S') + '_' + filelabel)
+        filename = basename + '.npy'
+        # Never overwrite the file of a scan started in the same second
+        counter = 1
+        while os.path.exists(filename):
+            filename = '{0}_{1}.npy'.format(basename, counter)
+            counter += 1
+        data = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float64, shape=tuple(shape))
+        full_metadata = {'axes': list(axes), 'created': timestamp.isoformat(), 'finished': False, 'progress': {}}
+        if metadata is not None:
+            full_metadata.update(metadata)
+        raw_file = cls(filename, data, full_metadata)
+        raw_file._write_metadata()
+        return raw_file
+
+    @classmethod
+    def open(cls, filename, mmap_mode='r+'):
+        """ Open an existing raw data file (e.g. of a crashed scan), by default for reading and writing.
+
+        @param str filename: the .npy file
+        @param str mmap_mode: optional, 'r' to only read the data
+
+        @return RawDataFile: the opened file
+        """
+        data = np.load(filename, mmap_mode=mmap_mode)
+        with open(cls.metadata_filename(filename), 'r') as file:
+            metadata = json.load(file)
+        return cls(filename, data, metadata)
+
+    @staticmethod
+    def metadata_filename(filename):
+        return os.path.splitext(filename)[0] + '_metadata.json'
+
+    @property
+    def progress(self):
+        """ dict: progress of the scan as given in the last flush. """
+        return self.metadata['progress']
+
+    def flush(self, **progress):
+        """ Write the data to disk and record the progress of the scan, e.g. flush(elapsed_sweeps=2).
+        Only the progress recorded here is used to resume, so flush after every completed unit (sweep).
+        """
+        self.data.flush()
+        self.metadata['progress'].update(progress)
+        self._write_metadata()
+        return
+
+    def set_parameters(self, parameters):
+        """ Record the parameters of the saved data files, written to disk with the next flush. """
+        self.metadata['parameters'] = {key: str(value) for key, value in parameters.items()}
+        return
+
+    def finalize(self, parameters=None, **progress):
+        """ Flush and mark the scan as finished, optionally with the parameters of the saved data files. """
+        if parameters is not None:
+            self.set_parameters(parameters)
+        self.metadata['finished'] = True
+        self.flush(**progress)
+        return
+
+    def close(self):
+        """ Flush (unless opened read only) and release the memory map. """
+        if self.data.mode != 'r':
+            self.data.flush()
+            self._write_metadata()
+        self.data = None
+        return
+
+    def _write_metadata(self):
+        # Write to a temporary file first, the metadata stays readable if we crash while writing
+        tmp_filename = self.metadata_filename(self.filename) + '.tmp'
+        with open(tmp_filename, 'w') as file:
+            json.dump(self.metadata, file, indent=1)
+        os.replace(tmp_filename, self.metadata_filename(self.filename))
+        return
@@ -20,13 +20,21 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import ast
+import concurrent.futures
+import copy
 import importlib
 import inspect
+import json
 import lmfit
+import logging
+import multiprocessing
 from qtpy import QtCore
 import numpy as np
 import os
 import sys
+import threading
+import time
 from collections import OrderedDict
 from distutils.version import LooseVersion
 
@@ -54,13 +62,17 @@ class FitLogic(GenericLogic):
     _additional_methods_import_path = ConfigOption(name='additional_fit_methods_path',
                                                    default=None,
                                                    missing='nothing')
+    # Cached index of the fit method files, default: fit_method_manifest.json in the app status
+    # directory. The fit method files are only imported when one of their methods is used,
+    # unless lazy_fit_import is False.
+    _fit_manifest_file = ConfigOption(name='fit_manifest_file', default=None, missing='nothing')
+    _lazy_fit_import = ConfigOption(name='lazy_fit_import', default=True, missing='nothing')
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # locking for thread safety
         self.lock = Mutex()
 
-        filenames = []
         # for path in directories:
         path_list = [os.path.join(get_main_dir(), 'logic', 'fitmethods')]
         # adding additional path, to be defined in the config
@@ -82,12 +94,9 @@ class FitLogic(GenericLogic):
                 self.log.error('ConfigOption additional_predefined_methods_path needs to either be a string or '
                                'a list of strings.')
 
-        for path in path_list:
-            for f in os.listdir(path):
-                if os.path.isfile(os.path.join(path, f)) and f.endswith('.py'):
-                    filenames.append(f[:-3])
-                    if path not in sys.path:
-                        sys.path.append(path)
+        self._fit_method_paths = path_list
+        # process pool of fit_batch, created with the first parallel batch
+        self._batch_executor = None
 
         # A dictionary containing all fit methods and their estimators.
         self.fit_list = OrderedDict()
@@ -95,31 +104,28 @@ class FitLogic(GenericLogic):
         self.fit_list['2d'] = OrderedDict()
         self.fit_list['3d'] = OrderedDict()
 
-        # Go through the fitmethods files and import all methods.
-        # Also determine which methods need to be added to the fit_list dictionary
+        # Index the fitmethods files, the files themselves are imported on first use (see
+        # __getattr__). Determine which methods need to be added to the fit_list dictionary.
+        start_time = time.perf_counter()
+        manifest_file = self._fit_manifest_file
+        if manifest_file is None and self._manager is not None:
+            manifest_file = os.path.join(self._manager.getStatusDir(), 'fit_method_manifest.json')
+        self._fit_registry = FitMethodRegistry(path_list, manifest_file)
+        if not self._lazy_fit_import:
+            self._fit_registry.load_all(FitLogic)
+
         estimators_for_dict = list()
         models_for_dict = list()
         fits_for_dict = list()
 
-        for files in filenames:
-            mod = importlib.import_module('{0}'.format(files))
-            for method in dir(mod):
-                ref = getattr(mod, method)
-                if callable(ref) and (inspect.ismethod(ref) or inspect.isfunction(ref)):
-                    method_str = str(method)
-                    try:
-                        # import methods in Fitlogic
-                        setattr(FitLogic, method, ref)
-                        # append method to a list of methods to include in the fit_list dictionary
-                        if method_str.startswith('make_') and method_str.endswith('_fit'):
-                            fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
-                        elif method_str.startswith('make_') and method_str.endswith('_model'):
-                            models_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
-                        elif method_str.startswith('estimate_'):
-                            estimators_for_dict.append(method_str.split('_', 1)[1])
-                    except:
-                        self.log.error('Method "{0}" could not be imported to FitLogic.'
-                                       ''.format(str(method)))
+        for method_str in self._fit_registry.functions:
+            # append method to a list of methods to include in the fit_list dictionary
+            if method_str.startswith('make_') and method_str.endswith('_fit'):
+                fits_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
+            elif method_str.startswith('make_') and method_str.endswith('_model'):
+                models_for_dict.append(method_str.split('_', 1)[1].rsplit('_', 1)[0])
+            elif method_str.startswith('estimate_'):
+                estimators_for_dict.append(method_str.split('_', 1)[1])
 
         fits_for_dict.sort()
         models_for_dict.sort()
@@ -140,11 +146,11 @@ class FitLogic(GenericLogic):
             # Attach make_*_fit method to fit_list
             if fit_name not in self.fit_list[dimension]:
                 self.fit_list[dimension][fit_name] = OrderedDict()
-            self.fit_list[dimension][fit_name]['make_fit'] = getattr(self, fit_method)
+            self.fit_list[dimension][fit_name]['make_fit'] = FitMethodReference(self, fit_method)
 
             # Attach make_*_model method to fit_list
             if fit_name in models_for_dict:
-                self.fit_list[dimension][fit_name]['make_model'] = getattr(self, model_method)
+                self.fit_list[dimension][fit_name]['make_model'] = FitMethodReference(self, model_method)
             else:
                 self.log.error('No make_*_model method for fit "{0}" found in FitLogic.'
                                ''.format(fit_name))
@@ -154,11 +160,11 @@ class FitLogic(GenericLogic):
             for estimator_name in estimators_for_dict:
                 estimator_method = 'estimate_' + estimator_name
                 if fit_name == estimator_name:
-                    self.fit_list[dimension][fit_name]['generic'] = getattr(self, estimator_method)
+                    self.fit_list[dimension][fit_name]['generic'] = FitMethodReference(self, estimator_method)
                     found_estimator = True
                 elif estimator_name.startswith(fit_name + '_'):
                     custom_name = estimator_name.split('_', 1)[1]
-                    self.fit_list[dimension][fit_name][custom_name] = getattr(self, estimator_method)
+                    self.fit_list[dimension][fit_name][custom_name] = FitMethodReference(self, estimator_method)
                     found_estimator = True
             if not found_estimator:
                 self.log.error('No estimator method for fit "{0}" found in FitLogic.'
@@ -166,6 +172,23 @@ class FitLogic(GenericLogic):
 
         self.log.info('Methods were included to FitLogic, but only if naming is right: check the'
                       ' doxygen documentation if you added a new method and it does not show.')
+        self.log.debug('Fit method registry: {0:d} fits from {1:d} files ({2:d} parsed, {3:d} '
+                       'imported) in {4:.1f} ms.'.format(
+                           sum(len(fits) for fits in self.fit_list.values()),
+                           len(self._fit_registry.files),
+                           self._fit_registry.parsed,
+                           len(self._fit_registry.loaded),
+                           (time.perf_counter() - start_time) * 1e3))
+
+    def __getattr__(self, name):
+        """ Import the fit method file defining name the first time one of its methods is used.
+
+        Only called if name is not found otherwise, i.e. not for methods already imported.
+        """
+        registry = self.__dict__.get('_fit_registry')
+        if registry is not None and registry.load(name, FitLogic):
+            return getattr(self, name)
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(type(self).__name__, name))
 
     def on_activate(self):
         """ Initialisation performed during activation of the module.
@@ -177,7 +200,93 @@ class FitLogic(GenericLogic):
 
     def on_deactivate(self):
         """ """
-        pass
+        if self._batch_executor is not None:
+            self._batch_executor.shutdown()
+            self._batch_executor = None
+
+    def fit_batch(self, x_axis, data, fit_name, estimator=None, add_params=None, processes=None,
+                  chunk_size=None, warm_start=False):
+        """ Fit the same 1D fit to many spectra, e.g. every position of a map or every line of a
+        matrix, distributed over a pool of processes.
+
+        @param numpy.array x_axis: 1D axis values, the same for all spectra
+        @param numpy.array data: spectra along the last axis, any number of leading axes (e.g. shape
+                                 (n_x, n_y, n_z, n_points) for a magnet mapping)
+        @param str fit_name: name of the fit in fit_list['1d'], e.g. 'lorentziandouble'
+        @param str estimator: optional, name of the estimator of the fit, e.g. 'dip'. Default:
+                              'generic' if the fit has one, else the first one.
+        @param Parameters or dict add_params: optional, parameters used instead of the estimated
+                                              ones for every spectrum (see _substitute_params)
+        @param int processes: optional, number of worker processes, 0 fits in this process.
+                              Default: number of CPUs.
+        @param int chunk_size: optional, number of spectra per task. Default: 4 tasks per process.
+        @param bool warm_start: optional, start every fit from the result of the previous spectrum
+                                in the same chunk (its neighbour along the last leading axis) instead
+                                of the estimate, where the previous fit succeeded
+
+        @return tuple: (values, errors, redchi)
+            numpy structured array values: one field per fit parameter, shape of the leading axes
+                                           of data
+            numpy structured array errors: the standard errors of the parameters, same shape
+            numpy.array redchi: reduced chi square of every fit, same shape
+
+            Spectra containing NaN and failed fits are NaN in all three arrays.
+        """
+        if fit_name not in self.fit_list['1d']:
+            self.log.error('fit_batch: no 1D fit "{0}" in FitLogic.'.format(fit_name))
+            return None
+        fit = self.fit_list['1d'][fit_name]
+        if estimator is None:
+            estimator = 'generic' if 'generic' in fit else \
+                [key for key in fit if key not in ('make_fit', 'make_model')][0]
+        if estimator not in fit:
+            self.log.error('fit_batch: fit "{0}" has no estimator "{1}".'.format(fit_name, estimator))
+            return None
+        method_names = (fit['make_fit'].__name__, fit['make_model'].__name__, fit[estimator].__name__)
+        model, params = fit['make_model']()
+        param_names = list(params)
+
+        x_axis = np.asarray(x_axis, dtype=np.float64)
+        data = np.asarray(data, dtype=np.float64)
+        batch_shape = data.shape[:-1]
+        spectra = data.reshape((-1, data.shape[-1]))
+        add_params = _parameters_to_dict(add_params)
+
+        if processes is None:
+            processes = os.cpu_count()
+        if chunk_size is None:
+            chunk_size = max(1, int(np.ceil(len(spectra) / (4 * max(processes, 1)))))
+        chunks = [spectra[start:start + chunk_size] for start in range(0, len(spectra), chunk_size)]
+        args = (x_axis, method_names, param_names, add_params, warm_start)
+
+        if processes == 0 or len(chunks) <= 1:
+            results = [_fit_chunk(self, chunk, *args) for chunk in chunks]
+        else:
+            if self._batch_executor is None or self._batch_executor._max_workers != processes:
+                if self._batch_executor is not None:
+                    self._batch_executor.shutdown()
+                # spawn, forking a process with Qt and running threads is not safe
+                self._batch_executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_batch_worker,
+                    initargs=(self._fit_method_paths, self._fit_registry.files))
+            results = list(self._batch_executor.map(_fit_chunk_in_worker, chunks, *[
+                [arg] * len(chunks) for arg in args]))
+
+        values = np.concatenate([result[0] for result in results]) if results else \
+            np.zeros((0, len(param_names)))
+        errors = np.concatenate([result[1] for result in results]) if results else values.copy()
+        redchi = np.concatenate([result[2] for result in results]) if results else np.zeros(0)
+        n_failed = int(np.sum(np.isnan(redchi)))
+        if n_failed > 0:
+            self.log.warning('fit_batch: {0:d} of {1:d} spectra could not be fitted with {2} ({3}).'
+                             ''.format(n_failed, len(redchi), fit_name, estimator))
+
+        dtype = [(name, np.float64) for name in param_names]
+        return (np.rec.fromarrays(values.T, dtype=dtype).view(np.ndarray).reshape(batch_shape),
+                np.rec.fromarrays(errors.T, dtype=dtype).view(np.ndarray).reshape(batch_shape),
+                redchi.reshape(batch_shape))
 
     def validate_load_fits(self, fits):
         """ Take fit names and estimators from a dict and check if they are valid.
@@ -284,6 +393,249 @@ class FitLogic(GenericLogic):
         return FitContainer(self, container_name, dimension)
 
 
+class FitMethodRegistry:
+    """ Index of the fit method files: which functions (make_*_fit, make_*_model, estimate_* and
+    helpers) every file defines, without importing the files.
+
+    The index (manifest) is built by parsing the files and cached in a json file. A file is only
+    parsed again if its modification time or size changed. The files are imported by load() the
+    first time one of their functions is requested, their functions are then attached to the class
+    of the fitter (FitLogic), as all fit methods have always been.
+
+    @param list path_list: directories with fit method files
+    @param str manifest_file: optional, json file caching the manifest. Default: no cache
+    @param dict manifest: optional, manifest to start from instead of the cache (e.g. the files
+                          attribute of another registry)
+    """
+
+    def __init__(self, path_list, manifest_file=None, manifest=None):
+        self.path_list = list(path_list)
+        self.manifest_file = manifest_file
+        # path -> {'mtime': float, 'size': int, 'module': str, 'functions': list of str}
+        self.files = OrderedDict()
+        # function name -> path of the file defining it
+        self.functions = OrderedDict()
+        # paths of the files already imported
+        self.loaded = set()
+        # number of files parsed because they were not in the (valid) cache
+        self.parsed = 0
+        self._lock = threading.RLock()
+        self.update(manifest)
+
+    def update(self, manifest=None):
+        """ Index all fit method files, parse the ones that are new or changed.
+
+        @param dict manifest: optional, previous manifest. Default: the cached one.
+        """
+        if manifest is None:
+            manifest = self._read_manifest()
+        self.files = OrderedDict()
+        self.parsed = 0
+        for path in self.path_list:
+            for filename in sorted(os.listdir(path)):
+                filepath = os.path.join(path, filename)
+                if not (os.path.isfile(filepath) and filename.endswith('.py')):
+                    continue
+                if path not in sys.path:
+                    sys.path.append(path)
+                stat = os.stat(filepath)
+                entry = manifest.get(filepath)
+                if entry is None or entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+                    entry = {'mtime': stat.st_mtime,
+                             'size': stat.st_size,
+                             'module': filename[:-3],
+                             'functions': self._parse_functions(filepath)}
+                    self.parsed += 1
+                self.files[filepath] = entry
+
+        # as with importing every file, a function defined in a later file replaces the earlier one
+        self.functions = OrderedDict()
+        for filepath, entry in self.files.items():
+            for name in entry['functions']:
+                self.functions[name] = filepath
+
+        if self.parsed > 0 or len(manifest) != len(self.files):
+            self._write_manifest()
+        return
+
+    def load(self, name, fitter_class):
+        """ Import the file defining the function name and attach its functions to fitter_class.
+
+        @param str name: function name
+        @param type fitter_class: class the fit methods are attached to
+
+        @return bool: True if fitter_class has the function now, False if name is unknown
+        """
+        filepath = self.functions.get(name)
+        if filepath is None:
+            return False
+        # the first fit can be started from several threads at once (e.g. live fits)
+        with self._lock:
+            if filepath not in self.loaded:
+                self.load_file(filepath, fitter_class)
+        return hasattr(fitter_class, name)
+
+    def load_file(self, filepath, fitter_class):
+        """ Import a fit method file and attach all its functions to fitter_class. """
+        with self._lock:
+            mod = importlib.import_module(self.files[filepath]['module'])
+            for method in dir(mod):
+                ref = getattr(mod, method)
+                if callable(ref) and (inspect.ismethod(ref) or inspect.isfunction(ref)):
+                    setattr(fitter_class, method, ref)
+            self.loaded.add(filepath)
+        return
+
+    def load_all(self, fitter_class):
+        """ Import all fit method files not imported yet. """
+        for filepath in self.files:
+            if filepath not in self.loaded:
+                self.load_file(filepath, fitter_class)
+        return
+
+    @staticmethod
+    def _parse_functions(filepath):
+        """ Names of the functions defined at the top level of a python file. """
+        with open(filepath, 'rb') as file:
+            tree = ast.parse(file.read(), filename=filepath)
+        return [node.name for node in tree.body
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+    def _read_manifest(self):
+        if self.manifest_file is None or not os.path.isfile(self.manifest_file):
+            return {}
+        try:
+            with open(self.manifest_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        if self.manifest_file is None:
+            return
+        try:
+            # write to a temporary file first, another qudi instance might read the manifest
+            temp_file = '{0}.{1:d}.tmp'.format(self.manifest_file, os.getpid())
+            with open(temp_file, 'w') as file:
+                json.dump(self.files, file)
+            os.replace(temp_file, self.manifest_file)
+        except OSError:
+            logging.getLogger(__name__).warning(
+                'Could not write the fit method manifest {0}.'.format(self.manifest_file))
+        return
+
+
+class FitMethodReference:
+    """ Callable in FitLogic.fit_list standing for a fit method, the file defining the method is
+    imported on the first call (see FitMethodRegistry).
+
+    @param fitter: FitLogic instance
+    @param str name: name of the method
+    """
+
+    def __init__(self, fitter, name):
+        self._fitter = fitter
+        self.__name__ = name
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self._fitter, self.__name__)(*args, **kwargs)
+
+    def __repr__(self):
+        return '<fit method {0}>'.format(self.__name__)
+
+
+def _parameters_to_dict(params):
+    """ Convert lmfit Parameters into the dict form of _substitute_params (None stays None). """
+    if not isinstance(params, lmfit.parameter.Parameters):
+        return params
+    return OrderedDict((name, {key: getattr(param, key)
+                               for key in ('min', 'max', 'vary', 'expr', 'value')
+                               if getattr(param, key) is not None})
+                       for name, param in params.items())
+
+
+def _start_params(start_params, use_settings=None):
+    """ Parameters for _substitute_params starting a fit from the values of a previous result,
+    the parameters in use_settings take precedence.
+
+    @param Parameters start_params: result of a previous fit
+    @param Parameters or dict use_settings: optional, parameters fixed by the user
+
+    @return OrderedDict: update parameters in the dict form of _substitute_params
+    """
+    add_params = OrderedDict(
+        (name, {'value': param.value}) for name, param in start_params.items()
+        if param.vary and param.expr is None and np.isfinite(param.value))
+    if use_settings is not None:
+        add_params.update(_parameters_to_dict(use_settings))
+    return add_params
+
+
+class _BatchFitter:
+    """ Stand-in for FitLogic in the worker processes of FitLogic.fit_batch, it gets the same fit
+    methods as FitLogic (see _init_batch_worker). """
+    log = logging.getLogger('logic.fit_logic.fit_batch')
+    _fit_registry = None
+
+    def __getattr__(self, name):
+        if self._fit_registry is not None and self._fit_registry.load(name, _BatchFitter):
+            return getattr(self, name)
+        raise AttributeError("'_BatchFitter' object has no attribute '{0}'".format(name))
+
+
+_batch_fitter = None
+
+
+def _init_batch_worker(path_list, manifest):
+    """ Initializer of the fit_batch worker processes: index the fit methods like FitLogic, from
+    the manifest of FitLogic. The files are imported on first use. """
+    global _batch_fitter
+    _BatchFitter._fit_registry = FitMethodRegistry(path_list, manifest=manifest)
+    _batch_fitter = _BatchFitter()
+
+
+def _fit_chunk_in_worker(spectra, *args):
+    return _fit_chunk(_batch_fitter, spectra, *args)
+
+
+def _fit_chunk(fitter, spectra, x_axis, method_names, param_names, add_params, warm_start):
+    """ Fit the spectra one after the other.
+
+    @param fitter: object with the fit methods (FitLogic or _BatchFitter)
+    @param numpy.array spectra: shape (n_spectra, n_points)
+    @param tuple method_names: names of the make_*_fit, make_*_model and estimate_* methods
+
+    @return tuple: values and errors (n_spectra, n_params) and reduced chi square (n_spectra),
+                   NaN where the fit was not possible
+    """
+    make_fit, make_model, estimator = [getattr(fitter, name) for name in method_names]
+    values = np.full((len(spectra), len(param_names)), np.nan)
+    errors = np.full((len(spectra), len(param_names)), np.nan)
+    redchi = np.full(len(spectra), np.nan)
+    previous = None
+    for index, spectrum in enumerate(spectra):
+        if not np.all(np.isfinite(spectrum)):
+            previous = None
+            continue
+        params = add_params
+        if warm_start and previous is not None:
+            params = _start_params(previous, add_params)
+        try:
+            result = make_fit(x_axis=x_axis, data=spectrum, estimator=estimator, add_params=params)
+        except Exception:
+            fitter.log.exception('fit_batch: fit of spectrum {0:d} failed.'.format(index))
+            previous = None
+            continue
+        for column, name in enumerate(param_names):
+            param = result.params[name]
+            values[index, column] = param.value
+            if param.stderr is not None:
+                errors[index, column] = param.stderr
+        redchi[index] = result.redchi
+        previous = result.params if result.success else None
+    return values, errors, redchi
+
+
 class FitContainer(QtCore.QObject):
     """ A class for managing a single flexible fit setting in a logic module.
     """
@@ -377,7 +729,7 @@ class FitContainer(QtCore.QObject):
         else:
             self.current_fit = current_fit
             if current_fit != 'No Fit':
-                use_settings = self.fit_list[self.current_fit]['use_settings']
+                use_settings = self.fit_list[self.current_fit].get('use_settings', {})
                 self.use_settings = lmfit.parameter.Parameters()
                 # Update the use parameter dictionary
                 for para in use_settings:
@@ -417,29 +769,7 @@ class FitContainer(QtCore.QObject):
         """
         self.clear_result()
 
-        fit_x = np.linspace(
-            start=x_data[0],
-            stop=x_data[-1],
-            num=int(len(x_data) * self.fit_granularity_fact))
-
-        # set the keyword arguments, which will be passed to the fit.
-        kwargs = {
-            'x_axis': x_data,
-            'data': y_data,
-            'units': self.units,
-            'add_params': self.use_settings}
-
-        result = None
-
-        if self.current_fit in self.fit_list:
-            result = self.fit_list[self.current_fit]['make_fit'](
-                estimator=self.fit_list[self.current_fit]['estimator'],
-                **kwargs)
-
-        elif self.current_fit == 'No Fit':
-            fit_y = np.zeros(fit_x.shape)
-
-        else:
+        if self.current_fit not in self.fit_list and self.current_fit != 'No Fit':
             self.fit_logic.log.warning(
                 'The Fit Function "{0}" is not implemented to be used in the ODMR Logic. '
                 'Correct that! Fit Call will be skipped and Fit Function will be set to '
@@ -447,11 +777,7 @@ class FitContainer(QtCore.QObject):
 
             self.current_fit = 'No Fit'
 
-        if self.current_fit != 'No Fit':
-            # after the fit was performed, retrieve the fitting function and
-            # evaluate the fitted parameters according to the function:
-            model, params = self.fit_list[self.current_fit]['make_model']()
-            fit_y = model.eval(x=fit_x, params=result.params)
+        fit_x, fit_y, result = self.evaluate_fit(x_data, y_data, self.current_fit, self.use_settings)
 
         if result is not None:
             self.current_fit_param = result.params
@@ -462,3 +788,187 @@ class FitContainer(QtCore.QObject):
         self.sigFitUpdated.emit()
 
         return fit_x, fit_y, result
+
+    def evaluate_fit(self, x_data, y_data, fit_name, use_settings=None, start_params=None):
+        """ Perform the fit fit_name on the data without changing the state of the container, so
+        that it can run in another thread (e.g. in a LiveFitWorker).
+
+        @param array x_data: 1D np.array with the x values
+        @param array y_data: 1D np.array with the y values
+        @param str fit_name: name of a configured fit or 'No Fit'
+        @param Parameters use_settings: optional, parameters overriding the estimated ones
+        @param Parameters start_params: optional, start values (e.g. the result of a previous fit),
+                                        used for all varying parameters not set by use_settings
+
+        @return: tuple (fit_x, fit_y, fit_result) as in do_fit
+        """
+        fit_x = np.linspace(
+            start=x_data[0],
+            stop=x_data[-1],
+            num=int(len(x_data) * self.fit_granularity_fact))
+
+        if fit_name not in self.fit_list:
+            return fit_x, np.zeros(fit_x.shape), None
+
+        add_params = use_settings
+        if start_params is not None:
+            add_params = _start_params(start_params, use_settings)
+
+        result = self.fit_list[fit_name]['make_fit'](
+            x_axis=x_data,
+            data=y_data,
+            estimator=self.fit_list[fit_name]['estimator'],
+            units=self.units,
+            add_params=add_params)
+
+        # after the fit was performed, retrieve the fitting function and
+        # evaluate the fitted parameters according to the function:
+        model, params = self.fit_list[fit_name]['make_model']()
+        fit_y = model.eval(x=fit_x, params=result.params)
+        return fit_x, fit_y, result
+
+
+class LiveFitWorker(QtCore.QObject):
+    """ Fits the latest spectrum of a measurement in a background thread, so that slow fits never
+    block the acquisition.
+
+    The measurement hands every new spectrum to submit(), which only stores it and returns. The
+    worker thread fits at most once every <interval> seconds and always the latest spectrum, older
+    ones that were not fitted yet are dropped (counted as skipped). Every fit starts from the result
+    of the previous one (warm start) as long as the fit function and the number of points stay the
+    same, the parameters fixed in the fit settings (use_settings) always take precedence.
+
+    The results are emitted with sigNewFitResult from the worker thread, connect it with a queued
+    connection to handle them in the thread of the logic.
+
+    @param FitContainer fit_container: container with the configured fits, its current fit and
+                                       settings are read at every submit()
+    @param float interval: minimum time between the start of two fits in s
+    @param bool warm_start: optional, start every fit from the previous result
+    """
+    # fit name, fit x, fit y, lmfit ModelResult, info dict with the tag given to submit and the
+    # latency (submit to result) and duration of the fit in s
+    sigNewFitResult = QtCore.Signal(str, np.ndarray, np.ndarray, object, dict)
+
+    def __init__(self, fit_container, interval=1., warm_start=True):
+        super().__init__()
+        self.fit_container = fit_container
+        self.interval = interval
+        self.warm_start = warm_start
+        self._condition = threading.Condition()
+        self._request = None
+        self._thread = None
+        self._running = False
+        self._last_fit_start = 0.
+        self._warm_params = None
+        self.reset_statistics()
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        """ Start the worker thread. """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._fit_loop, name='live fit {0}'.format(
+            self.fit_container.name), daemon=True)
+        self._thread.start()
+        return
+
+    def stop(self, timeout=10.):
+        """ Stop the worker thread after the fit in progress, pending spectra are dropped. """
+        if not self._running:
+            return
+        with self._condition:
+            self._running = False
+            self._request = None
+            self._condition.notify()
+        self._thread.join(timeout)
+        self._thread = None
+        return
+
+    def submit(self, x_data, y_data, tag=None):
+        """ Hand over the latest spectrum, replacing the one waiting to be fitted (if any).
+
+        @param array x_data: x values, copied
+        @param array y_data: y values, copied
+        @param tag: optional, returned with the result, e.g. the channel and range of the spectrum
+
+        @return bool: True if a waiting spectrum was replaced (skipped)
+        """
+        fit_name = self.fit_container.current_fit
+        if not self._running or fit_name == 'No Fit':
+            return False
+        request = {'x': np.array(x_data, dtype=np.float64),
+                   'y': np.array(y_data, dtype=np.float64),
+                   'fit_name': fit_name,
+                   'use_settings': copy.deepcopy(self.fit_container.use_settings),
+                   'tag': tag,
+                   'submitted': time.perf_counter()}
+        with self._condition:
+            skipped = self._request is not None
+            if skipped:
+                self.statistics['skipped'] += 1
+            self._request = request
+            self._condition.notify()
+        return skipped
+
+    def reset_statistics(self):
+        """ Reset the fit counts and times and the warm start parameters. """
+        self.statistics = {'fits': 0, 'skipped': 0, 'failed': 0, 'last_latency': np.nan,
+                           'mean_latency': np.nan, 'max_latency': np.nan, 'mean_fit_time': np.nan}
+        self._warm_params = None
+        return
+
+    def _fit_loop(self):
+        while True:
+            with self._condition:
+                while self._running and self._request is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                # keep the cadence, newer spectra can still replace the request while waiting
+                wait_time = self._last_fit_start + self.interval - time.perf_counter()
+                if wait_time > 0:
+                    self._condition.wait(wait_time)
+                    continue
+                request = self._request
+                self._request = None
+            self._last_fit_start = time.perf_counter()
+            self._fit(request)
+
+    def _fit(self, request):
+        start_params = None
+        if self.warm_start and self._warm_params is not None:
+            fit_name, n_points, params = self._warm_params
+            if fit_name == request['fit_name'] and n_points == request['x'].size:
+                start_params = params
+        try:
+            fit_x, fit_y, result = self.fit_container.evaluate_fit(
+                request['x'], request['y'], request['fit_name'], request['use_settings'], start_params)
+        except Exception:
+            self.statistics['failed'] += 1
+            self._warm_params = None
+            self.fit_container.fit_logic.log.exception('Live fit "{0}" of {1} failed.'.format(
+                request['fit_name'], self.fit_container.name))
+            return
+        done = time.perf_counter()
+        # a failed fit is no good start for the next one
+        if result is not None and result.success:
+            self._warm_params = (request['fit_name'], request['x'].size, result.params)
+        else:
+            self._warm_params = None
+
+        latency = done - request['submitted']
+        fit_time = done - self._last_fit_start
+        stats = self.statistics
+        stats['fits'] += 1
+        stats['last_latency'] = latency
+        stats['max_latency'] = latency if stats['fits'] == 1 else max(stats['max_latency'], latency)
+        for key, value in (('mean_latency', latency), ('mean_fit_time', fit_time)):
+            stats[key] = value if stats['fits'] == 1 else stats[key] + (value - stats[key]) / stats['fits']
+        self.sigNewFitResult.emit(request['fit_name'], fit_x, fit_y, result,
+                                  {'tag': request['tag'], 'latency': latency, 'fit_time': fit_time})
+        return
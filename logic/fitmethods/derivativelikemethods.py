@@ -0,0 +1,820 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains methods for first derivative lineshapes, as measured with lock-in detection
+(e.g. EPR/EPRoC spectra with field or frequency modulation). These methods are imported by class
+FitLogic.
+
+All lines are parametrized like a derivative spectrum is read off:
+    center:     position of the zero crossing
+    amplitude:  peak-to-peak amplitude, positive if the maximum is on the low x side (derivative of
+                an absorption peak)
+    width:      peak-to-peak width, the distance between the extrema
+
+The models come with analytic Jacobians, which are passed to the Levenberg-Marquardt optimizer
+instead of the finite differences lmfit computes by default.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+
+import numpy as np
+from lmfit.models import Model
+from collections import OrderedDict
+
+
+# normalizations to a peak-to-peak amplitude of 1 for a peak-to-peak width of 1
+_LORENTZIAN_NORM = 8 * np.sqrt(3) / 9
+_LORENTZIAN_SCALE = 2 / np.sqrt(3)
+_GAUSSIAN_NORM = np.sqrt(np.e) / 2
+_GAUSSIAN_SCALE = 2.
+
+# lines of the hyperfine multiplets in units of the splitting, equal intensities (one nucleus)
+_TRIPLET = (-1, 0, 1)
+
+
+################################################################################
+#                                                                              #
+#                     Defining derivative lineshapes                           #
+#                                                                              #
+################################################################################
+
+def _derivative_lineshape(self, z, lineshape, fraction=0.5):
+    """ Derivative lineshape of unit peak-to-peak amplitude and width and its derivatives.
+
+    @param numpy.array z: distance to the center in units of the peak-to-peak width
+    @param str lineshape: 'lorentzian', 'gaussian' or 'pseudovoigt'
+    @param float fraction: Lorentzian fraction of the pseudo-Voigt lineshape
+
+    @return tuple: (shape, d shape / d z, d shape / d fraction), the last one is None if the
+                   lineshape is not 'pseudovoigt'
+    """
+    if lineshape == 'gaussian':
+        return self._gaussian_derivative_lineshape(z) + (None,)
+    l_shape, l_slope = self._lorentzian_derivative_lineshape(z)
+    if lineshape == 'lorentzian':
+        return l_shape, l_slope, None
+    g_shape, g_slope = self._gaussian_derivative_lineshape(z)
+    return (fraction * l_shape + (1 - fraction) * g_shape,
+            fraction * l_slope + (1 - fraction) * g_slope,
+            l_shape - g_shape)
+
+
+def _lorentzian_derivative_lineshape(self, z):
+    """ First derivative of a Lorentzian with unit peak-to-peak amplitude and width.
+
+    @param numpy.array z: distance to the center in units of the peak-to-peak width
+
+    @return tuple: (shape, d shape / d z)
+    """
+    u = _LORENTZIAN_SCALE * z
+    denominator = 1 + u * u
+    shape = -_LORENTZIAN_NORM * u / denominator ** 2
+    slope = -_LORENTZIAN_NORM * _LORENTZIAN_SCALE * (1 - 3 * u * u) / denominator ** 3
+    return shape, slope
+
+
+def _gaussian_derivative_lineshape(self, z):
+    """ First derivative of a Gaussian with unit peak-to-peak amplitude and width.
+
+    @param numpy.array z: distance to the center in units of the peak-to-peak width
+
+    @return tuple: (shape, d shape / d z)
+    """
+    u = _GAUSSIAN_SCALE * z
+    exponential = np.exp(-u * u / 2)
+    shape = -_GAUSSIAN_NORM * u * exponential
+    slope = -_GAUSSIAN_NORM * _GAUSSIAN_SCALE * (1 - u * u) * exponential
+    return shape, slope
+
+
+def _derivative_multiplet(self, x, center, amplitude, width, lineshape, fraction=0.5,
+                          splitting=0., lines=(0,), jacobian=False):
+    """ Derivative lines of equal amplitude and width at center + m * splitting for all m in lines.
+
+    @param numpy.array x: independent variable - e.g. magnetic field or frequency
+    @param float center: zero crossing of the line with m=0
+    @param float amplitude: peak-to-peak amplitude of every line
+    @param float width: peak-to-peak width of every line
+    @param str lineshape: 'lorentzian', 'gaussian' or 'pseudovoigt'
+    @param float fraction: Lorentzian fraction of the pseudo-Voigt lineshape
+    @param float splitting: distance of neighbouring lines
+    @param tuple lines: positions of the lines in units of splitting
+    @param bool jacobian: return the derivatives with respect to the parameters instead
+
+    @return: numpy.array of the lines or with jacobian=True a dict of the derivatives with respect
+             to center, amplitude, width, splitting and fraction
+    """
+    x = np.asarray(x, dtype=float)
+    value = np.zeros(x.shape)
+    if not jacobian:
+        for m in lines:
+            shape = self._derivative_lineshape((x - center - m * splitting) / width, lineshape, fraction)[0]
+            value += shape
+        return amplitude * value
+
+    slope_sum = np.zeros(x.shape)
+    m_slope_sum = np.zeros(x.shape)
+    z_slope_sum = np.zeros(x.shape)
+    fraction_sum = np.zeros(x.shape)
+    for m in lines:
+        z = (x - center - m * splitting) / width
+        shape, slope, d_fraction = self._derivative_lineshape(z, lineshape, fraction)
+        value += shape
+        slope_sum += slope
+        m_slope_sum += m * slope
+        z_slope_sum += z * slope
+        if d_fraction is not None:
+            fraction_sum += d_fraction
+    return {'center': -amplitude / width * slope_sum,
+            'amplitude': value,
+            'width': -amplitude / width * z_slope_sum,
+            'splitting': -amplitude / width * m_slope_sum,
+            'fraction': amplitude * fraction_sum}
+
+
+################################################################################
+#                                                                              #
+#                   Defining derivative models and Jacobians                   #
+#                                                                              #
+################################################################################
+
+def _derivative_components(self, number_of_lines=1, multiplet=None):
+    """ Prefixes and line positions of the components of a derivative model.
+
+    @param int number_of_lines: number of independent lines (prefixes l0_, l1_, ...)
+    @param tuple multiplet: optional, positions of the hyperfine lines in units of the splitting,
+                            all lines then share center, splitting, amplitude and width
+
+    @return list: tuples (prefix, lines)
+    """
+    if multiplet is not None:
+        return [('', tuple(multiplet))]
+    if number_of_lines == 1:
+        return [('', (0,))]
+    return [('l{0:d}_'.format(index), (0,)) for index in range(number_of_lines)]
+
+
+def _make_derivative_model(self, lineshape, number_of_lines=1, multiplet=None):
+    """ Create a model of derivative lines with a common offset.
+
+    @param str lineshape: 'lorentzian', 'gaussian' or 'pseudovoigt'
+    @param int number_of_lines: number of independent lines, with the parameter prefixes l0_, l1_, ...
+                                if more than one
+    @param tuple multiplet: optional, positions of hyperfine lines in units of the splitting, e.g.
+                            (-1, 0, 1) for a nuclear spin 1. The lines share center, splitting,
+                            amplitude and width.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    def derivative_line(x, center, amplitude, width):
+        return self._derivative_multiplet(x, center, amplitude, width, lineshape)
+
+    def derivative_pseudovoigt_line(x, center, amplitude, width, fraction):
+        return self._derivative_multiplet(x, center, amplitude, width, lineshape, fraction)
+
+    def derivative_hyperfine(x, center, amplitude, width, splitting):
+        return self._derivative_multiplet(x, center, amplitude, width, lineshape,
+                                          splitting=splitting, lines=multiplet)
+
+    def derivative_pseudovoigt_hyperfine(x, center, amplitude, width, splitting, fraction):
+        return self._derivative_multiplet(x, center, amplitude, width, lineshape, fraction,
+                                          splitting, multiplet)
+
+    if multiplet is not None:
+        function = derivative_pseudovoigt_hyperfine if lineshape == 'pseudovoigt' else derivative_hyperfine
+    else:
+        function = derivative_pseudovoigt_line if lineshape == 'pseudovoigt' else derivative_line
+
+    model = None
+    for prefix, lines in self._derivative_components(number_of_lines, multiplet):
+        line_model = Model(function, independent_vars='x', prefix=prefix)
+        line_model.set_param_hint('{0}width'.format(prefix), min=0.)
+        if multiplet is not None:
+            line_model.set_param_hint('{0}splitting'.format(prefix), min=0.)
+        if lineshape == 'pseudovoigt':
+            line_model.set_param_hint('{0}fraction'.format(prefix), value=0.5, min=0., max=1.)
+        model = line_model if model is None else model + line_model
+
+    constant_model, params = self.make_constant_model()
+    model = model + constant_model
+    params = model.make_params()
+    return model, params
+
+
+def _make_derivative_jacobian(self, lineshape, number_of_lines=1, multiplet=None):
+    """ Analytic Jacobian of a model of _make_derivative_model, to be passed to lmfit as
+    fit_kws={'Dfun': jacobian, 'col_deriv': 1}.
+
+    lmfit calls it with the parameters and the arguments of Model._residual, it returns the
+    derivatives of the residual (model - data) * weights with respect to the varying parameters,
+    one row per parameter in the order of the parameters.
+
+    @return function: jacobian(params, data, weights, x, **kwargs)
+    """
+    components = self._derivative_components(number_of_lines, multiplet)
+
+    def jacobian(params, data, weights, x=None, **kwargs):
+        values = params.valuesdict()
+        columns = {'offset': np.ones(np.shape(x))}
+        for prefix, lines in components:
+            derivatives = self._derivative_multiplet(
+                x,
+                values[prefix + 'center'],
+                values[prefix + 'amplitude'],
+                values[prefix + 'width'],
+                lineshape,
+                fraction=values.get(prefix + 'fraction', 0.5),
+                splitting=values.get(prefix + 'splitting', 0.),
+                lines=lines,
+                jacobian=True)
+            for name, derivative in derivatives.items():
+                columns[prefix + name] = derivative
+        jac = np.array([columns[name] for name, param in params.items()
+                        if param.vary and param.expr is None])
+        if weights is not None:
+            jac *= weights
+        return jac
+
+    return jacobian
+
+
+def _make_derivative_fit(self, lineshape, x_axis, data, estimator, units=None, add_params=None,
+                         number_of_lines=1, multiplet=None, analytic_jacobian=True, **kwargs):
+    """ Perform a fit of derivative lines, the common part of the make_*derivative*_fit methods.
+
+    @param str lineshape: 'lorentzian', 'gaussian' or 'pseudovoigt'
+    @param numpy.array x_axis: 1D axis values
+    @param numpy.array data: 1D data, should have the same dimension as x_axis.
+    @param method estimator: Pointer to the estimator method
+    @param list units: List containing the ['horizontal', 'vertical'] units as strings
+    @param Parameters or dict add_params: optional, additional parameters of
+                type lmfit.parameter.Parameters, OrderedDict or dict for the fit
+                which will be used instead of the values from the estimator.
+    @param int number_of_lines: number of independent lines
+    @param tuple multiplet: optional, positions of hyperfine lines in units of the splitting
+    @param bool analytic_jacobian: pass the analytic Jacobian to the optimizer. It is not used if
+                                   a parameter of the lines is constrained by an expression.
+
+    @return object model: lmfit.model.ModelFit object, all parameters
+                          provided about the fitting, like: success,
+                          initial fitting values, best fitting values, data
+                          with best fit with given axis,...
+    """
+    model, params = self._make_derivative_model(lineshape, number_of_lines, multiplet)
+
+    error, params = estimator(x_axis, data, params)
+
+    params = self._substitute_params(initial_params=params,
+                                     update_params=add_params)
+
+    # the Jacobian only knows the model parameters, not the derivatives of expressions
+    if analytic_jacobian and all(param.expr is None for param in params.values()):
+        fit_kws = kwargs.pop('fit_kws', {})
+        fit_kws.update({'Dfun': self._make_derivative_jacobian(lineshape, number_of_lines, multiplet),
+                        'col_deriv': 1})
+        kwargs['fit_kws'] = fit_kws
+    try:
+        result = model.fit(data, x=x_axis, params=params, **kwargs)
+    except:
+        kwargs.pop('fit_kws', None)
+        result = model.fit(data, x=x_axis, params=params, **kwargs)
+        self.log.warning('The derivative {0} fit did not work. Error '
+                         'message: {1}\n'.format(lineshape, result.message))
+
+    # Write the parameters to allow human-readable output to be generated
+    result_str_dict = OrderedDict()
+
+    if units is None:
+        units = ['arb. units', 'arb. units']
+    elif len(units) < 2:
+        units = [units[0], 'arb. units']
+
+    components = self._derivative_components(number_of_lines, multiplet)
+    for index, (prefix, lines) in enumerate(components):
+        suffix = '' if len(components) == 1 else ' {0:d}'.format(index)
+        result_str_dict['Position' + suffix] = {'value': result.params[prefix + 'center'].value,
+                                                'error': result.params[prefix + 'center'].stderr,
+                                                'unit': units[0]}
+        result_str_dict['Peak-to-peak amplitude' + suffix] = {
+            'value': result.params[prefix + 'amplitude'].value,
+            'error': result.params[prefix + 'amplitude'].stderr,
+            'unit': units[1]}
+        result_str_dict['Peak-to-peak width' + suffix] = {'value': result.params[prefix + 'width'].value,
+                                                          'error': result.params[prefix + 'width'].stderr,
+                                                          'unit': units[0]}
+        if multiplet is not None:
+            result_str_dict['Hyperfine splitting' + suffix] = {
+                'value': result.params[prefix + 'splitting'].value,
+                'error': result.params[prefix + 'splitting'].stderr,
+                'unit': units[0]}
+        if lineshape == 'pseudovoigt':
+            result_str_dict['Lorentzian fraction' + suffix] = {
+                'value': result.params[prefix + 'fraction'].value * 100,
+                'error': (None if result.params[prefix + 'fraction'].stderr is None
+                          else result.params[prefix + 'fraction'].stderr * 100),
+                'unit': '%'}
+
+    if number_of_lines == 2 and multiplet is None:
+        result_str_dict['Splitting'] = {'value': (result.params['l1_center'].value -
+                                                  result.params['l0_center'].value),
+                                        'error': (None if result.params['l0_center'].stderr is None
+                                                  else result.params['l0_center'].stderr +
+                                                  result.params['l1_center'].stderr),
+                                        'unit': units[0]}
+
+    result_str_dict['chi_sqr'] = {'value': result.chisqr, 'unit': ''}
+
+    result.result_str_dict = result_str_dict
+    return result
+
+
+################################################################################
+#                                                                              #
+#                          Estimators for derivative lines                     #
+#                                                                              #
+################################################################################
+
+def _find_derivative_extrema(self, data):
+    """ Extrema of the largest derivative line in data (without offset).
+
+    The largest absolute value is one extremum. The other one lies behind the zero crossing of the
+    same line, which is the zero crossing closest to the first extremum (on the other side the lobe
+    reaches until the next line). It is searched at most twice as far behind the zero crossing as
+    the first extremum is in front of it, so that the extrema of neighbouring lines are not mixed up.
+
+    @param numpy.array data: 1D data, the offset subtracted
+
+    @return tuple: (index of the largest extremum, index of the opposite extremum, index of the
+                   last point before the zero crossing between them or None if there is none)
+    """
+    i_peak = int(np.argmax(np.abs(data)))
+    sign = np.sign(data[i_peak])
+    crossings = np.nonzero(np.sign(data[:-1]) != np.sign(data[1:]))[0]
+    if len(crossings) == 0:
+        i_other = int(np.argmin(data)) if sign > 0 else int(np.argmax(data))
+        return i_peak, i_other, None
+
+    crossing = crossings[np.argmin(np.where(crossings >= i_peak, crossings + 1 - i_peak, i_peak - crossings))]
+    if crossing >= i_peak:
+        stop = min(crossing + 2 + 2 * (crossing + 1 - i_peak), len(data))
+        i_other = crossing + 1 + int(np.argmax(-sign * data[crossing + 1:stop]))
+    else:
+        start = max(crossing - 2 * (i_peak - crossing), 0)
+        i_other = start + int(np.argmax(-sign * data[start:crossing + 1]))
+    return i_peak, i_other, crossing
+
+
+def _estimate_derivative_lines(self, x_axis, data, params, lineshape, number_of_lines=1,
+                               multiplet=None, zero_crossing=True):
+    """ Estimate the lines of a derivative model one after the other: the largest line from the
+    extrema of the (smoothed) data is subtracted before the next one is estimated.
+
+    Every line is estimated from its extrema: the peak-to-peak amplitude from the difference of
+    maximum and minimum, the peak-to-peak width from their distance. The center is the zero
+    crossing between the extrema if zero_crossing is True, otherwise their midpoint.
+
+    @param numpy.array x_axis: 1D axis values
+    @param numpy.array data: 1D data, should have the same dimension as x_axis.
+    @param lmfit.Parameters params: object includes parameter dictionary which
+                                    can be set
+    @param str lineshape: 'lorentzian', 'gaussian' or 'pseudovoigt'
+    @param int number_of_lines: number of independent lines
+    @param tuple multiplet: optional, positions of hyperfine lines in units of the splitting
+    @param bool zero_crossing: take the center from the zero crossing (otherwise the midpoint of
+                               the extrema)
+
+    @return tuple (error, params):
+
+    Explanation of the return parameter:
+        int error: error code (0:OK, -1:error)
+        Parameters object params: set parameters of initial values
+    """
+    # check if parameters make sense
+    error = self._check_1D_input(x_axis=x_axis, data=data, params=params)
+
+    # check if input x-axis is ordered and increasing
+    sorted_indices = np.argsort(x_axis)
+    if not np.all(sorted_indices == np.arange(len(x_axis))):
+        x_axis = x_axis[sorted_indices]
+        data = data[sorted_indices]
+    x_axis = np.asarray(x_axis, dtype=float)
+
+    # the derivative lines vanish far from their center, the edges of the spectrum give the offset
+    edge = max(len(data) // 10, 1)
+    offset = np.median(np.concatenate((data[:edge], data[-edge:])))
+    # light smoothing only, a wider filter would distort narrow lines
+    residual = self.gaussian_smoothing(data=np.asarray(data, dtype=float) - offset,
+                                       filter_len=5, filter_sigma=1.)
+    if multiplet is not None:
+        estimated_lines = len(multiplet)
+    else:
+        estimated_lines = number_of_lines
+
+    min_step = np.min(np.diff(x_axis)) if len(x_axis) > 1 else 1.
+    lines = []
+    for index in range(estimated_lines):
+        i_peak, i_other, crossing = self._find_derivative_extrema(residual)
+        i_max, i_min = (i_peak, i_other) if residual[i_peak] > residual[i_other] else (i_other, i_peak)
+        # maximum on the low x side: derivative of an absorption peak
+        sign = 1 if i_max <= i_min else -1
+        amplitude = sign * (residual[i_max] - residual[i_min])
+        width = max(abs(x_axis[i_max] - x_axis[i_min]), min_step)
+        center = (x_axis[i_max] + x_axis[i_min]) / 2
+        if zero_crossing and crossing is not None:
+            # linear interpolation between the points around the zero crossing
+            y0, y1 = residual[crossing], residual[crossing + 1]
+            center = x_axis[crossing] + (x_axis[crossing + 1] - x_axis[crossing]) * y0 / (y0 - y1)
+        lines.append((center, amplitude, width))
+        residual = residual - self._derivative_multiplet(x_axis, center, amplitude, width, lineshape)
+
+    params['offset'].set(value=offset)
+    if multiplet is not None:
+        lines.sort()
+        centers = np.array([line[0] for line in lines])
+        multiplet = np.sort(np.asarray(multiplet, dtype=float))
+        # least squares of the found positions against the line positions of the multiplet
+        if np.ptp(multiplet) > 0 and len(lines) > 1:
+            splitting, center = np.polyfit(multiplet, centers, 1)
+        else:
+            splitting, center = 0., np.mean(centers)
+        params['center'].set(value=center)
+        params['splitting'].set(value=abs(splitting), min=0.)
+        params['amplitude'].set(value=np.median([line[1] for line in lines]))
+        params['width'].set(value=np.median([line[2] for line in lines]), min=0.)
+        return error, params
+
+    if number_of_lines == 1:
+        prefixes = ['']
+    else:
+        # sort the lines by position, l0_ is the line with the lowest x
+        lines.sort()
+        prefixes = ['l{0:d}_'.format(index) for index in range(number_of_lines)]
+    for prefix, (center, amplitude, width) in zip(prefixes, lines):
+        params[prefix + 'center'].set(value=center, min=x_axis.min() - np.ptp(x_axis),
+                                      max=x_axis.max() + np.ptp(x_axis))
+        params[prefix + 'amplitude'].set(value=amplitude)
+        params[prefix + 'width'].set(value=width, min=0.)
+    return error, params
+
+
+################################################################################
+#                                                                              #
+#                   Derivative Lorentzian, Gaussian and pseudo-Voigt           #
+#                                                                              #
+################################################################################
+
+def make_lorentzianderivative_model(self):
+    """ Create a model of the first derivative of a Lorentzian with offset.
+
+    Parameters: center, amplitude (peak-to-peak), width (peak-to-peak), offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('lorentzian')
+
+
+def make_lorentzianderivative_fit(self, x_axis, data, estimator, units=None,
+                                  add_params=None, **kwargs):
+    """ Perform a fit of the first derivative of a Lorentzian, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('lorentzian', x_axis, data, estimator, units, add_params, **kwargs)
+
+
+def estimate_lorentzianderivative_zerocrossing(self, x_axis, data, params):
+    """ Center from the zero crossing, amplitude and width from the extrema.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'lorentzian')
+
+
+def estimate_lorentzianderivative_peaktopeak(self, x_axis, data, params):
+    """ Center, amplitude and width from the extrema only (robust if the zero crossing is noisy).
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'lorentzian', zero_crossing=False)
+
+
+def make_gaussianderivative_model(self):
+    """ Create a model of the first derivative of a Gaussian with offset.
+
+    Parameters: center, amplitude (peak-to-peak), width (peak-to-peak), offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('gaussian')
+
+
+def make_gaussianderivative_fit(self, x_axis, data, estimator, units=None,
+                                add_params=None, **kwargs):
+    """ Perform a fit of the first derivative of a Gaussian, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('gaussian', x_axis, data, estimator, units, add_params, **kwargs)
+
+
+def estimate_gaussianderivative_zerocrossing(self, x_axis, data, params):
+    """ Center from the zero crossing, amplitude and width from the extrema.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'gaussian')
+
+
+def estimate_gaussianderivative_peaktopeak(self, x_axis, data, params):
+    """ Center, amplitude and width from the extrema only (robust if the zero crossing is noisy).
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'gaussian', zero_crossing=False)
+
+
+def make_pseudovoigtderivative_model(self):
+    """ Create a model of the first derivative of a pseudo-Voigt profile with offset: the sum of
+    Lorentzian (weight fraction) and Gaussian (weight 1 - fraction) derivatives of the same
+    peak-to-peak amplitude and width.
+
+    Parameters: center, amplitude (peak-to-peak), width (peak-to-peak), fraction, offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('pseudovoigt')
+
+
+def make_pseudovoigtderivative_fit(self, x_axis, data, estimator, units=None,
+                                   add_params=None, **kwargs):
+    """ Perform a fit of the first derivative of a pseudo-Voigt profile, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('pseudovoigt', x_axis, data, estimator, units, add_params, **kwargs)
+
+
+def estimate_pseudovoigtderivative_zerocrossing(self, x_axis, data, params):
+    """ Center from the zero crossing, amplitude and width from the extrema, fraction 0.5.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'pseudovoigt')
+
+
+def estimate_pseudovoigtderivative_peaktopeak(self, x_axis, data, params):
+    """ Center, amplitude and width from the extrema only, fraction 0.5.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'pseudovoigt', zero_crossing=False)
+
+
+################################################################################
+#                                                                              #
+#                       Two independent derivative lines                       #
+#                                                                              #
+################################################################################
+
+def make_lorentzianderivativedouble_model(self):
+    """ Create a model of two Lorentzian derivatives with common offset.
+
+    Parameters: l0_center, l0_amplitude, l0_width, l1_..., offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('lorentzian', number_of_lines=2)
+
+
+def make_lorentzianderivativedouble_fit(self, x_axis, data, estimator, units=None,
+                                        add_params=None, **kwargs):
+    """ Perform a fit of two Lorentzian derivatives, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('lorentzian', x_axis, data, estimator, units, add_params,
+                                     number_of_lines=2, **kwargs)
+
+
+def estimate_lorentzianderivativedouble_zerocrossing(self, x_axis, data, params):
+    """ Both lines one after the other from their extrema and zero crossings.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'lorentzian', number_of_lines=2)
+
+
+def estimate_lorentzianderivativedouble_peaktopeak(self, x_axis, data, params):
+    """ Both lines one after the other from their extrema.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'lorentzian', number_of_lines=2,
+                                           zero_crossing=False)
+
+
+def make_gaussianderivativedouble_model(self):
+    """ Create a model of two Gaussian derivatives with common offset.
+
+    Parameters: l0_center, l0_amplitude, l0_width, l1_..., offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('gaussian', number_of_lines=2)
+
+
+def make_gaussianderivativedouble_fit(self, x_axis, data, estimator, units=None,
+                                      add_params=None, **kwargs):
+    """ Perform a fit of two Gaussian derivatives, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('gaussian', x_axis, data, estimator, units, add_params,
+                                     number_of_lines=2, **kwargs)
+
+
+def estimate_gaussianderivativedouble_zerocrossing(self, x_axis, data, params):
+    """ Both lines one after the other from their extrema and zero crossings.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'gaussian', number_of_lines=2)
+
+
+def estimate_gaussianderivativedouble_peaktopeak(self, x_axis, data, params):
+    """ Both lines one after the other from their extrema.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'gaussian', number_of_lines=2,
+                                           zero_crossing=False)
+
+
+def make_pseudovoigtderivativedouble_model(self):
+    """ Create a model of two pseudo-Voigt derivatives with common offset.
+
+    Parameters: l0_center, l0_amplitude, l0_width, l0_fraction, l1_..., offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('pseudovoigt', number_of_lines=2)
+
+
+def make_pseudovoigtderivativedouble_fit(self, x_axis, data, estimator, units=None,
+                                         add_params=None, **kwargs):
+    """ Perform a fit of two pseudo-Voigt derivatives, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('pseudovoigt', x_axis, data, estimator, units, add_params,
+                                     number_of_lines=2, **kwargs)
+
+
+def estimate_pseudovoigtderivativedouble_zerocrossing(self, x_axis, data, params):
+    """ Both lines one after the other from their extrema and zero crossings.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'pseudovoigt', number_of_lines=2)
+
+
+def estimate_pseudovoigtderivativedouble_peaktopeak(self, x_axis, data, params):
+    """ Both lines one after the other from their extrema.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'pseudovoigt', number_of_lines=2,
+                                           zero_crossing=False)
+
+
+################################################################################
+#                                                                              #
+#              Hyperfine triplet (one nucleus with spin 1, e.g. 14N)           #
+#                                                                              #
+################################################################################
+
+def make_lorentzianderivativetriplet_model(self):
+    """ Create a model of a hyperfine triplet of Lorentzian derivatives with offset: three lines of
+    equal amplitude and width at center - splitting, center and center + splitting.
+
+    Parameters: center, splitting, amplitude (peak-to-peak of every line), width, offset.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('lorentzian', multiplet=_TRIPLET)
+
+
+def make_lorentzianderivativetriplet_fit(self, x_axis, data, estimator, units=None,
+                                         add_params=None, **kwargs):
+    """ Perform a fit of a hyperfine triplet of Lorentzian derivatives, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('lorentzian', x_axis, data, estimator, units, add_params,
+                                     multiplet=_TRIPLET, **kwargs)
+
+
+def estimate_lorentzianderivativetriplet_zerocrossing(self, x_axis, data, params):
+    """ The three lines one after the other from their extrema and zero crossings, the splitting
+    from their positions.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'lorentzian', multiplet=_TRIPLET)
+
+
+def estimate_lorentzianderivativetriplet_peaktopeak(self, x_axis, data, params):
+    """ The three lines one after the other from their extrema, the splitting from their positions.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'lorentzian', multiplet=_TRIPLET,
+                                           zero_crossing=False)
+
+
+def make_gaussianderivativetriplet_model(self):
+    """ Create a model of a hyperfine triplet of Gaussian derivatives with offset, see
+    make_lorentzianderivativetriplet_model.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('gaussian', multiplet=_TRIPLET)
+
+
+def make_gaussianderivativetriplet_fit(self, x_axis, data, estimator, units=None,
+                                       add_params=None, **kwargs):
+    """ Perform a fit of a hyperfine triplet of Gaussian derivatives, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('gaussian', x_axis, data, estimator, units, add_params,
+                                     multiplet=_TRIPLET, **kwargs)
+
+
+def estimate_gaussianderivativetriplet_zerocrossing(self, x_axis, data, params):
+    """ The three lines one after the other from their extrema and zero crossings, the splitting
+    from their positions.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'gaussian', multiplet=_TRIPLET)
+
+
+def estimate_gaussianderivativetriplet_peaktopeak(self, x_axis, data, params):
+    """ The three lines one after the other from their extrema, the splitting from their positions.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'gaussian', multiplet=_TRIPLET,
+                                           zero_crossing=False)
+
+
+def make_pseudovoigtderivativetriplet_model(self):
+    """ Create a model of a hyperfine triplet of pseudo-Voigt derivatives with offset, see
+    make_lorentzianderivativetriplet_model. The lines share the Lorentzian fraction.
+
+    @return tuple: (object model, object params), see make_lorentzian_model
+    """
+    return self._make_derivative_model('pseudovoigt', multiplet=_TRIPLET)
+
+
+def make_pseudovoigtderivativetriplet_fit(self, x_axis, data, estimator, units=None,
+                                          add_params=None, **kwargs):
+    """ Perform a fit of a hyperfine triplet of pseudo-Voigt derivatives, see _make_derivative_fit.
+
+    @return object model: lmfit.model.ModelFit object
+    """
+    return self._make_derivative_fit('pseudovoigt', x_axis, data, estimator, units, add_params,
+                                     multiplet=_TRIPLET, **kwargs)
+
+
+def estimate_pseudovoigtderivativetriplet_zerocrossing(self, x_axis, data, params):
+    """ The three lines one after the other from their extrema and zero crossings, the splitting
+    from their positions.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'pseudovoigt', multiplet=_TRIPLET)
+
+
+def estimate_pseudovoigtderivativetriplet_peaktopeak(self, x_axis, data, params):
+    """ The three lines one after the other from their extrema, the splitting from their positions.
+
+    @return tuple (error, params), see _estimate_derivative_lines
+    """
+    return self._estimate_derivative_lines(x_axis, data, params, 'pseudovoigt', multiplet=_TRIPLET,
+                                           zero_crossing=False)
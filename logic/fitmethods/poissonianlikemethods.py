@@ -24,7 +24,11 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 import numpy as np
 from lmfit.models import Model
 from lmfit import Parameters
-from scipy.signal import gaussian
+try:
+    from scipy.signal.windows import gaussian
+except ImportError:
+    # scipy < 1.1
+    from scipy.signal import gaussian
 from scipy.ndimage import filters
 from scipy.interpolate import InterpolatedUnivariateSpline
 from collections import OrderedDict
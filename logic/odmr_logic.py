@@ -29,8 +29,12 @@ import time
 import datetime
 import matplotlib.pyplot as plt
 
+from logic.fit_logic import LiveFitWorker
 from logic.generic_logic import GenericLogic
+from core.util.math import SlidingWindowStatistics
 from core.util.mutex import Mutex
+from core.util.plot_updates import PlotUpdateBus
+from core.util.ring_buffer import RingBuffer
 from core.connector import Connector
 from core.configoption import ConfigOption
 from core.statusvariable import StatusVar
@@ -52,6 +56,10 @@ class ODMRLogic(GenericLogic):
         'SWEEP',
         missing='warn',
         converter=lambda x: MicrowaveMode[x.upper()])
+    # maximum number of raw data lines held in memory, older lines are spilled to disk (or dropped)
+    raw_data_buffer_lines = ConfigOption('raw_data_buffer_lines', 1000)
+    # maximum number of plot updates per second, faster lines are merged into the next update
+    max_plot_rate = ConfigOption('max_plot_rate', 20., missing='nothing')
 
     clock_frequency = StatusVar('clock_frequency', 200)
     cw_mw_frequency = StatusVar('cw_mw_frequency', 2870e6)
@@ -68,6 +76,12 @@ class ODMRLogic(GenericLogic):
     lines_to_average = StatusVar('lines_to_average', 0)
     _oversampling = StatusVar('oversampling', default=10)
     _lock_in_active = StatusVar('lock_in_active', default=False)
+    keep_raw_data_history = StatusVar('keep_raw_data_history', default=True)
+    # continuous fit of the averaged spectrum of one channel and range in a background thread
+    live_fit_enabled = StatusVar('live_fit_enabled', default=False)
+    live_fit_interval = StatusVar('live_fit_interval', default=1.)
+    live_fit_channel = StatusVar('live_fit_channel', default=0)
+    live_fit_range = StatusVar('live_fit_range', default=0)
 
     # Internal signals
     sigNextLine = QtCore.Signal()
@@ -126,19 +140,34 @@ class ODMRLogic(GenericLogic):
         # for clearing the ODMR data during a measurement
         self._clearOdmrData = False
 
+        # Rate limited plot updates, sigOdmrPlotsUpdated is emitted through it. The matrix is a view
+        # into the raw data buffer, the plots get a copy in one of two display buffers.
+        self._display_buffers = [None, None]
+        self._display_index = 0
+        self.plot_updates = PlotUpdateBus(self.max_plot_rate, parent=self)
+        self.plot_updates.add_channel('plots', self.sigOdmrPlotsUpdated,
+                                      snapshot=self._snapshot_odmr_plots)
+
         # Initalize the ODMR data arrays (mean signal and sweep matrix)
         self._initialize_odmr_plots()
-        # Raw data array
-        self.odmr_raw_data = np.zeros(
-            [self.number_of_lines,
-             len(self._odmr_counter.get_odmr_channels()),
-             self.odmr_plot_x.size]
+        # Raw data buffer and average of the lines
+        self._raw_data = RingBuffer(
+            self.number_of_lines,
+            (len(self._odmr_counter.get_odmr_channels()), self.odmr_plot_x.size)
         )
+        self._odmr_average = SlidingWindowStatistics(self._raw_data.capacity, self._raw_data.line_shape)
+        self._odmr_average.set_window(self.lines_to_average)
 
         # Switch off microwave and set CW frequency and power
         self.mw_off()
         self.set_cw_parameters(self.cw_mw_frequency, self.cw_mw_power)
 
+        # Background fitting of the latest spectrum
+        self._live_fit = LiveFitWorker(self.fc, self.live_fit_interval)
+        self._live_fit.sigNewFitResult.connect(self._live_fit_updated, QtCore.Qt.QueuedConnection)
+        if self.live_fit_enabled:
+            self._live_fit.start()
+
         # Connect signals
         self.sigNextLine.connect(self._scan_odmr_line, QtCore.Qt.QueuedConnection)
         return
@@ -160,8 +189,22 @@ class ODMRLogic(GenericLogic):
                 break
         # Switch off microwave source for sure (also if CW mode is active or module is still locked)
         self._mw_device.off()
+        self._raw_data.close()
+        self._odmr_average.close()
+        self._live_fit.stop()
         # Disconnect signals
         self.sigNextLine.disconnect()
+        self.plot_updates.disconnect()
+        self.plot_updates.clear()
+        self._live_fit.sigNewFitResult.disconnect()
+
+    @property
+    def odmr_raw_data(self):
+        """ Raw data lines held in memory, newest line first (zero-copy view of the raw data buffer).
+
+        @return numpy.ndarray: shape (lines, channels, frequencies), lines not acquired yet are zero
+        """
+        return self._raw_data.view()
 
     @fc.constructor
     def sv_set_fits(self, val):
@@ -220,6 +263,8 @@ class ODMRLogic(GenericLogic):
 
         self.odmr_plot_x = np.array(self.final_freq_list)
         self.odmr_plot_y = np.zeros([len(self.get_odmr_channels()), self.odmr_plot_x.size])
+        # standard error of the mean signal, e.g. for error bars
+        self.odmr_plot_y_error = np.full(self.odmr_plot_y.shape, np.nan)
 
         self.odmr_plot_xy = np.zeros(
             [self.number_of_lines, len(self.get_odmr_channels()), self.odmr_plot_x.size])
@@ -232,7 +277,7 @@ class ODMRLogic(GenericLogic):
 
         self.odmr_fit_y = np.zeros(self.odmr_fit_x.size)
 
-        self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
+        self.plot_updates.post('plots', self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
         current_fit = self.fc.current_fit
         self.sigOdmrFitUpdated.emit(self.odmr_fit_x, self.odmr_fit_y, {}, current_fit)
         return
@@ -260,31 +305,132 @@ class ODMRLogic(GenericLogic):
 
     def set_average_length(self, lines_to_average):
         """
-        Sets the number of lines to average for the sum of the data
+        Sets the number of lines to average for the sum of the data. Can be changed during a
+        measurement, the average is updated without summing the lines again.
 
         @param int lines_to_average: desired number of lines to average (0 means all)
 
         @return int: actually set lines to average
         """
         self.lines_to_average = int(lines_to_average)
+        self._odmr_average.set_window(self.lines_to_average)
+        self._update_odmr_plot_y()
 
-        if self.lines_to_average <= 0:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                axis=0,
-                dtype=np.float64
-            )
-        else:
-            self.odmr_plot_y = np.mean(
-                self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                axis=0,
-                dtype=np.float64
-            )
-
-        self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
+        self.plot_updates.post('plots', self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
         self.sigParameterUpdated.emit({'average_length': self.lines_to_average})
         return self.lines_to_average
 
+    def _snapshot_odmr_plots(self, odmr_plot_x, odmr_plot_y, odmr_plot_xy):
+        """ The plot data of an update with the matrix copied into one of the two display buffers.
+
+        Called by plot_updates in the thread of the logic, only after the receivers have handled
+        the previous update, so the matrix of an update is not written again before the receivers
+        are done with the next one.
+        """
+        self._display_index = 1 - self._display_index
+        display = self._display_buffers[self._display_index]
+        if display is None or display.shape != odmr_plot_xy.shape:
+            display = np.empty_like(odmr_plot_xy)
+            self._display_buffers[self._display_index] = display
+        np.copyto(display, odmr_plot_xy)
+        return odmr_plot_x, odmr_plot_y, display
+
+    def _update_odmr_plot_y(self):
+        """ Set odmr_plot_y and odmr_plot_y_error to the mean and its standard error of the last
+        lines_to_average (or all) raw data lines. """
+        self.odmr_plot_y = self._odmr_average.mean
+        self.odmr_plot_y_error = self._odmr_average.standard_error
+        return
+
+    def set_keep_raw_data_history(self, keep):
+        """
+        Sets whether the raw data lines that do not fit into memory (raw_data_buffer_lines) are kept
+        in a temporary file, so that the whole measurement is saved. Takes effect with the next
+        started scan.
+
+        @param bool keep: keep the whole raw data history
+
+        @return bool: actually set value
+        """
+        self.keep_raw_data_history = bool(keep)
+        self.sigParameterUpdated.emit({'keep_raw_data_history': self.keep_raw_data_history})
+        return self.keep_raw_data_history
+
+    def set_live_fit(self, enabled, interval=None, channel_index=None, fit_range=None):
+        """
+        Switch the continuous fit of the averaged spectrum on or off. The current fit is done in a
+        background thread at most every interval seconds on the latest spectrum, the acquisition
+        never waits for it. The results are emitted with sigOdmrFitUpdated like the ones of do_fit.
+
+        @param bool enabled: fit continuously during the measurement
+        @param float interval: optional, minimum time between two fits in s
+        @param int channel_index: optional, channel to fit
+        @param int fit_range: optional, frequency range to fit (-1 for all ranges)
+
+        @return dict: the actually set live fit parameters
+        """
+        if interval is not None:
+            self.live_fit_interval = max(float(interval), 0.)
+            self._live_fit.interval = self.live_fit_interval
+        if channel_index is not None:
+            self.live_fit_channel = int(channel_index)
+        if fit_range is not None:
+            self.live_fit_range = int(fit_range)
+        self._check_live_fit_selection()
+        self.live_fit_enabled = bool(enabled)
+        if self.live_fit_enabled:
+            self._live_fit.start()
+        else:
+            self._live_fit.stop()
+
+        update_dict = {'live_fit_enabled': self.live_fit_enabled,
+                       'live_fit_interval': self.live_fit_interval,
+                       'live_fit_channel': self.live_fit_channel,
+                       'live_fit_range': self.live_fit_range}
+        self.sigParameterUpdated.emit(update_dict)
+        return update_dict
+
+    def _check_live_fit_selection(self):
+        """ Reset the live fit channel and range if they do not exist (anymore), e.g. restored from
+        a previous session with another counter or fewer frequency ranges.
+
+        @return bool: whether the channel or the range was reset
+        """
+        reset = False
+        if not 0 <= self.live_fit_channel < len(self.get_odmr_channels()):
+            self.log.warning('Live fit channel {0:d} does not exist, fitting channel 0 instead.'
+                             ''.format(self.live_fit_channel))
+            self.live_fit_channel = 0
+            reset = True
+        if self.live_fit_range >= len(self.mw_starts):
+            self.log.warning('Live fit range {0:d} does not exist, fitting range 0 instead.'
+                             ''.format(self.live_fit_range))
+            self.live_fit_range = 0
+            reset = True
+        return reset
+
+    def get_live_fit_statistics(self):
+        """ Statistics of the live fit since the start of the measurement.
+
+        @return dict: number of fits, skipped (replaced by a newer spectrum before being fitted) and
+                      failed fits, last, mean and maximum latency from the spectrum to its fit result
+                      and mean fit duration, all times in s
+        """
+        return dict(self._live_fit.statistics)
+
+    def _live_fit_updated(self, fit_name, fit_x, fit_y, result, info):
+        """ Take over a result of the live fit (in the logic thread). """
+        if result is None:
+            return
+        channel_index, fit_range = info['tag']
+        key = 'channel: {0}, range: {1}'.format(channel_index, fit_range)
+        self.fits_performed[key] = (fit_x, fit_y, result, fit_name)
+        self.odmr_fit_x, self.odmr_fit_y = fit_x, fit_y
+        self.fc.current_fit_param = result.params
+        self.fc.current_fit_result = result
+        self.sigOdmrFitUpdated.emit(fit_x, fit_y, result.result_str_dict, fit_name)
+        return
+
     def set_clock_frequency(self, clock_frequency):
         """
         Sets the frequency of the counter clock
@@ -643,6 +789,8 @@ class ODMRLogic(GenericLogic):
             self._clearOdmrData = False
             self.stopRequested = False
             self.fc.clear_result()
+            self._live_fit.reset_statistics()
+            self.plot_updates.reset_statistics()
 
             self.elapsed_sweeps = 0
             self.elapsed_time = 0.0
@@ -663,18 +811,27 @@ class ODMRLogic(GenericLogic):
                 return -1
 
             self._initialize_odmr_plots()
-            # initialize raw_data array
+            if self._check_live_fit_selection():
+                self.sigParameterUpdated.emit({'live_fit_channel': self.live_fit_channel,
+                                               'live_fit_range': self.live_fit_range})
+            # initialize raw data buffer, the lines beyond its capacity are spilled to disk
             estimated_number_of_lines = self.run_time * self.clock_frequency / self.odmr_plot_x.size
             estimated_number_of_lines = int(1.5 * estimated_number_of_lines)  # Safety
-            if estimated_number_of_lines < self.number_of_lines:
-                estimated_number_of_lines = self.number_of_lines
-            self.log.debug('Estimated number of raw data lines: {0:d}'
-                           ''.format(estimated_number_of_lines))
-            self.odmr_raw_data = np.zeros(
-                [estimated_number_of_lines,
-                 len(self._odmr_counter.get_odmr_channels()),
-                 self.odmr_plot_x.size]
+            buffer_lines = max(self.number_of_lines,
+                               self.lines_to_average,
+                               min(estimated_number_of_lines, self.raw_data_buffer_lines))
+            self.log.debug('Estimated number of raw data lines: {0:d}, raw data buffer lines: {1:d}'
+                           ''.format(estimated_number_of_lines, buffer_lines))
+            self._raw_data.close()
+            self._raw_data = RingBuffer(
+                buffer_lines,
+                (len(self._odmr_counter.get_odmr_channels()), self.odmr_plot_x.size),
+                spill=self.keep_raw_data_history
             )
+            self._odmr_average.close()
+            self._odmr_average = SlidingWindowStatistics(
+                buffer_lines, self._raw_data.line_shape, spill=self.keep_raw_data_history)
+            self._odmr_average.set_window(self.lines_to_average)
             self.sigNextLine.emit()
             return 0
 
@@ -749,11 +906,18 @@ class ODMRLogic(GenericLogic):
                 self.mw_off()
                 self._stop_odmr_counter()
                 self.module_state.unlock()
+                self.plot_updates.flush()
+                self.log.debug('Plot updates: {0}.'.format(self.plot_updates.statistics_message()))
+                if self._live_fit.statistics['fits'] > 0:
+                    stats = self._live_fit.statistics
+                    self.log.info('Live fit: {0:d} fits, {1:d} skipped, latency {2:.3f} s (mean), '
+                                  '{3:.3f} s (max), fit time {4:.3f} s (mean).'
+                                  ''.format(stats['fits'], stats['skipped'], stats['mean_latency'],
+                                            stats['max_latency'], stats['mean_fit_time']))
                 return
 
             # if during the scan a clearing of the ODMR data is needed:
             if self._clearOdmrData:
-                self.elapsed_sweeps = 0
                 self._startTime = time.time()
 
             # reset position so every line starts from the same frequency
@@ -767,54 +931,42 @@ class ODMRLogic(GenericLogic):
                 self.sigNextLine.emit()
                 return
 
-            # Add new count data to raw_data array and append if array is too small
+            # Add new count data as newest line of the raw data buffer
             if self._clearOdmrData:
-                self.odmr_raw_data[:, :, :] = 0
+                self._raw_data.clear()
+                self._odmr_average.clear()
+                self.elapsed_sweeps = 0
                 self._clearOdmrData = False
-            if self.elapsed_sweeps == (self.odmr_raw_data.shape[0] - 1):
-                expanded_array = np.zeros(self.odmr_raw_data.shape)
-                self.odmr_raw_data = np.concatenate((self.odmr_raw_data, expanded_array), axis=0)
-                self.log.warning('raw data array in ODMRLogic was not big enough for the entire '
-                                 'measurement. Array will be expanded.\nOld array shape was '
-                                 '({0:d}, {1:d}), new shape is ({2:d}, {3:d}).'
-                                 ''.format(self.odmr_raw_data.shape[0] - self.number_of_lines,
-                                           self.odmr_raw_data.shape[1],
-                                           self.odmr_raw_data.shape[0],
-                                           self.odmr_raw_data.shape[1]))
-
-            # shift data in the array "up" and add new data at the "bottom"
-            self.odmr_raw_data = np.roll(self.odmr_raw_data, 1, axis=0)
-
-            self.odmr_raw_data[0] = new_counts
+            self._raw_data.append(new_counts)
+            self._odmr_average.add(new_counts)
+            self.elapsed_sweeps += 1
 
             # Add new count data to mean signal
-            if self._clearOdmrData:
-                self.odmr_plot_y[:, :] = 0
-
-            if self.lines_to_average <= 0:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, self.elapsed_sweeps), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
-            else:
-                self.odmr_plot_y = np.mean(
-                    self.odmr_raw_data[:max(1, min(self.lines_to_average, self.elapsed_sweeps)), :, :],
-                    axis=0,
-                    dtype=np.float64
-                )
+            self._update_odmr_plot_y()
 
             # Set plot slice of matrix
-            self.odmr_plot_xy = self.odmr_raw_data[:self.number_of_lines, :, :]
-
-            # Update elapsed time/sweeps
-            self.elapsed_sweeps += 1
+            self.odmr_plot_xy = self._raw_data.view(self.number_of_lines)
+
+            # Hand the new mean signal to the live fit, returns immediately. A problem of the live
+            # fit must not stop the acquisition.
+            if self._live_fit.is_running:
+                try:
+                    x_data, y_data = self._get_fit_data(self.live_fit_channel, self.live_fit_range)
+                    self._live_fit.submit(
+                        x_data, y_data, tag=(self.live_fit_channel, self.live_fit_range))
+                except Exception:
+                    self.log.exception('Live fit of channel {0}, range {1} failed, switching the '
+                                       'live fit off.'.format(self.live_fit_channel,
+                                                              self.live_fit_range))
+                    self.set_live_fit(False)
+
+            # Update elapsed time
             self.elapsed_time = time.time() - self._startTime
             if self.elapsed_time >= self.run_time:
                 self.stopRequested = True
             # Fire update signals
             self.sigOdmrElapsedTimeUpdated.emit(self.elapsed_time, self.elapsed_sweeps)
-            self.sigOdmrPlotsUpdated.emit(self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
+            self.plot_updates.post('plots', self.odmr_plot_x, self.odmr_plot_y, self.odmr_plot_xy)
             self.sigNextLine.emit()
             return
 
@@ -834,22 +986,27 @@ class ODMRLogic(GenericLogic):
         """
         return list(self.fc.fit_list)
 
+    def _get_fit_data(self, channel_index, fit_range):
+        """ Frequencies and mean signal of a channel in one frequency range (all for fit_range < 0). """
+        if fit_range >= 0:
+            x_data = self.frequency_lists[fit_range]
+            x_data_full_length = np.zeros(len(self.final_freq_list))
+            # how to insert the data at the right position?
+            start_pos = np.where(np.isclose(self.final_freq_list, self.mw_starts[fit_range]))[0][0]
+            x_data_full_length[start_pos:(start_pos + len(x_data))] = x_data
+            y_args = np.array([ind_list[0] for ind_list in np.argwhere(x_data_full_length)])
+            y_data = self.odmr_plot_y[channel_index][y_args]
+        else:
+            x_data = self.final_freq_list
+            y_data = self.odmr_plot_y[channel_index]
+        return x_data, y_data
+
     def do_fit(self, fit_function=None, x_data=None, y_data=None, channel_index=0, fit_range=0):
         """
         Execute the currently configured fit on the measurement data. Optionally on passed data
         """
         if (x_data is None) or (y_data is None):
-            if fit_range >= 0:
-                x_data = self.frequency_lists[fit_range]
-                x_data_full_length = np.zeros(len(self.final_freq_list))
-                # how to insert the data at the right position?
-                start_pos = np.where(np.isclose(self.final_freq_list, self.mw_starts[fit_range]))[0][0]
-                x_data_full_length[start_pos:(start_pos + len(x_data))] = x_data
-                y_args = np.array([ind_list[0] for ind_list in np.argwhere(x_data_full_length)])
-                y_data = self.odmr_plot_y[channel_index][y_args]
-            else:
-                x_data = self.final_freq_list
-                y_data = self.odmr_plot_y[channel_index]
+            x_data, y_data = self._get_fit_data(channel_index, fit_range)
         if fit_function is not None and isinstance(fit_function, str):
             if fit_function in self.get_fit_functions():
                 self.fc.set_current_fit(fit_function)
@@ -883,6 +1040,12 @@ class ODMRLogic(GenericLogic):
         if tag is None:
             tag = ''
 
+        raw_data = self._raw_data.get_lines(self.elapsed_sweeps)
+        if raw_data.shape[0] < self.elapsed_sweeps:
+            self.log.warning('Only the last {0:d} of {1:d} raw data lines are saved, enable '
+                             'keep_raw_data_history to keep all of them.'
+                             ''.format(raw_data.shape[0], self.elapsed_sweeps))
+
         for nch, channel in enumerate(self.get_odmr_channels()):
             # first save raw data for each channel
             if len(tag) > 0:
@@ -891,7 +1054,7 @@ class ODMRLogic(GenericLogic):
                 filelabel_raw = 'ODMR_data_ch{0}_raw'.format(nch)
 
             data_raw = OrderedDict()
-            data_raw['count data (counts/s)'] = self.odmr_raw_data[:self.elapsed_sweeps, nch, :]
+            data_raw['count data (counts/s)'] = raw_data[:, nch, :]
             parameters = OrderedDict()
             parameters['Microwave CW Power (dBm)'] = self.cw_mw_power
             parameters['Microwave Sweep Power (dBm)'] = self.sweep_mw_power
@@ -925,6 +1088,7 @@ class ODMRLogic(GenericLogic):
                 num_points = len(frequency_arr)
                 data_end_ind = data_start_ind + num_points
                 data['count data (counts/s)'] = self.odmr_plot_y[nch][data_start_ind:data_end_ind]
+                data['standard error (counts/s)'] = self.odmr_plot_y_error[nch][data_start_ind:data_end_ind]
                 data_start_ind += num_points
 
                 parameters = OrderedDict()
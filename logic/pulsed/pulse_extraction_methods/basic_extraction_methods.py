@@ -19,6 +19,8 @@ Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
 top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
 """
 
+import bisect
+
 import numpy as np
 from scipy import ndimage
 
@@ -110,11 +112,12 @@ class BasicPulseExtractor(PulseExtractorBase):
             trace.
 
             The maxima and minima are not found sequentially, pulse by pulse,
-            but are rather globally obtained. I.e. the convolved and derived
-            array is searched iteratively for a maximum and a minimum, and after
-            finding those the array entries within the 4 times
-            self.conv_std_dev (2*self.conv_std_dev to the left and
-            2*self.conv_std_dev) are set to zero.
+            but are rather globally obtained. I.e. all local maxima of the
+            convolved and derived array are sorted by height and taken from the
+            highest one down, skipping the ones within 2*conv_std_dev of an
+            already found flank, until there is one per laser pulse (and the
+            same for the minima). This is a single pass over the trace, instead
+            of one search of the whole trace per laser pulse.
 
             The crucial part is the knowledge of the number of laser pulses and
             the choice of the appropriate std_dev for the gauss filter.
@@ -149,111 +152,148 @@ class BasicPulseExtractor(PulseExtractorBase):
             return_dict['laser_counts_arr'] = np.zeros((number_of_lasers, 10), dtype='int64')
             return return_dict
 
-        # use a reference for array, because the exact position of the peaks or dips
+        # Find as many rising and falling flanks as there are laser pulses in the trace, the
+        # falling flanks are the maxima of the negative derivative
+        rising_ind = self._find_flanks(conv_deriv, number_of_lasers, conv_std_dev)
+        falling_ind = self._find_flanks(-conv_deriv, number_of_lasers, conv_std_dev)
+
+        # refine the flanks with a reference, because the exact position of the peaks or dips
         # (i.e. maxima or minima, which are the inflection points in the pulse) are distorted by
         # a large conv_std_dev value.
-        try:
-            conv = ndimage.filters.gaussian_filter1d(count_data.astype(float), 10)
-        except:
-            conv = np.zeros(count_data.size)
-        try:
-            conv_deriv_ref = np.gradient(conv)
-        except:
-            conv_deriv_ref = np.zeros(conv.size)
-
-        # initialize arrays to contain indices for all rising and falling
-        # flanks, respectively
-        rising_ind = np.empty(number_of_lasers, dtype='int64')
-        falling_ind = np.empty(number_of_lasers, dtype='int64')
-
-        # Find as many rising and falling flanks as there are laser pulses in
-        # the trace:
-        for i in range(number_of_lasers):
-            # save the index of the absolute maximum of the derived time trace
-            # as rising edge position
-            rising_ind[i] = np.argmax(conv_deriv)
-
-            # refine the rising edge detection, by using a small and fixed
-            # conv_std_dev parameter to find the inflection point more precise
-            start_ind = int(rising_ind[i] - conv_std_dev)
-            if start_ind < 0:
-                start_ind = 0
-
-            stop_ind = int(rising_ind[i] + conv_std_dev)
-            if stop_ind > len(conv_deriv):
-                stop_ind = len(conv_deriv)
-
-            if start_ind == stop_ind:
-                stop_ind = start_ind + 1
-
-            rising_ind[i] = start_ind + np.argmax(conv_deriv_ref[start_ind:stop_ind])
-
-            # set this position and the surrounding of the saved edge to 0 to
-            # avoid a second detection
-            if rising_ind[i] < 2 * conv_std_dev:
-                del_ind_start = 0
-            else:
-                del_ind_start = rising_ind[i] - int(2 * conv_std_dev)
-            if (conv_deriv.size - rising_ind[i]) < 2 * conv_std_dev:
-                del_ind_stop = conv_deriv.size - 1
-            else:
-                del_ind_stop = rising_ind[i] + int(2 * conv_std_dev)
-                conv_deriv[del_ind_start:del_ind_stop] = 0
-
-            # save the index of the absolute minimum of the derived time trace
-            # as falling edge position
-            falling_ind[i] = np.argmin(conv_deriv)
-
-            # refine the falling edge detection, by using a small and fixed
-            # conv_std_dev parameter to find the inflection point more precise
-            start_ind = int(falling_ind[i] - conv_std_dev)
-            if start_ind < 0:
-                start_ind = 0
-
-            stop_ind = int(falling_ind[i] + conv_std_dev)
-            if stop_ind > len(conv_deriv):
-                stop_ind = len(conv_deriv)
-
-            if start_ind == stop_ind:
-                stop_ind = start_ind + 1
-
-            falling_ind[i] = start_ind + np.argmin(conv_deriv_ref[start_ind:stop_ind])
-
-            # set this position and the sourrounding of the saved flank to 0 to
-            #  avoid a second detection
-            if falling_ind[i] < 2 * conv_std_dev:
-                del_ind_start = 0
-            else:
-                del_ind_start = falling_ind[i] - int(2 * conv_std_dev)
-            if (conv_deriv.size - falling_ind[i]) < 2 * conv_std_dev:
-                del_ind_stop = conv_deriv.size - 1
-            else:
-                del_ind_stop = falling_ind[i] + int(2 * conv_std_dev)
-            conv_deriv[del_ind_start:del_ind_stop] = 0
+        rising_ind = self._refine_flanks(count_data, rising_ind, conv_std_dev, 1)
+        falling_ind = self._refine_flanks(count_data, falling_ind, conv_std_dev, -1)
 
         # sort all indices of rising and falling flanks
         rising_ind.sort()
         falling_ind.sort()
 
         # find the maximum laser length to use as size for the laser array
-        laser_length = np.max(falling_ind - rising_ind)
-
-        # initialize the empty output array
-        laser_arr = np.zeros((number_of_lasers, laser_length), dtype='int64')
-        # slice the detected laser pulses of the timetrace and save them in the
-        # output array according to the found rising edge
-        for i in range(number_of_lasers):
-            if rising_ind[i] + laser_length > count_data.size:
-                lenarr = count_data[rising_ind[i]:].size
-                laser_arr[i, 0:lenarr] = count_data[rising_ind[i]:]
-            else:
-                laser_arr[i] = count_data[rising_ind[i]:rising_ind[i] + laser_length]
+        laser_length = max(int(np.max(falling_ind - rising_ind)), 0)
+
+        # slice the detected laser pulses of the timetrace according to the found rising edge
+        laser_arr = self._slice_pulses(count_data, rising_ind, laser_length)
 
         return_dict['laser_counts_arr'] = laser_arr.astype('int64')
         return_dict['laser_indices_rising'] = rising_ind
         return_dict['laser_indices_falling'] = falling_ind
         return return_dict
 
+    @staticmethod
+    def _find_flanks(conv_deriv, number_of_flanks, conv_std_dev):
+        """ Positions of the highest maxima of conv_deriv at least 2*conv_std_dev apart.
+
+        @param numpy.ndarray conv_deriv: derivative of the smoothed timetrace
+        @param int number_of_flanks: number of flanks to find
+        @param float conv_std_dev: standard deviation of the smoothing of conv_deriv
+
+        @return numpy.ndarray: int64 indices of the flanks, in the order of decreasing height
+        """
+        size = conv_deriv.size
+        # local maxima, a plateau counts once with its first index
+        candidates = np.nonzero((conv_deriv[1:-1] > conv_deriv[:-2])
+                                & (conv_deriv[1:-1] >= conv_deriv[2:]))[0] + 1
+        edges = [index for index, neighbour in ((0, 1), (size - 1, size - 2))
+                 if 0 <= neighbour < size and conv_deriv[index] > conv_deriv[neighbour]]
+        candidates = np.concatenate((candidates, np.array(edges, dtype=candidates.dtype)))
+        candidates = candidates[np.argsort(conv_deriv[candidates], kind='stable')[::-1]]
+
+        # take the highest maxima, skipping the ones close to an already found flank
+        exclusion = int(2 * conv_std_dev)
+        found = []
+        sorted_found = []
+        for candidate in candidates:
+            position = bisect.bisect_left(sorted_found, candidate)
+            if position > 0 and candidate - sorted_found[position - 1] < exclusion:
+                continue
+            if position < len(sorted_found) and sorted_found[position] - candidate <= exclusion:
+                continue
+            found.append(candidate)
+            sorted_found.insert(position, candidate)
+            if len(found) == number_of_flanks:
+                break
+        # not enough separate maxima, e.g. a trace without pulses: fill up with the next highest
+        remaining = [candidate for candidate in candidates[:number_of_flanks + len(found)]
+                     if candidate not in sorted_found]
+        found.extend(remaining[:number_of_flanks - len(found)])
+        found.extend([0] * (number_of_flanks - len(found)))
+        return np.array(found, dtype='int64')
+
+    @staticmethod
+    def _refine_flanks(count_data, flanks, conv_std_dev, sign, ref_std_dev=10):
+        """ Move every flank to the extremum of the derivative of the timetrace smoothed with the
+        small and fixed ref_std_dev, within conv_std_dev of the flank.
+
+        Only the windows around the flanks are smoothed, all at once as one 2D array. The windows
+        include the range of the gaussian filter, so the result is the same as for the smoothed
+        whole timetrace.
+
+        @param numpy.ndarray count_data: 1D timetrace
+        @param numpy.ndarray flanks: int64 indices of the flanks found in the strongly smoothed trace
+        @param float conv_std_dev: standard deviation of the strong smoothing
+        @param int sign: 1 for rising flanks (maxima), -1 for falling flanks (minima)
+        @param float ref_std_dev: standard deviation of the reference smoothing
+
+        @return numpy.ndarray: int64 refined indices of the flanks
+        """
+        size = count_data.size
+        start_ind = np.clip(np.trunc(flanks - conv_std_dev), 0, size).astype('int64')
+        stop_ind = np.clip(np.trunc(flanks + conv_std_dev), 0, size).astype('int64')
+        stop_ind = np.maximum(stop_ind, start_ind + 1)
+        width = int(np.max(stop_ind - start_ind))
+
+        # points needed on either side: the filter radius of gaussian_filter1d and 1 for np.gradient
+        margin = int(4 * ref_std_dev + 0.5) + 1
+        window_length = width + 2 * margin
+        if window_length >= size:
+            conv_deriv_ref = np.gradient(ndimage.filters.gaussian_filter1d(count_data.astype(float),
+                                                                           ref_std_dev))
+            windows_start = np.zeros(len(flanks), dtype='int64')
+            windows = conv_deriv_ref[np.newaxis, :]
+        else:
+            windows_start = np.clip(start_ind - margin, 0, size - window_length)
+            windows = count_data[windows_start[:, np.newaxis] + np.arange(window_length)]
+            windows = np.gradient(ndimage.filters.gaussian_filter1d(windows.astype(float),
+                                                                    ref_std_dev, axis=1),
+                                  axis=1)
+
+        offset = (start_ind - windows_start)[:, np.newaxis] + np.arange(width)
+        search = sign * windows[np.arange(len(flanks))[:, np.newaxis] if len(windows) > 1 else 0,
+                                np.minimum(offset, windows.shape[1] - 1)]
+        search[offset >= (stop_ind - windows_start)[:, np.newaxis]] = -np.inf
+        return start_ind + np.argmax(search, axis=1)
+
+    @staticmethod
+    def _slice_pulses(count_data, rising_ind, laser_length):
+        """ Cut the laser pulses of length laser_length starting at rising_ind out of the timetrace.
+
+        All pulses are taken at once from a strided view of the timetrace, which holds every window
+        of laser_length bins without copying. Pulses reaching beyond the end of the timetrace are
+        filled up with zeros.
+
+        @param numpy.ndarray count_data: 1D timetrace
+        @param numpy.ndarray rising_ind: start index of every pulse
+        @param int laser_length: number of bins per pulse
+
+        @return numpy.ndarray: 2D array, dimensions: 0: laser number, 1: time bin
+        """
+        laser_arr = np.zeros((len(rising_ind), laser_length), dtype=count_data.dtype)
+        if laser_length == 0 or laser_length > count_data.size:
+            for i, start in enumerate(rising_ind):
+                length = count_data[start:start + laser_length].size
+                laser_arr[i, :length] = count_data[start:start + laser_length]
+            return laser_arr
+        windows = np.lib.stride_tricks.as_strided(
+            count_data,
+            shape=(count_data.size - laser_length + 1, laser_length),
+            strides=(count_data.strides[0], count_data.strides[0]),
+            writeable=False)
+        complete = rising_ind + laser_length <= count_data.size
+        laser_arr[complete] = windows[rising_ind[complete]]
+        for i in np.nonzero(~complete)[0]:
+            length = count_data[rising_ind[i]:].size
+            laser_arr[i, :length] = count_data[rising_ind[i]:]
+        return laser_arr
+
     def ungated_threshold(self, count_data, count_threshold=10, min_laser_length=200e-9,
                           threshold_tolerance=20e-9):
         """
@@ -382,11 +422,8 @@ class BasicPulseExtractor(PulseExtractorBase):
         num_col = max_laser_length + 2 * safety_bins
         # compute from laser_start_indices and laser length the respective position of the laser
         # pulses
-        laser_pulses = np.empty((num_rows, num_col))
-        for ii in range(num_rows):
-            laser_pulses[ii][:] = count_data[
-                np.arange(laser_rising_bins[ii] + delay_bins - safety_bins,
-                          laser_rising_bins[ii] + delay_bins + safety_bins + max_laser_length)]
+        laser_pulses = count_data[(laser_rising_bins + delay_bins - safety_bins)[:, np.newaxis]
+                                  + np.arange(num_col)].astype(float)
         # use the gated extraction method
         return_dict = self.gated_conv_deriv(laser_pulses, conv_std_dev)
         return return_dict
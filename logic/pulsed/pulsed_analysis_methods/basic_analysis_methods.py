@@ -56,35 +56,22 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         norm_start_bin = round(norm_start / bin_width)
         norm_end_bin = round(norm_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum and mean of the data in the normalization window
-            tmp_data = laser_arr[norm_start_bin:norm_end_bin]
-            reference_sum = np.sum(tmp_data)
-            reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
-
-            # calculate the sum and mean of the data in the signal window
-            tmp_data = laser_arr[signal_start_bin:signal_end_bin]
-            signal_sum = np.sum(tmp_data)
-            signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        # sums and means of the data in the signal and normalization window of all laser pulses
+        (signal_sum, signal_bins), (reference_sum, reference_bins) = self._window_sums(
+            laser_data, (signal_start_bin, signal_end_bin), (norm_start_bin, norm_end_bin))
+        signal_mean = signal_sum / signal_bins if signal_bins != 0 else np.zeros(num_of_lasers)
+        reference_mean = reference_sum / reference_bins if reference_bins != 0 else np.zeros(num_of_lasers)
 
+        with np.errstate(divide='ignore', invalid='ignore'):
             # Calculate normalized signal while avoiding division by zero
-            if reference_mean > 0 and signal_mean >= 0:
-                signal_data[ii] = signal_mean / reference_mean
-            else:
-                signal_data[ii] = 0.0
-
-            # Calculate measurement error while avoiding division by zero
-            if reference_sum > 0 and signal_sum > 0:
-                # calculate with respect to gaussian error 'evolution'
-                error_data[ii] = signal_data[ii] * np.sqrt(1 / signal_sum + 1 / reference_sum)
-            else:
-                error_data[ii] = 0.0
-
+            signal_data = np.where((reference_mean > 0) & (signal_mean >= 0),
+                                   signal_mean / reference_mean,
+                                   0.0)
+            # Calculate measurement error with respect to gaussian error 'evolution' while
+            # avoiding division by zero
+            error_data = np.where((reference_sum > 0) & (signal_sum > 0),
+                                  signal_data * np.sqrt(1 / signal_sum + 1 / reference_sum),
+                                  0.0)
         return signal_data, error_data
 
     def analyse_sum(self, laser_data, signal_start=0.0, signal_end=200e-9):
@@ -106,24 +93,12 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         signal_start_bin = round(signal_start / bin_width)
         signal_end_bin = round(signal_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum of the data in the signal window
-            signal = laser_arr[signal_start_bin:signal_end_bin].sum()
-            signal_error = np.sqrt(signal)
-
-            # Avoid numpy C type variables overflow and NaN values
-            if signal < 0 or signal != signal:
-                signal_data[ii] = 0.0
-                error_data[ii] = 0.0
-            else:
-                signal_data[ii] = signal
-                error_data[ii] = signal_error
+        # sum of the data in the signal window of all laser pulses
+        (signal_sum, _), = self._window_sums(laser_data, (signal_start_bin, signal_end_bin))
 
+        # Avoid numpy C type variables overflow and NaN values
+        signal_data = np.where(signal_sum >= 0, signal_sum, 0.0)
+        error_data = np.sqrt(signal_data)
         return signal_data, error_data
 
     def analyse_mean(self, laser_data, signal_start=0.0, signal_end=200e-9):
@@ -146,25 +121,17 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         signal_start_bin = round(signal_start / bin_width)
         signal_end_bin = round(signal_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
-
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the mean of the data in the signal window
-            signal = laser_arr[signal_start_bin:signal_end_bin].mean()
-            signal_sum = laser_arr[signal_start_bin:signal_end_bin].sum()
-            signal_error = np.sqrt(signal_sum) / (signal_end_bin - signal_start_bin)
-
-            # Avoid numpy C type variables overflow and NaN values
-            if signal < 0 or signal != signal:
-                signal_data[ii] = 0.0
-                error_data[ii] = 0.0
-            else:
-                signal_data[ii] = signal
-                error_data[ii] = signal_error
+        # sum and mean of the data in the signal window of all laser pulses
+        (signal_sum, signal_bins), = self._window_sums(laser_data, (signal_start_bin, signal_end_bin))
+        if signal_bins == 0:
+            # the mean of an empty window is not defined
+            return np.zeros(num_of_lasers), np.zeros(num_of_lasers)
+        signal = signal_sum / signal_bins
 
+        # Avoid numpy C type variables overflow and NaN values
+        valid = signal >= 0
+        signal_data = np.where(valid, signal, 0.0)
+        error_data = np.sqrt(np.where(valid, signal_sum, 0.0)) / (signal_end_bin - signal_start_bin)
         return signal_data, error_data
 
     def analyse_pass_through(self, laser_data):
@@ -214,25 +181,55 @@ class BasicPulseAnalyzer(PulseAnalyzerBase):
         norm_start_bin = round(norm_start / bin_width)
         norm_end_bin = round(norm_end / bin_width)
 
-        # initialize data arrays for signal and measurement error
-        signal_data = np.empty(num_of_lasers, dtype=float)
-        error_data = np.empty(num_of_lasers, dtype=float)
+        # sums and means of the data in the signal and background window of all laser pulses
+        (signal_sum, signal_bins), (reference_sum, reference_bins) = self._window_sums(
+            laser_data, (signal_start_bin, signal_end_bin), (norm_start_bin, norm_end_bin))
+        signal_mean = signal_sum / signal_bins if signal_bins != 0 else np.zeros(num_of_lasers)
+        reference_mean = reference_sum / reference_bins if reference_bins != 0 else np.zeros(num_of_lasers)
 
-        # loop over all laser pulses and analyze them
-        for ii, laser_arr in enumerate(laser_data):
-            # calculate the sum and mean of the data in the normalization window
-            tmp_data = laser_arr[norm_start_bin:norm_end_bin]
-            reference_sum = np.sum(tmp_data)
-            reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        signal_data = signal_mean - reference_mean
 
-            # calculate the sum and mean of the data in the signal window
-            tmp_data = laser_arr[signal_start_bin:signal_end_bin]
-            signal_sum = np.sum(tmp_data)
-            signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        # calculate with respect to gaussian error 'evolution'
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error_data = signal_data * np.sqrt(1 / np.abs(signal_sum) + 1 / np.abs(reference_sum))
+        return signal_data, error_data
 
-            signal_data[ii] = signal_mean - reference_mean
+    @staticmethod
+    def _window_sums(laser_data, *windows):
+        """
+        Sums of the data of all laser pulses in windows of time bins. The windows are integrated
+        with one cumulative sum along the time axis of the whole array (only over the bins spanned
+        by the windows), the sum of a window is the difference of the cumulative sum at its ends.
+        Start and end bin of a window follow the python slicing rules, i.e. the window of a laser
+        pulse is laser_arr[start_bin:end_bin].
 
-            # calculate with respect to gaussian error 'evolution'
-            error_data[ii] = signal_data[ii] * np.sqrt(1 / abs(signal_sum) + 1 / abs(reference_sum))
+        @param 2D numpy.ndarray laser_data: the laser pulses, dim 0: laser number; dim 1: time bin
+        @param tuple windows: (start_bin, end_bin) of every window
 
-        return signal_data, error_data
+        @return list: (numpy.ndarray, int) for every window: the sum of the window for every laser
+                      pulse and the number of bins in the window
+        """
+        num_of_bins = laser_data.shape[1]
+        bounds = list()
+        for start_bin, end_bin in windows:
+            start_bin, end_bin, _ = slice(start_bin, end_bin).indices(num_of_bins)
+            bounds.append((start_bin, max(end_bin, start_bin)))
+
+        spanned = [(start_bin, end_bin) for start_bin, end_bin in bounds if end_bin > start_bin]
+        if len(spanned) == 0:
+            empty = np.sum(laser_data[:, :0], axis=1)
+            return [(empty, 0) for _ in bounds]
+        first_bin = min(start_bin for start_bin, _ in spanned)
+        last_bin = max(end_bin for _, end_bin in spanned)
+        cumulative = np.cumsum(laser_data[:, first_bin:last_bin], axis=1)
+
+        sums = list()
+        for start_bin, end_bin in bounds:
+            if end_bin == start_bin:
+                window_sum = np.zeros(laser_data.shape[0], dtype=cumulative.dtype)
+            elif start_bin == first_bin:
+                window_sum = cumulative[:, end_bin - first_bin - 1].copy()
+            else:
+                window_sum = cumulative[:, end_bin - first_bin - 1] - cumulative[:, start_bin - first_bin - 1]
+            sums.append((window_sum, end_bin - start_bin))
+        return sums
@@ -57,6 +57,14 @@ class PulsedMeasurementLogic(GenericLogic):
     analysis_import_path = ConfigOption(name='additional_analysis_path', default=None)
     # Optional file type descriptor for saving raw data to file
     _raw_data_save_type = ConfigOption(name='raw_data_save_type', default='text')
+    # Incremental analysis: skip the analysis if the raw data did not change and take the laser
+    # pulses at the cached positions once the extraction found the same positions (within
+    # <extraction_tolerance> bins) <extraction_stable_runs> times in a row. Every
+    # <extraction_check_interval>th run extracts from scratch again to follow drifting pulses.
+    _incremental_analysis = ConfigOption(name='incremental_analysis', default=False)
+    _extraction_stable_runs = ConfigOption(name='extraction_stable_runs', default=3)
+    _extraction_tolerance = ConfigOption(name='extraction_tolerance', default=2)
+    _extraction_check_interval = ConfigOption(name='extraction_check_interval', default=20)
 
     # status variables
     # ext. microwave settings
@@ -71,6 +79,8 @@ class PulsedMeasurementLogic(GenericLogic):
 
     # measurement timer settings
     __timer_interval = StatusVar(default=5)
+    # minimum interval between the plot updates in s, 0 to update after every analysis run
+    __display_interval = StatusVar(default=0)
 
     # Pulsed measurement settings
     _invoke_settings_from_sequence = StatusVar(default=False)
@@ -113,6 +123,9 @@ class PulsedMeasurementLogic(GenericLogic):
     sigStartTimer = QtCore.Signal()
     sigStopTimer = QtCore.Signal()
 
+    # stages of an analysis run, see analysis_timings
+    _analysis_stages = ('fetch', 'netobtain', 'extract', 'analyse', 'alt_data')
+
     def __init__(self, config, **kwargs):
         super().__init__(config=config, **kwargs)
 
@@ -127,6 +140,23 @@ class PulsedMeasurementLogic(GenericLogic):
         self.__elapsed_time = 0
         self.__elapsed_sweeps = 0
 
+        # plot updates, at most one per display interval
+        self.__last_display_time = -np.inf
+        self.__display_pending = False
+
+        # incremental analysis: laser pulse positions found by the last extraction, number of
+        # extractions in a row which found them and the cached indices of the laser pulses
+        self.__pulse_positions = None
+        self.__stable_extractions = 0
+        self.__cached_pulse_indices = None
+        self.__cached_extractions = 0
+        self.__analysis_outdated = True
+
+        # duration of the stages of the last analysis run in s and the sums over the measurement
+        self._analysis_timings = OrderedDict((stage, 0.) for stage in self._analysis_stages)
+        self.__analysis_timing_totals = OrderedDict((stage, 0.) for stage in self._analysis_stages)
+        self.__analysis_runs = 0
+
         # threading
         self._threadlock = Mutex()
 
@@ -584,6 +614,26 @@ class PulsedMeasurementLogic(GenericLogic):
             self.set_timer_interval(value)
         return
 
+    @property
+    def display_interval(self):
+        return float(self.__display_interval)
+
+    @display_interval.setter
+    def display_interval(self, value):
+        if isinstance(value, (int, float)):
+            self.set_display_interval(value)
+        return
+
+    @property
+    def analysis_timings(self):
+        """
+        Duration of the stages of the last analysis run in s: fetching the data trace from the fast
+        counter, netobtain, pulse extraction, analysis and computation of the alternative data.
+
+        @return OrderedDict: stage name: duration in s
+        """
+        return self._analysis_timings.copy()
+
     @property
     def alternative_data_type(self):
         return str(self._alternative_data_type)
@@ -649,6 +699,7 @@ class PulsedMeasurementLogic(GenericLogic):
         # Use threadlock to update settings during a running measurement
         with self._threadlock:
             self._pulseanalyzer.analysis_settings = settings_dict
+            self.__analysis_outdated = True
             self.sigAnalysisSettingsUpdated.emit(self.analysis_settings)
         return
 
@@ -674,6 +725,7 @@ class PulsedMeasurementLogic(GenericLogic):
         # Use threadlock to update settings during a running measurement
         with self._threadlock:
             self._pulseextractor.extraction_settings = settings_dict
+            self._reset_extraction_cache()
             self.sigExtractionSettingsUpdated.emit(self.extraction_settings)
         return
 
@@ -818,7 +870,7 @@ class PulsedMeasurementLogic(GenericLogic):
         """
         # Get raw data and analyze it a last time just before stopping the measurement.
         try:
-            self._pulsed_analysis_loop()
+            self._pulsed_analysis_loop(force_update=True)
         except:
             pass
 
@@ -844,6 +896,8 @@ class PulsedMeasurementLogic(GenericLogic):
                 # Set measurement paused flag
                 self.__is_paused = False
 
+                self._log_analysis_timings()
+
                 self.module_state.unlock()
                 self.sigMeasurementStatusUpdated.emit(False, False)
         return
@@ -935,6 +989,20 @@ class PulsedMeasurementLogic(GenericLogic):
                                       self.__timer_interval)
         return
 
+    @QtCore.Slot(float)
+    @QtCore.Slot(int)
+    def set_display_interval(self, interval):
+        """
+        Change the minimum interval between two plot updates. The data is still analysed every
+        timer interval, the plots (sigMeasurementDataUpdated and sigTimerUpdated) are only updated
+        if the last update is at least this interval ago.
+
+        @param int|float interval: Interval in s, 0 to update the plots after every analysis run
+        """
+        with self._threadlock:
+            self.__display_interval = max(interval, 0)
+        return
+
     @QtCore.Slot(str)
     def set_alternative_data_type(self, alt_data_type):
         """
@@ -965,7 +1033,7 @@ class PulsedMeasurementLogic(GenericLogic):
         """ Analyse and display the data
         """
         if self.module_state() == 'locked':
-            self._pulsed_analysis_loop()
+            self._pulsed_analysis_loop(force_update=True)
         return
 
     @QtCore.Slot(str)
@@ -1097,66 +1165,227 @@ class PulsedMeasurementLogic(GenericLogic):
                                                                         self.__fast_counter_gates))
         return
 
-    def _pulsed_analysis_loop(self):
+    def _pulsed_analysis_loop(self, force_update=False):
         """ Acquires laser pulses from fast counter,
             calculates fluorescence signal and creates plots.
+
+        @param bool force_update: update the plots even if the display interval has not passed yet
         """
         with self._threadlock:
             if self.module_state() == 'locked':
-                # Update elapsed time
-
-                self._extract_laser_pulses()
-
-                tmp_signal, tmp_error = self._analyze_laser_pulses()
+                for stage in self._analysis_timings:
+                    self._analysis_timings[stage] = 0.
 
-                # exclude laser pulses to ignore
-                if len(self._laser_ignore_list) > 0:
-                    # Convert relative negative indices into absolute positive indices
-                    while self._laser_ignore_list[0] < 0:
-                        neg_index = self._laser_ignore_list[0]
-                        self._laser_ignore_list[0] = len(tmp_signal) + neg_index
-                        self._laser_ignore_list.sort()
-
-                    tmp_signal = np.delete(tmp_signal, self._laser_ignore_list)
-                    tmp_error = np.delete(tmp_error, self._laser_ignore_list)
+                # Update elapsed time
+                if self._extract_laser_pulses():
+                    self.__display_pending = True
+                    self._analyse_signal()
+                self._add_analysis_timings()
+
+            # emit signals, at most once per display interval
+            now = time.perf_counter()
+            if force_update or now - self.__last_display_time >= self.__display_interval:
+                self.__last_display_time = now
+                self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
+                                          self.__timer_interval)
+                if self.__display_pending or force_update or self.module_state() != 'locked':
+                    self.__display_pending = False
+                    self.sigMeasurementDataUpdated.emit()
+            return
 
-                # order data according to alternating flag
-                if self._alternating:
-                    if len(self.signal_data[0]) != len(tmp_signal[::2]):
-                        self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
-                                       'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal[::2])))
-                        return
-                    self.signal_data[1] = tmp_signal[::2]
-                    self.signal_data[2] = tmp_signal[1::2]
-                    self.measurement_error[1] = tmp_error[::2]
-                    self.measurement_error[2] = tmp_error[1::2]
-                else:
-                    if len(self.signal_data[0]) != len(tmp_signal):
-                        self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
-                                       'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal)))
-                        return
-                    self.signal_data[1] = tmp_signal
-                    self.measurement_error[1] = tmp_error
+    def _analyse_signal(self):
+        """ Analyses the extracted laser pulses and sorts the result into the signal data array.
+        """
+        start_time = time.perf_counter()
+        tmp_signal, tmp_error = self._analyze_laser_pulses()
+
+        # exclude laser pulses to ignore
+        if len(self._laser_ignore_list) > 0:
+            # Convert relative negative indices into absolute positive indices
+            while self._laser_ignore_list[0] < 0:
+                neg_index = self._laser_ignore_list[0]
+                self._laser_ignore_list[0] = len(tmp_signal) + neg_index
+                self._laser_ignore_list.sort()
+
+            tmp_signal = np.delete(tmp_signal, self._laser_ignore_list)
+            tmp_error = np.delete(tmp_error, self._laser_ignore_list)
+
+        # order data according to alternating flag
+        if self._alternating:
+            if len(self.signal_data[0]) != len(tmp_signal[::2]):
+                self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
+                               'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal[::2])))
+                return
+            self.signal_data[1] = tmp_signal[::2]
+            self.signal_data[2] = tmp_signal[1::2]
+            self.measurement_error[1] = tmp_error[::2]
+            self.measurement_error[2] = tmp_error[1::2]
+        else:
+            if len(self.signal_data[0]) != len(tmp_signal):
+                self.log.error('Length of controlled variable ({0}) does not match length of number of readout '
+                               'pulses ({1}).'.format(len(self.signal_data[0]), len(tmp_signal)))
+                return
+            self.signal_data[1] = tmp_signal
+            self.measurement_error[1] = tmp_error
+        self._analysis_timings['analyse'] = time.perf_counter() - start_time
+
+        # Compute alternative data array from signal
+        start_time = time.perf_counter()
+        self._compute_alt_data()
+        self._analysis_timings['alt_data'] = time.perf_counter() - start_time
+        return
 
-                # Compute alternative data array from signal
-                self._compute_alt_data()
+    def _extract_laser_pulses(self):
+        """ Gets the raw data from the fast counter and extracts the laser pulses.
 
-            # emit signals
-            self.sigTimerUpdated.emit(self.__elapsed_time, self.__elapsed_sweeps,
-                                      self.__timer_interval)
-            self.sigMeasurementDataUpdated.emit()
-            return
+        In incremental analysis the extraction is skipped if the raw data did not change since the
+        last run, and the laser pulses are taken at the cached positions if they are stable.
 
-    def _extract_laser_pulses(self):
+        @return bool: True if new laser pulses were extracted, False if the raw data did not change
+        """
         # Get counter raw data (including recalled raw data from previous measurement)
         fc_data, info_dict = self._get_raw_data()
-        self.raw_data = fc_data
         self.__elapsed_sweeps = info_dict['elapsed_sweeps']
         self.__elapsed_time = info_dict['elapsed_time']
 
+        start_time = time.perf_counter()
+        if self._incremental_analysis and not self.__analysis_outdated and np.array_equal(fc_data, self.raw_data):
+            self.raw_data = fc_data
+            self._analysis_timings['extract'] = time.perf_counter() - start_time
+            return False
+        self.raw_data = fc_data
+        self.__analysis_outdated = False
+
         # extract laser pulses from raw data
-        return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
-        self.laser_data = return_dict['laser_counts_arr']
+        self.__cached_extractions += 1
+        if self.__cached_pulse_indices is not None and self.__cached_extractions < self._extraction_check_interval:
+            self.laser_data = self._take_laser_pulses(self.raw_data, self.__cached_pulse_indices)
+        else:
+            return_dict = self._pulseextractor.extract_laser_pulses(self.raw_data)
+            self.laser_data = return_dict['laser_counts_arr']
+            if self._incremental_analysis:
+                self._update_extraction_cache(return_dict)
+        self._analysis_timings['extract'] = time.perf_counter() - start_time
+        return True
+
+    def _update_extraction_cache(self, return_dict):
+        """ Compares the laser pulse positions found by the extraction with the previous ones and
+        caches the indices of the laser pulses once they were found <extraction_stable_runs> times
+        in a row. Positions (and laser pulse lengths) differing by at most <extraction_tolerance>
+        bins count as the same, the flanks of noisy traces jitter by a few bins.
+
+        Nothing is cached for extraction methods which do not return the laser pulse positions.
+        The indices are only cached if they reproduce the extracted laser pulses, i.e. for
+        extraction methods cutting pulses of equal length starting at the rising flanks (out of a
+        1D trace) or one window of bins (out of all gates of a 2D trace).
+
+        @param dict return_dict: result of the pulse extraction
+        """
+        rising_ind = return_dict.get('laser_indices_rising')
+        falling_ind = return_dict.get('laser_indices_falling')
+        if rising_ind is None or falling_ind is None:
+            # The extraction method does not report the pulse positions, nothing can be cached
+            self.__pulse_positions = None
+            self.__stable_extractions = 0
+            self.__cached_pulse_indices = None
+            self.__cached_extractions = 0
+            return
+        rising_ind = np.asarray(rising_ind)
+        falling_ind = np.asarray(falling_ind)
+        positions = (rising_ind, falling_ind, self.laser_data.shape)
+
+        previous = self.__pulse_positions
+        if previous is not None and self._same_pulse_positions(previous, positions):
+            self.__stable_extractions += 1
+        else:
+            self.__stable_extractions = 1
+        self.__pulse_positions = positions
+        self.__cached_pulse_indices = None
+        self.__cached_extractions = 0
+
+        if self.__stable_extractions < self._extraction_stable_runs or not self.laser_data.any():
+            return
+        indices = self._get_laser_pulse_indices(self.raw_data, rising_ind, self.laser_data.shape)
+        if indices is not None and np.array_equal(self._take_laser_pulses(self.raw_data, indices), self.laser_data):
+            self.__cached_pulse_indices = indices
+        return
+
+    def _same_pulse_positions(self, previous, positions):
+        """ Whether two extractions found the same laser pulses within the extraction tolerance.
+
+        @param tuple previous: rising flanks, falling flanks and shape of the laser pulse array
+        @param tuple positions: the same for the current extraction
+        """
+        tolerance = self._extraction_tolerance
+        if previous[2][0] != positions[2][0] or abs(previous[2][1] - positions[2][1]) > tolerance:
+            return False
+        for previous_ind, ind in zip(previous[:2], positions[:2]):
+            if previous_ind.shape != ind.shape or np.any(np.abs(previous_ind - ind) > tolerance):
+                return False
+        return True
+
+    def _reset_extraction_cache(self):
+        """ Forgets the laser pulse positions, the next run extracts and analyses from scratch.
+        """
+        self.__pulse_positions = None
+        self.__stable_extractions = 0
+        self.__cached_pulse_indices = None
+        self.__cached_extractions = 0
+        self.__analysis_outdated = True
+        return
+
+    @staticmethod
+    def _get_laser_pulse_indices(count_data, rising_ind, laser_shape):
+        """ Indices of the laser pulses of the given shape starting at the rising flanks.
+
+        @param numpy.ndarray count_data: raw data, 1D (ungated) or 2D (gated)
+        @param numpy.ndarray rising_ind: rising flank of every laser pulse (1D data) or of all
+                                         gates (2D data)
+        @param tuple laser_shape: shape of the laser pulse array
+
+        @return: slice of the time bins (2D data) or tuple of the flat indices into the trace and
+                 the mask of the bins beyond its end (1D data), None if not applicable
+        """
+        number_of_lasers, laser_length = laser_shape
+        if count_data.ndim == 2:
+            if rising_ind.ndim != 0 or number_of_lasers != count_data.shape[0] \
+                    or rising_ind + laser_length > count_data.shape[1]:
+                return None
+            return slice(int(rising_ind), int(rising_ind) + laser_length)
+        if count_data.ndim != 1 or rising_ind.ndim != 1 or len(rising_ind) != number_of_lasers \
+                or count_data.size == 0:
+            return None
+        bins = rising_ind.astype('int64')[:, np.newaxis] + np.arange(laser_length)
+        beyond_end = bins >= count_data.size
+        return np.minimum(bins, count_data.size - 1), beyond_end if beyond_end.any() else None
+
+    @staticmethod
+    def _take_laser_pulses(count_data, indices):
+        """ Cuts the laser pulses at the indices of _get_laser_pulse_indices out of the raw data.
+
+        @return numpy.ndarray: laser pulses, dim 0: laser number; dim 1: time bin
+        """
+        if isinstance(indices, slice):
+            return count_data[:, indices]
+        bins, beyond_end = indices
+        laser_data = count_data[bins]
+        if beyond_end is not None:
+            laser_data[beyond_end] = 0
+        return laser_data
+
+    def _add_analysis_timings(self):
+        self.__analysis_runs += 1
+        for stage, duration in self._analysis_timings.items():
+            self.__analysis_timing_totals[stage] += duration
+        return
+
+    def _log_analysis_timings(self):
+        if self.__analysis_runs == 0:
+            return
+        self.log.info('Pulsed analysis, mean of {0:d} runs: {1}'.format(
+            self.__analysis_runs,
+            ', '.join('{0} {1:.1f} ms'.format(stage, 1e3 * total / self.__analysis_runs)
+                      for stage, total in self.__analysis_timing_totals.items())))
         return
 
     def _analyze_laser_pulses(self):
@@ -1178,12 +1407,16 @@ class PulsedMeasurementLogic(GenericLogic):
                                                  info_dict with keys 'elapsed_sweeps' and 'elapsed_time'
         """
         # get raw data from fast counter
+        start_time = time.perf_counter()
         fc_data = self.fastcounter().get_data_trace()
         if type(fc_data) == tuple and len(fc_data) == 2:  # if the hardware implement the new version of the interface
             fc_data, info_dict = fc_data
         else:
             info_dict = {'elapsed_sweeps': None, 'elapsed_time': None}
+        self._analysis_timings['fetch'] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
         fc_data = netobtain(fc_data)
+        self._analysis_timings['netobtain'] = time.perf_counter() - start_time
 
         if isinstance(info_dict, dict) and info_dict.get('elapsed_sweeps') is not None:
             elapsed_sweeps = info_dict['elapsed_sweeps']
@@ -1242,6 +1475,13 @@ class PulsedMeasurementLogic(GenericLogic):
         else:
             self.raw_data = np.zeros(number_of_bins, dtype='int64')
 
+        # start the incremental analysis and the timing statistics from scratch
+        self._reset_extraction_cache()
+        self.__analysis_runs = 0
+        for stage in self.__analysis_timing_totals:
+            self.__analysis_timing_totals[stage] = 0.
+        self.__last_display_time = -np.inf
+
         self.sigMeasurementDataUpdated.emit()
         return
 
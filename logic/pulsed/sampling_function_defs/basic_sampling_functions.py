@@ -29,6 +29,8 @@ class Idle(SamplingBase):
     """
     Object representing an idle element (zero voltage)
     """
+    time_invariant = True
+
     def __init__(self):
         pass
 
@@ -44,6 +46,7 @@ class DC(SamplingBase):
     """
     params = OrderedDict()
     params['voltage'] = {'unit': 'V', 'init': 0.0, 'min': -np.inf, 'max': +np.inf, 'type': float}
+    time_invariant = True
 
     def __init__(self, voltage=None):
         if voltage is None:
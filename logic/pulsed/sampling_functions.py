@@ -26,6 +26,7 @@ import sys
 import inspect
 import copy
 import logging
+import numpy as np
 from collections import OrderedDict
 
 
@@ -35,6 +36,9 @@ class SamplingBase:
     """
     params = OrderedDict()
     log = logging.getLogger(__name__)
+    # True if the samples only depend on the number of samples and not on the time (e.g. constant
+    # voltages), so that SampleCache can reuse them at any position in a waveform.
+    time_invariant = False
 
     def __repr__(self):
         kwargs = []
@@ -76,6 +80,79 @@ class SamplingBase:
         return dict_repr
 
 
+class SampleCache:
+    """
+    Least recently used cache of sampled chunks of sampling functions, so that elements which occur
+    several times in a waveform (e.g. in every repetition of a block) or in several waveforms are
+    only sampled once.
+
+    A chunk is identified by the sampling function (class and parameters), the number of samples,
+    the sample rate, the scaling to the analog level and the time offset of the first sample. The
+    time offset is ignored for time invariant sampling functions (e.g. Idle, DC). The chunks are
+    kept as read-only float32 arrays, i.e. the samples as written to the device.
+
+    @param int max_bytes: memory of all cached chunks in bytes, 0 disables the caching
+    """
+    def __init__(self, max_bytes=0):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._chunks = OrderedDict()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def get_samples(self, function, offset_bin, number_of_samples, sample_rate, scale):
+        """
+        Samples of a sampling function for the time bins offset_bin ... offset_bin +
+        number_of_samples - 1, divided by scale. Taken from the cache if already sampled before.
+
+        @param SamplingBase function: the sampling function
+        @param int offset_bin: time bin of the first sample
+        @param int number_of_samples: number of samples
+        @param float sample_rate: sample rate in samples/s
+        @param float scale: the samples are divided by this value (e.g. half the pp-amplitude)
+
+        @return numpy.ndarray: the samples (float32), read-only
+        """
+        try:
+            key = (type(function),
+                   tuple(getattr(function, param) for param in function.params),
+                   None if function.time_invariant else offset_bin,
+                   number_of_samples,
+                   sample_rate,
+                   scale)
+            chunk = self._chunks.get(key)
+        except TypeError:
+            # unhashable parameters
+            key = chunk = None
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            self.hits += 1
+            return chunk
+
+        self.misses += 1
+        time_arr = (offset_bin + np.arange(number_of_samples, dtype='float64')) / sample_rate
+        chunk = np.empty(number_of_samples, dtype='float32')
+        chunk[:] = function.get_samples(time_arr) / scale
+        chunk.flags.writeable = False
+        if key is not None and 0 < chunk.nbytes <= self.max_bytes:
+            self._chunks[key] = chunk
+            self.nbytes += chunk.nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._chunks.popitem(last=False)[1].nbytes
+        return chunk
+
+    def clear(self):
+        """ Drop all cached chunks and reset the hit and miss counters. """
+        self._chunks.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        return
+
+
 class SamplingFunctions:
     """
 
@@ -38,7 +38,7 @@ from core.util.network import netobtain
 from logic.generic_logic import GenericLogic
 from logic.pulsed.pulse_objects import PulseBlock, PulseBlockEnsemble, PulseSequence
 from logic.pulsed.pulse_objects import PulseObjectGenerator, PulseBlockElement
-from logic.pulsed.sampling_functions import SamplingFunctions
+from logic.pulsed.sampling_functions import SamplingFunctions, SampleCache
 from interface.pulser_interface import SequenceOption
 
 
@@ -65,6 +65,8 @@ class SequenceGeneratorLogic(GenericLogic):
                                        default=os.path.join(get_home_dir(), 'saved_pulsed_assets'),
                                        missing='warn')
     _overhead_bytes = ConfigOption(name='overhead_bytes', default=0, missing='nothing')
+    # Memory for analog samples of repeated elements, reused during sampling (0 to disable)
+    _sample_cache_bytes = ConfigOption(name='sample_cache_bytes', default=256 * 1024 ** 2, missing='nothing')
     # Optional additional paths to import from
     _additional_methods_import_path = ConfigOption(name='additional_predefined_methods_path',
                                                    default=None,
@@ -130,6 +132,9 @@ class SequenceGeneratorLogic(GenericLogic):
         # A flag indicating if sampling of a sequence is in progress
         self.__sequence_generation_in_progress = False
 
+        # Cache of sampled analog chunks, reused across repetitions and ensembles
+        self._sample_cache = None
+
         # Get instance of PulseObjectGenerator which takes care of collecting all predefined methods
         self._pog = None
 
@@ -183,6 +188,7 @@ class SequenceGeneratorLogic(GenericLogic):
                 self.log.error('ConfigOption additional_sampling_functions_path needs to either be a string or '
                                'a list of strings.')
         SamplingFunctions.import_sampling_functions(sf_path_list)
+        self._sample_cache = SampleCache(self._sample_cache_bytes)
 
         # Read back settings from device and update instance variables accordingly
         self._read_settings_from_device()
@@ -1779,6 +1785,9 @@ class SequenceGeneratorLogic(GenericLogic):
         element_count = 0
         # set of written waveform names on the device
         written_waveforms = set()
+        # time spent in sampling the analog channels and number of cache hits for the report
+        sampling_time = 0
+        cache_hits, cache_misses = self._sample_cache.hits, self._sample_cache.misses
         # Iterate over all blocks within the PulseBlockEnsemble object
         for block_name, reps in ensemble.block_list:
             block = self.get_block(block_name)
@@ -1796,24 +1805,23 @@ class SequenceGeneratorLogic(GenericLogic):
                     while element_samples_written != element_length_bins:
                         samples_to_add = min(array_length - array_write_index,
                                              element_length_bins - element_samples_written)
-                        # create floating point time array for the current element inside rotating
-                        # frame if analog samples are to be calculated.
-                        if pulse_function:
-                            time_arr = (offset_bin + np.arange(
-                                samples_to_add, dtype='float64')) / self.__sample_rate
 
                         # Calculate respective part of the sample arrays
                         for chnl in digital_high:
                             digital_samples[chnl][array_write_index:array_write_index + samples_to_add] = digital_high[
                                 chnl]
+                        # The analog samples are calculated for the time bins of the current element
+                        # inside the rotating frame, or taken from the cache if this chunk has been
+                        # sampled before (e.g. in a previous repetition).
+                        sampling_start = time.perf_counter()
                         for chnl in pulse_function:
-                            analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = pulse_function[
-                                                                                                             chnl].get_samples(
-                                time_arr) / (self.__analog_levels[0][chnl] / 2)
-
-                        # Free memory
-                        if pulse_function:
-                            del time_arr
+                            analog_samples[chnl][array_write_index:array_write_index + samples_to_add] = \
+                                self._sample_cache.get_samples(pulse_function[chnl],
+                                                               offset_bin,
+                                                               samples_to_add,
+                                                               self.__sample_rate,
+                                                               self.__analog_levels[0][chnl] / 2)
+                        sampling_time += time.perf_counter() - sampling_start
 
                         element_samples_written += samples_to_add
                         array_write_index += samples_to_add
@@ -1884,6 +1892,14 @@ class SequenceGeneratorLogic(GenericLogic):
 
         self.log.info('Time needed for sampling and writing PulseBlockEnsemble {0} to device: {1} sec'
                       ''.format(ensemble.name, int(np.rint(time.time() - start_time))))
+        cache_hits = self._sample_cache.hits - cache_hits
+        cache_misses = self._sample_cache.misses - cache_misses
+        if cache_hits + cache_misses > 0:
+            self.log.info('Sampling of the analog channels took {0:.3f} sec, {1:d} of {2:d} chunks '
+                          '({3:.0f} %) were taken from the sample cache ({4:d} chunks, {5:.1f} MB).'
+                          ''.format(sampling_time, cache_hits, cache_hits + cache_misses,
+                                    100 * cache_hits / (cache_hits + cache_misses), len(self._sample_cache),
+                                    self._sample_cache.nbytes / 1024 ** 2))
         if ensemble_info['number_of_samples'] == 0:
             self.log.warning('Empty waveform (0 samples) created from PulseBlockEnsemble "{0}".'
                              ''.format(ensemble.name))
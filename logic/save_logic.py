@@ -26,7 +26,9 @@ import logging
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import queue
 import sys
+import threading
 import time
 
 from collections import OrderedDict
@@ -38,8 +40,14 @@ from logic.generic_logic import GenericLogic
 from matplotlib.backends.backend_pdf import PdfPages
 from PIL import Image
 from PIL import PngImagePlugin
+from qtpy import QtCore
 import subprocess
 
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
 class DailyLogHandler(logging.FileHandler):
     """
     log handler which uses savelogic's get_daily_directory to log to a
@@ -129,6 +137,7 @@ class SaveLogic(GenericLogic):
         log_into_daily_directory: True
         save_pdf: True
         save_png: True
+        save_queue_size: 16     # number of jobs of save_data_async waiting before the callers wait
     """
 
     _win_data_dir = ConfigOption('win_data_directory', 'C:/Data/')
@@ -136,6 +145,11 @@ class SaveLogic(GenericLogic):
     log_into_daily_directory = ConfigOption('log_into_daily_directory', False, missing='warn')
     save_pdf = ConfigOption('save_pdf', False)
     save_png = ConfigOption('save_png', True)
+    save_queue_size = ConfigOption('save_queue_size', 16)
+
+    # Emitted by the background writer of save_data_async: job id, and error message if it failed
+    sigSaveFinished = QtCore.Signal(int)
+    sigSaveFailed = QtCore.Signal(int, str)
 
     # Matplotlib style definition for saving plots
     mpl_qd_style = {
@@ -217,7 +231,17 @@ class SaveLogic(GenericLogic):
         else:
             self._daily_loghandler = None
 
+        # Background writer for save_data_async
+        self._save_queue = queue.Queue(maxsize=self.save_queue_size)
+        self._save_job_counter = 0
+        self._save_thread = threading.Thread(target=self._save_worker, name='SaveLogicWriter',
+                                             daemon=True)
+        self._save_thread.start()
+
     def on_deactivate(self):
+        # Write all the queued data before the writer stops
+        self._save_queue.put(None)
+        self._save_thread.join()
         if self._daily_loghandler is not None:
             # removes the log handler logging into the daily directory
             logging.getLogger().removeHandler(self._daily_loghandler)
@@ -238,7 +262,8 @@ class SaveLogic(GenericLogic):
         self._daily_loghandler.setLevel(level)
 
     def save_data(self, data, filepath=None, parameters=None, filename=None, filelabel=None,
-                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None):
+                  timestamp=None, filetype='text', fmt='%.15e', delimiter='\t', plotfig=None,
+                  module_name=None):
         """
         General save routine for data.
 
@@ -284,7 +309,12 @@ class SaveLogic(GenericLogic):
                                    filename and a timestamp, because then the timestamp will be
                                    ignored.
         @param string filetype: optional, the file format the data should be saved in. Valid inputs
-                                are 'text', 'xml' and 'npz'. Default is 'text'.
+                                are 'text', 'npz' and 'hdf5'. Default is 'text'.
+                                'hdf5' (needs h5py) is a binary file with the ending of filename
+                                replaced by '.h5': every data item is a chunked dataset of any
+                                dimension that can be extended with append_data, the parameters
+                                (including the additional parameters) are stored as attributes.
+                                Load it with load_data.
         @param string or list of strings fmt: optional, format specifier for saved data. See python
                                               documentation for
                                               "Format Specification Mini-Language". If you want for
@@ -299,6 +329,9 @@ class SaveLogic(GenericLogic):
                                               behaviour or failure to save right away.
         @param string delimiter: optional, insert here the delimiter, like '\n' for new line, '\t'
                                  for tab, ',' for a comma ect.
+        @param string module_name: optional, name of the calling module, used for the header, the
+                                   default file path and file label. If not given, it is taken
+                                   from the call stack.
 
         1D data
         =======
@@ -312,6 +345,10 @@ class SaveLogic(GenericLogic):
 
             {'Frequency (MHz)':list1, 'signal':list2, 'correlations': list3, ...}
 
+        ND data
+        =======
+        Arrays with more than two dimensions can only be saved with filetype='hdf5'.
+
         2D data
         =======
         2D data should be passed in a dictionary where the matrix like data should be assigned to
@@ -354,7 +391,10 @@ class SaveLogic(GenericLogic):
                     return -1
 
             # determine dimensions
-            if data[keyname].ndim < 3:
+            if filetype == 'hdf5':
+                # any dimension is fine, every array is saved as it is
+                pass
+            elif data[keyname].ndim < 3:
                 length = data[keyname].shape[0]
                 arr_length.append(length)
                 if length > max_line_num:
@@ -378,23 +418,15 @@ class SaveLogic(GenericLogic):
             arr_dtype.append(data[keyname].dtype)
 
         # Raise error if data contains a mixture of 1D and 2D arrays
-        if found_2d and found_1d:
+        if found_2d and found_1d and filetype != 'hdf5':
             self.log.error('Passed data dictionary contains 1D AND 2D arrays. This is not allowed. '
                            'Either fit all data arrays into a single 2D array or pass multiple 1D '
                            'arrays only. Saving data failed!')
             return -1
 
         # try to trace back the functioncall to the class which was calling it.
-        try:
-            frm = inspect.stack()[1]
-            # this will get the object, which called the save_data function.
-            mod = inspect.getmodule(frm[0])
-            # that will extract the name of the class.
-            module_name = mod.__name__.split('.')[-1]
-        except:
-            # Sometimes it is not possible to get the object which called the save_data function
-            # (such as when calling this from the console).
-            module_name = 'UNSPECIFIED'
+        if module_name is None:
+            module_name = self._get_calling_module_name(inspect.currentframe().f_back)
 
         # determine proper file path
         if filepath is None:
@@ -413,6 +445,13 @@ class SaveLogic(GenericLogic):
         # determine proper unique filename to save if none has been passed
         if filename is None:
             filename = timestamp.strftime('%Y%m%d-%H%M-%S' + '_' + filelabel + '.dat')
+        if filetype == 'hdf5':
+            if h5py is None:
+                self.log.error('Saving as hdf5 file needs the package h5py, which is not installed. '
+                               'Saving as npz-file.')
+                filetype = 'npz'
+            else:
+                filename = os.path.splitext(filename)[0] + '.h5'
         if os.path.isfile(os.path.join(filepath, filename)):
             #subprocess.Popen(f'explorer {filepath}')
             self.log.warning('same name as an already existing file')
@@ -501,6 +540,14 @@ class SaveLogic(GenericLogic):
             self.save_array_as_text(data=[], filename=filename[:-4]+'_params.dat', filepath=filepath,
                                     fmt=fmt, header=header, delimiter=delimiter, comments='#',
                                     append=True)
+        # write hdf5 file with the parameters as attributes
+        elif filetype == 'hdf5':
+            if not isinstance(parameters, dict):
+                parameters = dict()
+            if self.active_poi_name != '':
+                parameters = {'Measured at POI': self.active_poi_name, **parameters}
+            self._save_hdf5(data=data, filename=filename, filepath=filepath, header=header,
+                            parameters=parameters, module_name=module_name, timestamp=timestamp)
         else:
             self.log.error('Only saving of data as textfile and npz-file is implemented. Filetype "{0}" is not '
                            'supported yet. Saving as textfile.'.format(filetype))
@@ -527,7 +574,7 @@ class SaveLogic(GenericLogic):
             
             if self.save_pdf:
                 # determine the PDF-Filename
-                fig_fname_vector = os.path.join(filepath, filename)[:-4] + '_fig.pdf'
+                fig_fname_vector = os.path.splitext(os.path.join(filepath, filename))[0] + '_fig.pdf'
 
                 # Create the PdfPages object to which we will save the pages:
                 # The with statement makes sure that the PdfPages object is closed properly at
@@ -542,7 +589,7 @@ class SaveLogic(GenericLogic):
 
             if self.save_png:
                 # determine the PNG-Filename and save the plain PNG
-                fig_fname_image = os.path.join(filepath, filename)[:-4] + '_fig.png'
+                fig_fname_image = os.path.splitext(os.path.join(filepath, filename))[0] + '_fig.png'
                 plotfig.savefig(fig_fname_image, bbox_inches='tight', pad_inches=0.05)
 
                 # Use Pillow (an fork for PIL) to attach metadata to the PNG
@@ -569,6 +616,97 @@ class SaveLogic(GenericLogic):
             self.log.debug('Time needed to save data: {0:.2f}s'.format(time.time()-start_time))
             #----------------------------------------------------------------------------------
 
+    def save_data_async(self, data, callback=None, block=True, **kwargs):
+        """
+        Hand the data over to a background thread, which saves it with save_data, and return
+        immediately. The jobs are saved one after the other in the order they were queued, so
+        several jobs can append to the same file.
+
+        The data dictionary, its arrays and plotfig belong to the writer after this call: do not
+        change them afterwards, pass copies of arrays that are still being filled.
+
+        @param dictionary data: see save_data
+        @param callable callback: optional, called in the writer thread as callback(job_id, error)
+                                  when the job is done. error is None on success, else a message.
+                                  The signals sigSaveFinished(job_id) and
+                                  sigSaveFailed(job_id, error) are emitted as well.
+        @param bool block: optional, what to do if save_queue_size jobs are already waiting. If
+                           True (default) wait until the writer has caught up, if False do not
+                           queue the job.
+        @param kwargs: optional, all the keyword arguments of save_data
+
+        @return int: id of the job, -1 if it was not queued
+        """
+        # The writer thread can not find out who called, so the caller is determined here
+        if kwargs.get('module_name') is None:
+            kwargs['module_name'] = self._get_calling_module_name(inspect.currentframe().f_back)
+        with self.lock:
+            job_id = self._save_job_counter
+            self._save_job_counter += 1
+        job = (job_id, data, kwargs, callback)
+        try:
+            self._save_queue.put_nowait(job)
+        except queue.Full:
+            if not block:
+                self.log.error('Save queue is full ({0} jobs), data of {1} not saved.'
+                               ''.format(self.save_queue_size, kwargs['module_name']))
+                return -1
+            self.log.warning('Save queue is full ({0} jobs), {1} waits for the writer.'
+                             ''.format(self.save_queue_size, kwargs['module_name']))
+            self._save_queue.put(job)
+        return job_id
+
+    @property
+    def pending_saves(self):
+        """ int: number of jobs of save_data_async that are queued or being saved. """
+        return self._save_queue.unfinished_tasks
+
+    def wait_for_saves(self):
+        """ Wait until all the jobs of save_data_async are saved. """
+        self._save_queue.join()
+        return
+
+    def _save_worker(self):
+        """ Save the queued jobs until the None job of on_deactivate arrives. """
+        while True:
+            job = self._save_queue.get()
+            try:
+                if job is None:
+                    return
+                job_id, data, kwargs, callback = job
+                error = None
+                try:
+                    if self.save_data(data, **kwargs) == -1:
+                        error = 'save_data failed, see the log for details.'
+                except Exception as e:
+                    self.log.exception('Saving data of {0} in the background failed:'
+                                       ''.format(kwargs['module_name']))
+                    error = '{0}: {1}'.format(type(e).__name__, e)
+                if error is None:
+                    self.sigSaveFinished.emit(job_id)
+                else:
+                    self.sigSaveFailed.emit(job_id, error)
+                if callback is not None:
+                    try:
+                        callback(job_id, error)
+                    except Exception:
+                        self.log.exception('Callback of save job {0} failed:'.format(job_id))
+            finally:
+                self._save_queue.task_done()
+
+    @staticmethod
+    def _get_calling_module_name(frame):
+        """ Name of the module the code of frame belongs to, 'UNSPECIFIED' if it is unknown. """
+        try:
+            # this will get the object, which called the save_data function.
+            mod = inspect.getmodule(frame)
+            # that will extract the name of the class.
+            return mod.__name__.split('.')[-1]
+        except:
+            # Sometimes it is not possible to get the object which called the save_data function
+            # (such as when calling this from the console).
+            return 'UNSPECIFIED'
+
     def save_array_as_text(self, data, filename, filepath='', fmt='%.15e', header='',
                            delimiter='\t', comments='#', append=False):
         """
@@ -586,6 +724,106 @@ class SaveLogic(GenericLogic):
                            comments=comments)
         return
 
+    def _save_hdf5(self, data, filename, filepath, header, parameters, module_name, timestamp):
+        """
+        Write the data dictionary into a new hdf5 file. Every data item is a dataset (data_0,
+        data_1, ...) chunked and extendable along its first axis, with the key of the item in its
+        attribute 'key'. The parameters are the attributes of the group 'parameters'.
+        """
+        with h5py.File(os.path.join(filepath, filename), 'w') as file:
+            file.attrs['header'] = header
+            file.attrs['module'] = module_name
+            file.attrs['timestamp'] = timestamp.isoformat()
+            parameter_group = file.create_group('parameters', track_order=True)
+            for entry, param in parameters.items():
+                parameter_group.attrs[entry] = self._to_hdf5_attribute(param)
+            for i, keyname in enumerate(data):
+                array = np.atleast_1d(data[keyname])
+                if array.dtype.kind == 'U':
+                    array = array.astype(h5py.string_dtype())
+                dataset = file.create_dataset('data_{0:d}'.format(i), data=array, chunks=True,
+                                              maxshape=(None,) + array.shape[1:])
+                dataset.attrs['key'] = keyname
+        return
+
+    @staticmethod
+    def _to_hdf5_attribute(value):
+        """ Keep numbers, strings and numeric arrays, everything else is saved as string. """
+        value = netobtain(value)
+        if isinstance(value, (str, bool, int, float, complex, np.number, np.bool_)):
+            return value
+        try:
+            array = np.asarray(value)
+            if array.dtype.kind in 'biufc':
+                return array
+        except ValueError:
+            pass
+        return str(value)
+
+    def append_data(self, data, filename, filepath=''):
+        """
+        Append data along the first axis of the datasets of an hdf5 file created by save_data with
+        filetype='hdf5', e.g. one sweep or one position of a scan at a time.
+
+        @param dictionary data: the same keys as given to save_data, the arrays must have the shape
+                                of the saved ones except for the first axis.
+        @param string filename: name of the hdf5 file
+        @param string filepath: optional, directory of the file
+
+        @return int: error code (0:OK, -1:error)
+        """
+        if h5py is None:
+            self.log.error('Appending to hdf5 file needs the package h5py, which is not installed.')
+            return -1
+        with h5py.File(os.path.join(filepath, filename), 'a') as file:
+            datasets = {dataset.attrs['key']: dataset for name, dataset in file.items()
+                        if name.startswith('data_')}
+            for keyname in data:
+                if keyname not in datasets:
+                    self.log.error('Data "{0}" is not in the file {1}. Appending data failed.'
+                                   ''.format(keyname, filename))
+                    return -1
+                array = np.atleast_1d(data[keyname])
+                dataset = datasets[keyname]
+                if array.shape[1:] != dataset.shape[1:]:
+                    self.log.error('Data "{0}" has shape {1}, but the saved data has shape {2}. '
+                                   'Appending data failed.'.format(keyname, array.shape,
+                                                                   dataset.shape))
+                    return -1
+                if array.dtype.kind == 'U':
+                    array = array.astype(h5py.string_dtype())
+                length = dataset.shape[0]
+                dataset.resize(length + array.shape[0], axis=0)
+                dataset[length:] = array
+        return 0
+
+    def load_data(self, filename, filepath=''):
+        """
+        Load an hdf5 file saved by save_data with filetype='hdf5'.
+
+        @param string filename: name of the hdf5 file
+        @param string filepath: optional, directory of the file
+
+        @return tuple(OrderedDict, OrderedDict): the data dictionary with the keys and arrays as
+                                                 passed to save_data (plus appended data) and the
+                                                 parameters
+        """
+        if h5py is None:
+            self.log.error('Loading hdf5 file needs the package h5py, which is not installed.')
+            return None, None
+        data = OrderedDict()
+        parameters = OrderedDict()
+        with h5py.File(os.path.join(filepath, filename), 'r') as file:
+            for i in range(len(file) - 1):
+                dataset = file['data_{0:d}'.format(i)]
+                if h5py.check_string_dtype(dataset.dtype) is not None:
+                    data[dataset.attrs['key']] = dataset.asstr()[()]
+                else:
+                    data[dataset.attrs['key']] = dataset[()]
+            for entry, param in file['parameters'].attrs.items():
+                parameters[entry] = param.item() if isinstance(param, np.generic) else param
+        return data, parameters
+
     def get_daily_directory(self):
         """ Gets or creates daily save directory.
 
@@ -21,6 +21,7 @@ top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi
 
 from qtpy import QtCore
 import numpy as np
+import os
 import datetime as dt
 import time
 import matplotlib.pyplot as plt
@@ -30,6 +31,9 @@ from core.statusvariable import StatusVar
 from core.configoption import ConfigOption
 from logic.generic_logic import GenericLogic
 from core.util.mutex import Mutex
+from core.util.plot_updates import PlotUpdateBus
+from core.util.ring_buffer import TraceBuffer
+from core.util.stream_recorder import StreamRecorder, DecimatedOverview
 from core.util.units import ScaledFloat
 from interface.data_instream_interface import StreamChannelType, StreamingMode
 
@@ -44,6 +48,7 @@ class TimeSeriesReaderLogic(GenericLogic):
         module.Class: 'time_series_reader_logic.TimeSeriesReaderLogic'
         max_frame_rate: 10  # optional (10Hz by default)
         calc_digital_freq: True  # optional (True by default)
+        recording_max_file_size: 2147483648  # optional, bytes per recording file (2 GiB by default)
         connect:
             _streamer_con: <streamer_name>
             _savelogic_con: <save_logic_name>
@@ -54,6 +59,10 @@ class TimeSeriesReaderLogic(GenericLogic):
     sigSettingsChanged = QtCore.Signal(dict)
     _sigNextDataFrame = QtCore.Signal()  # internal signal
 
+    # maximum number of samples read at once, in frames. If the reading falls behind, it catches up
+    # with frames of up to this size
+    _read_buffer_frames = 4
+
     # declare connectors
     _streamer_con = Connector(interface='DataInStreamInterface')
     _savelogic_con = Connector(interface='SaveLogic')
@@ -61,6 +70,8 @@ class TimeSeriesReaderLogic(GenericLogic):
     # config options
     _max_frame_rate = ConfigOption('max_frame_rate', default=10, missing='warn')
     _calc_digital_freq = ConfigOption('calc_digital_freq', default=True, missing='warn')
+    # recordings are written to disk while they run, in files of at most this size (bytes, 0: no limit)
+    _recording_max_file_size = ConfigOption('recording_max_file_size', default=2**31, missing='nothing')
 
     # status vars
     _trace_window_size = StatusVar('trace_window_size', default=6)
@@ -87,10 +98,21 @@ class TimeSeriesReaderLogic(GenericLogic):
         self._trace_data = None
         self._trace_times = None
         self._trace_data_averaged = None
-        self.__moving_filter = None
+
+        # Preallocated buffers for reading and processing the frames
+        self._read_buffer = None
+        self._frame_buffer = None
+        self._average_buffer = None
+        self._cumsum_buffer = None
+        self._averaged_channel_indices = tuple()
+        self._number_of_digital_channels = 0
+        # Two display copies of the traces for the plot updates, filled in turn
+        self._display_buffers = [None, None]
+        self._display_index = 0
 
         # for data recording
-        self._recorded_data = None
+        self._recorder = None
+        self._record_overview = None
         self._data_recording_active = False
         self._record_start_time = None
         return
@@ -107,6 +129,11 @@ class TimeSeriesReaderLogic(GenericLogic):
         self._data_recording_active = False
         self._record_start_time = None
 
+        # Frames are handed to the GUI at most max_frame_rate times per second, sigDataChanged is
+        # emitted through it
+        self.plot_updates = PlotUpdateBus(self._max_frame_rate, parent=self)
+        self.plot_updates.add_channel('data', self.sigDataChanged, snapshot=self._snapshot_trace_data)
+
         # Check valid StatusVar
         # active channels
         avail_channels = tuple(ch.name for ch in self._streamer.available_channels)
@@ -154,6 +181,8 @@ class TimeSeriesReaderLogic(GenericLogic):
             self._stop_reader_wait()
 
         self._sigNextDataFrame.disconnect()
+        self.plot_updates.disconnect()
+        self.plot_updates.clear()
 
         # Save status vars
         self._active_channels = self.active_channel_names
@@ -162,12 +191,25 @@ class TimeSeriesReaderLogic(GenericLogic):
 
     def _init_data_arrays(self):
         window_size = self.trace_window_size_samples
-        self._trace_data = np.zeros(
-            [self.number_of_active_channels, window_size + self._moving_average_width // 2])
-        self._trace_data_averaged = np.zeros(
-            [len(self._averaged_channels), window_size - self._moving_average_width // 2])
+        self._trace_data = TraceBuffer(
+            self.number_of_active_channels, window_size + self._moving_average_width // 2)
+        self._trace_data_averaged = TraceBuffer(
+            len(self._averaged_channels), window_size - self._moving_average_width // 2)
         self._trace_times = np.arange(window_size) / self.data_rate
-        self._recorded_data = list()
+        self._display_buffers = [None, None]
+
+        # The frames are read into and processed in these buffers, without allocating per frame
+        frame_size = max(self._samples_per_frame, 1) * self._read_buffer_frames
+        self._read_buffer = np.zeros(
+            self.number_of_active_channels * frame_size * self.oversampling_factor,
+            dtype=self._streamer.data_type)
+        self._frame_buffer = np.zeros([self.number_of_active_channels, frame_size])
+        self._average_buffer = np.zeros([len(self._averaged_channels), frame_size])
+        self._cumsum_buffer = np.zeros(frame_size + self._moving_average_width)
+        self._averaged_channel_indices = tuple(
+            self.active_channel_names.index(ch) for ch in self._averaged_channels)
+        self._number_of_digital_channels = sum(
+            typ == StreamChannelType.DIGITAL for typ in self.active_channel_types.values())
         return
 
     @property
@@ -279,18 +321,44 @@ class TimeSeriesReaderLogic(GenericLogic):
 
     @property
     def trace_data(self):
-        data_offset = self._trace_data.shape[1] - self._moving_average_width // 2
-        data = {ch: self._trace_data[i, :data_offset] for i, ch in
-                enumerate(self.active_channel_names)}
-        return self._trace_times, data
+        """ A copy of the time trace of the active channels. """
+        with self.threadlock:
+            trace = self._trace_data.view()[:, :self._trace_times.size].copy()
+        return self._trace_times, {ch: trace[i] for i, ch in enumerate(self.active_channel_names)}
 
     @property
     def averaged_trace_data(self):
+        """ A copy of the moving average of the averaged channels. """
         if not self.averaged_channel_names or self.moving_average_width <= 1:
             return None, None
-        data = {ch: self._trace_data_averaged[i] for i, ch in
-                enumerate(self.averaged_channel_names)}
-        return self._trace_times[-self._trace_data_averaged.shape[1]:], data
+        with self.threadlock:
+            trace = self._trace_data_averaged.view().copy()
+        data = {ch: trace[i] for i, ch in enumerate(self.averaged_channel_names)}
+        return self._trace_times[-trace.shape[1]:], data
+
+    def _snapshot_trace_data(self):
+        """ The traces for a plot update, copied into one of the two display buffers.
+
+        Called by plot_updates in the thread of the logic, only after the receivers have handled
+        the previous update. The display buffers are filled in turn, so the arrays of an update are
+        not written again before the receivers are done with the next one.
+
+        @return tuple: times, dict of the traces, times and dict of the averaged traces (or None)
+        """
+        trace = self._trace_data.view()[:, :self._trace_times.size]
+        averaged = self._trace_data_averaged.view()
+        self._display_index = 1 - self._display_index
+        display = self._display_buffers[self._display_index]
+        if display is None or display[0].shape != trace.shape or display[1].shape != averaged.shape:
+            display = (np.empty_like(trace), np.empty_like(averaged))
+            self._display_buffers[self._display_index] = display
+        np.copyto(display[0], trace)
+        data = {ch: display[0][i] for i, ch in enumerate(self.active_channel_names)}
+        if not self.averaged_channel_names or self.moving_average_width <= 1:
+            return self._trace_times, data, None, None
+        np.copyto(display[1], averaged)
+        averaged_data = {ch: display[1][i] for i, ch in enumerate(self.averaged_channel_names)}
+        return self._trace_times, data, self._trace_times[-averaged.shape[1]:], averaged_data
 
     @property
     def all_settings(self):
@@ -373,8 +441,6 @@ class TimeSeriesReaderLogic(GenericLogic):
                 if new_val / data_rate > self.trace_window_size:
                     if 'data_rate' in settings_dict or 'trace_window_size' in settings_dict:
                         self._moving_average_width = new_val
-                        self.__moving_filter = np.full(shape=self.moving_average_width,
-                                                       fill_value=1.0 / self.moving_average_width)
                     else:
                         self.log.warning('Moving average width to set ({0:d}) is smaller than the '
                                          'trace window size. Will adjust trace window size to '
@@ -382,8 +448,6 @@ class TimeSeriesReaderLogic(GenericLogic):
                         self._trace_window_size = float(new_val / data_rate)
                 else:
                     self._moving_average_width = new_val
-                    self.__moving_filter = np.full(shape=self.moving_average_width,
-                                                   fill_value=1.0 / self.moving_average_width)
 
             if 'data_rate' in settings_dict:
                 new_val = float(settings_dict['data_rate'])
@@ -463,7 +527,7 @@ class TimeSeriesReaderLogic(GenericLogic):
             settings = self.all_settings
             self.sigSettingsChanged.emit(settings)
             if not restart:
-                self.sigDataChanged.emit(*self.trace_data, *self.averaged_trace_data)
+                self.plot_updates.post('data')
         if restart:
             self.start_reading()
         return settings
@@ -484,6 +548,7 @@ class TimeSeriesReaderLogic(GenericLogic):
 
             self.module_state.lock()
             self._stop_requested = False
+            self.plot_updates.reset_statistics()
 
             self.sigStatusChanged.emit(True, self._data_recording_active)
 
@@ -505,8 +570,9 @@ class TimeSeriesReaderLogic(GenericLogic):
             # self.sigSettingsChanged.emit(settings)
 
             if self._data_recording_active:
-                self._record_start_time = dt.datetime.now()
-                self._recorded_data = list()
+                self._start_recorder()
+                if not self._data_recording_active:
+                    self.sigStatusChanged.emit(True, False)
 
             if self._streamer.start_stream() < 0:
                 self.log.error('Error while starting streaming device data acquisition.')
@@ -546,39 +612,48 @@ class TimeSeriesReaderLogic(GenericLogic):
                             'Error while trying to stop streaming device data acquisition.')
                     if self._data_recording_active:
                         self._save_recorded_data(to_file=True, save_figure=True)
-                        self._recorded_data = list()
                     self._data_recording_active = False
                     self.module_state.unlock()
+                    self.plot_updates.flush()
+                    self.log.debug('Plot updates: {0}.'.format(self.plot_updates.statistics_message()))
                     self.sigStatusChanged.emit(False, False)
                     return
 
-                samples_to_read = max(
-                    (self._streamer.available_samples // self._oversampling_factor) * self._oversampling_factor,
-                    self._samples_per_frame * self._oversampling_factor)
+                # at most as many samples as fit into the read buffer, the rest is read with the
+                # next frame
+                number_of_channels = self._frame_buffer.shape[0]
+                samples_to_read = min(
+                    max((self._streamer.available_samples // self._oversampling_factor) * self._oversampling_factor,
+                        self._samples_per_frame * self._oversampling_factor),
+                    self._read_buffer.size // number_of_channels)
                 if samples_to_read < 1:
                     self._sigNextDataFrame.emit()
                     return
 
-                # read the current counter values
-                data = self._streamer.read_data(number_of_samples=samples_to_read)
-                if data.shape[1] != samples_to_read:
+                # read the current counter values into the preallocated buffer, channel after channel
+                read_samples = self._streamer.read_data_into_buffer(self._read_buffer,
+                                                                    number_of_samples=samples_to_read)
+                if read_samples != samples_to_read:
                     self.log.error('Reading data from streamer went wrong; '
                                    'killing the stream with next data frame.')
                     self._stop_requested = True
                     self._sigNextDataFrame.emit()
                     return
+                data = self._read_buffer[:number_of_channels * samples_to_read].reshape(
+                    (number_of_channels, samples_to_read))
 
                 # Process data
                 self._process_trace_data(data)
 
                 # Emit update signal
-                self.sigDataChanged.emit(*self.trace_data, *self.averaged_trace_data)
+                self.plot_updates.post('data')
                 self._sigNextDataFrame.emit()
         return
 
     def _process_trace_data(self, data):
         """
-        Processes raw data from the streaming device
+        Processes raw data from the streaming device. Works in place in the preallocated buffers,
+        the cost per frame is proportional to the number of new samples, not to the trace length.
         """
         # Down-sample and average according to oversampling factor
         if self.oversampling_factor > 1:
@@ -589,35 +664,50 @@ class TimeSeriesReaderLogic(GenericLogic):
             tmp = data.reshape((data.shape[0],
                                 data.shape[1] // self.oversampling_factor,
                                 self.oversampling_factor))
-            data = np.mean(tmp, axis=2)
+            data = np.mean(tmp, axis=2, out=self._frame_buffer[:, :tmp.shape[1]])
 
-        digital_channels = [c for c, typ in self.active_channel_types.items() if
-                            typ == StreamChannelType.DIGITAL]
         # Convert digital event count numbers into frequencies according to ConfigOption
-        if self._calc_digital_freq and digital_channels:
-            data[:len(digital_channels)] *= self.sampling_rate
+        if self._calc_digital_freq and self._number_of_digital_channels > 0:
+            data[:self._number_of_digital_channels] *= self.sampling_rate
+
+        # Write the data to the recording file if necessary
+        if self._data_recording_active and self._recorder is not None:
+            try:
+                self._recorder.write(data)
+            except OSError:
+                self.log.exception('Writing to the recording file {0} failed, recording stopped:'
+                                   ''.format(self._recorder.filename))
+                self._save_recorded_data(to_file=True, save_figure=True)
+                self._data_recording_active = False
+                self.sigStatusChanged.emit(True, False)
+            else:
+                self._record_overview.add(data)
 
-        # Append data to save if necessary
-        if self._data_recording_active:
-            self._recorded_data.append(data.copy())
+        # Append to the continuously running time trace
+        self._trace_data.extend(data)
 
-        data = data[:, -self._trace_data.shape[1]:]
-        new_samples = data.shape[1]
+        if self.moving_average_width > 1 and self.averaged_channel_names:
+            self._update_moving_average(min(data.shape[1], self._trace_data_averaged.length))
+        return
 
-        # Roll data array to have a continuously running time trace
-        self._trace_data = np.roll(self._trace_data, -new_samples, axis=1)
-        # Insert new data
-        self._trace_data[:, -new_samples:] = data
+    def _update_moving_average(self, new_samples):
+        """
+        Calculate the moving average of the newest samples of the averaged channels from the
+        cumulative sum of these samples and the preceding moving_average_width - 1 samples, and
+        append it to the averaged trace.
 
-        # Calculate moving average by using numpy.convolve with a normalized uniform filter
-        if self.moving_average_width > 1 and self.averaged_channel_names:
-            # Only convolve the new data and roll the previously calculated moving average
-            self._trace_data_averaged = np.roll(self._trace_data_averaged, -new_samples, axis=1)
-            offset = new_samples + len(self.__moving_filter) - 1
-            for i, ch in enumerate(self.averaged_channel_names):
-                data_index = self.active_channel_names.index(ch)
-                self._trace_data_averaged[i, -new_samples:] = np.convolve(
-                    self._trace_data[data_index, -offset:], self.__moving_filter, mode='valid')
+        @param int new_samples: number of new samples to average
+        """
+        width = self.moving_average_width
+        trace = self._trace_data.view()
+        cumsum = self._cumsum_buffer[:new_samples + width]
+        averaged = self._average_buffer[:, :new_samples]
+        cumsum[0] = 0
+        for i, data_index in enumerate(self._averaged_channel_indices):
+            np.cumsum(trace[data_index, -(new_samples + width - 1):], out=cumsum[1:])
+            np.subtract(cumsum[width:], cumsum[:new_samples], out=averaged[i])
+        averaged /= width
+        self._trace_data_averaged.extend(averaged)
         return
 
     @QtCore.Slot()
@@ -635,11 +725,11 @@ class TimeSeriesReaderLogic(GenericLogic):
 
             self._data_recording_active = True
             if self.module_state() == 'locked':
-                self._recorded_data = list()
-                self._record_start_time = dt.datetime.now()
-                self.sigStatusChanged.emit(True, True)
-            else:
-                self.start_reading()
+                self._start_recorder()
+                self.sigStatusChanged.emit(True, self._data_recording_active)
+                return 0
+        # start_reading takes the (not recursive) threadlock itself
+        self.start_reading()
         return 0
 
     @QtCore.Slot()
@@ -658,30 +748,58 @@ class TimeSeriesReaderLogic(GenericLogic):
             self._data_recording_active = False
             if self.module_state() == 'locked':
                 self._save_recorded_data(to_file=True, save_figure=True)
-                self._recorded_data = list()
                 self.sigStatusChanged.emit(True, False)
         return 0
 
+    def _start_recorder(self):
+        """ Open the files of a new recording, the data is written to them while it arrives.
+        Recording is switched off again if the files can not be created.
+        """
+        self._record_start_time = dt.datetime.now()
+        channels = self.active_channel_names
+        units = self.active_channel_units
+        try:
+            self._recorder = StreamRecorder(
+                self._savelogic.get_path_for_module(module_name='TimeSeriesReader'),
+                'data_trace',
+                channels,
+                self.data_rate,
+                metadata={'units': [units[ch] for ch in channels],
+                          'oversampling_factor': self.oversampling_factor,
+                          'sampling_rate': self.sampling_rate},
+                max_file_size=self._recording_max_file_size)
+        except OSError:
+            self.log.exception('Creating the recording file failed, data is not recorded:')
+            self._recorder = None
+            self._data_recording_active = False
+            return
+        self._record_overview = DecimatedOverview(len(channels))
+        return
+
     def _save_recorded_data(self, to_file=True, name_tag='', save_figure=True):
-        """ Save the counter trace data and writes it to a file.
+        """ Close the recording file and save the overview of the recorded data (minimum and maximum
+        of every block of samples, a few thousand points for a recording of any length) and its
+        figure. The recorded data itself is in the raw data files written during the recording.
 
-        @param bool to_file: indicate, whether data have to be saved to file
+        @param bool to_file: indicate, whether the overview has to be saved to file
         @param str name_tag: an additional tag, which will be added to the filename upon save
         @param bool save_figure: select whether png and pdf should be saved
 
-        @return dict parameters: Dictionary which contains the saving parameters
+        @return tuple(str, dict): metadata file of the recording (see StreamRecorder.load) and the
+                                  dictionary which contains the saving parameters
         """
-        if not self._recorded_data:
+        recorder = self._recorder
+        self._recorder = None
+        if recorder is None:
             self.log.error('No data has been recorded. Save to file failed.')
-            return np.empty(0), dict()
-
-        data_arr = np.concatenate(self._recorded_data, axis=1)
-        if data_arr.size == 0:
-            self.log.error('No data has been recorded. Save to file failed.')
-            return np.empty(0), dict()
+            return '', dict()
 
         saving_stop_time = self._record_start_time + dt.timedelta(
-            seconds=data_arr.shape[1] / self.data_rate)
+            seconds=recorder.total / self.data_rate)
+        recorder.close(stopped=saving_stop_time.isoformat())
+        if recorder.total == 0:
+            self.log.error('No data has been recorded. Save to file failed.')
+            return recorder.metadata_filename, dict()
 
         # write the parameters:
         parameters = dict()
@@ -691,16 +809,23 @@ class TimeSeriesReaderLogic(GenericLogic):
         parameters['Data rate (Hz)'] = self.data_rate
         parameters['Oversampling factor (samples)'] = self.oversampling_factor
         parameters['Sampling rate (Hz)'] = self.sampling_rate
+        parameters['Recorded samples'] = recorder.total
+        parameters['Raw data files'] = ', '.join(os.path.basename(name) for name in recorder.filenames)
+        parameters['Raw data metadata'] = os.path.basename(recorder.metadata_filename)
+        parameters['Overview block size (samples)'] = self._record_overview.block_size
 
         if to_file:
             # If there is a postfix then add separating underscore
-            filelabel = 'data_trace_{0}'.format(name_tag) if name_tag else 'data_trace'
-
-            # prepare the data in a dict:
-            header = ', '.join(
-                '{0} ({1})'.format(ch, unit) for ch, unit in self.active_channel_units.items())
-
-            data = {header: data_arr.transpose()}
+            filelabel = 'data_trace_overview_{0}'.format(name_tag) if name_tag else 'data_trace_overview'
+
+            # prepare the overview in a dict:
+            times, minimum, maximum = self._record_overview.get_envelope(self.data_rate)
+            header = 'Time (s), ' + ', '.join(
+                '{0} min ({1}), {0} max ({1})'.format(ch, unit) for ch, unit in self.active_channel_units.items())
+            envelope = np.empty((2 * minimum.shape[0], minimum.shape[1]))
+            envelope[0::2] = minimum
+            envelope[1::2] = maximum
+            data = {header: np.vstack((times, envelope)).transpose()}
             filepath = self._savelogic.get_path_for_module(module_name='TimeSeriesReader')
             set_of_units = set(self.active_channel_units.values())
             unit_list = tuple(self.active_channel_units)
@@ -712,7 +837,7 @@ class TimeSeriesReaderLogic(GenericLogic):
                     occurrences = count
                     y_unit = unit
 
-            fig = self._draw_figure(data_arr, self.data_rate, y_unit) if save_figure else None
+            fig = self._draw_figure(times, minimum, maximum, y_unit) if save_figure else None
 
             self._savelogic.save_data(data=data,
                                       filepath=filepath,
@@ -722,12 +847,15 @@ class TimeSeriesReaderLogic(GenericLogic):
                                       delimiter='\t',
                                       timestamp=saving_stop_time)
             self.log.info('Time series saved to: {0}'.format(filepath))
-        return data_arr, parameters
+        return recorder.metadata_filename, parameters
 
-    def _draw_figure(self, data, timebase, y_unit):
+    def _draw_figure(self, times, minimum, maximum, y_unit):
         """ Draw figure to save with data file.
 
-        @param: nparray data: a numpy array containing counts vs time for all detectors
+        @param numpy.ndarray times: time of the overview blocks in s
+        @param numpy.ndarray minimum: minimum of every block for all channels
+        @param numpy.ndarray maximum: maximum of every block for all channels
+        @param str y_unit: unit of the signal
 
         @return: fig fig: a matplotlib figure object to be saved to file.
         """
@@ -735,16 +863,14 @@ class TimeSeriesReaderLogic(GenericLogic):
         plt.style.use(self._savelogic.mpl_qd_style)
 
         # Create figure and scale data
-        max_abs_value = ScaledFloat(max(data.max(), np.abs(data.min())))
-        time_data = np.arange(data.shape[1]) / timebase
+        max_abs_value = ScaledFloat(max(maximum.max(), np.abs(minimum.min())))
+        scale = max_abs_value.scale_val if max_abs_value.scale else 1
         fig, ax = plt.subplots()
-        if max_abs_value.scale:
-            ax.plot(time_data,
-                    data.transpose() / max_abs_value.scale_val,
-                    linestyle=':',
-                    linewidth=0.5)
-        else:
-            ax.plot(time_data, data.transpose(), linestyle=':', linewidth=0.5)
+        for channel_min, channel_max in zip(minimum, maximum):
+            # the envelope of the signal, a line if the blocks are single samples
+            lines = ax.plot(times, channel_max / scale, linestyle=':', linewidth=0.5)
+            ax.fill_between(times, channel_min / scale, channel_max / scale,
+                            color=lines[0].get_color(), alpha=0.5, linewidth=0)
         ax.set_xlabel('Time (s)')
         ax.set_ylabel('Signal ({0}{1})'.format(max_abs_value.scale, y_unit))
         return fig
@@ -774,8 +900,7 @@ class TimeSeriesReaderLogic(GenericLogic):
 
             header = ', '.join(
                 '{0} ({1})'.format(ch, unit) for ch, unit in self.active_channel_units.items())
-            data_offset = self._trace_data.shape[1] - self.moving_average_width // 2
-            data = {header: self._trace_data[:, :data_offset].transpose()}
+            data = {header: self._trace_data.view()[:, :self._trace_times.size].transpose().copy()}
 
             if to_file:
                 filepath = self._savelogic.get_path_for_module(module_name='TimeSeriesReader')
@@ -807,7 +932,6 @@ class TimeSeriesReaderLogic(GenericLogic):
                     'Error while trying to stop streaming device data acquisition.')
             if self._data_recording_active:
                 self._save_recorded_data(to_file=True, save_figure=True)
-                self._recorded_data = list()
             self._data_recording_active = False
             self.module_state.unlock()
             self.sigStatusChanged.emit(False, False)
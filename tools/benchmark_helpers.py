@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers to run qudi modules outside of the manager, e.g. for benchmarks of logic modules with dummy
+hardware. The modules are created, connected and activated directly, without GUI and without
+loading/saving status variables.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from qtpy import QtCore
+
+_app = None
+
+
+def get_application():
+    """ Return the (headless) Qt application needed for signals and timers. """
+    global _app
+    if _app is None:
+        _app = QtCore.QCoreApplication.instance()
+        if _app is None:
+            _app = QtCore.QCoreApplication(sys.argv)
+    return _app
+
+
+def create_module(module_class, name, config=None, connect=None):
+    """ Create, connect and activate a qudi module.
+
+    @param type module_class: the qudi module class
+    @param str name: name of the module instance
+    @param dict config: optional, configuration dict as it would be given in the config file
+    @param dict connect: optional, connector name -> already activated module instance
+
+    @return object: the activated module instance
+    """
+    get_application()
+    module = module_class(manager=None, name=name, config=config if config is not None else {})
+    if connect is not None:
+        for connector_name, target in connect.items():
+            module.connectors[connector_name].connect(target)
+    module.module_state.activate()
+    return module
+
+
+def process_events_until(condition, timeout=600):
+    """ Process Qt events until condition() is True.
+
+    @param callable condition: returns True when done
+    @param float timeout: maximum waiting time in s
+
+    @return float: elapsed time in s
+    """
+    app = get_application()
+    start = time.perf_counter()
+    while not condition():
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError('Condition not reached within {0} s.'.format(timeout))
+    return time.perf_counter() - start
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the xy scan of ConfocalLogic on confocal_scanner_dummy: unidirectional scan with a
+return line after every line (as before) against bidirectional scans (trace and retrace), with and
+without the return_slowness ramp between adjacent lines.
+
+Run from the qudi directory:
+
+    python tools/confocal_scan_benchmark.py
+
+The dummy scanner waits the same time per point for scan lines, return lines and ramps, and
+computes the counts of every line it is given, so the lines per second follow from the number of
+points the scanner moves through and the number of lines it is given per image line.
+Printed are the image lines per second and the correlation of the trace rows (even) and the
+retrace rows (odd) with the image of a separate unidirectional scan (the dummy adds independent
+noise to every line, so that the correlation of two unidirectional scans is below 1).
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_helpers import create_module, process_events_until
+
+from hardware.confocal_scanner_dummy import ConfocalScannerDummy
+from logic.confocal_logic import ConfocalLogic
+from logic.fit_logic import FitLogic
+from logic.save_logic import SaveLogic
+
+CLOCK_FREQUENCY = 2000
+RESOLUTION = 100
+RETURN_SLOWNESS = 50
+
+
+def create_logic():
+    fitlogic = create_module(FitLogic, 'fitlogic')
+    scanner = create_module(ConfocalScannerDummy, 'scanner', {'clock_frequency': CLOCK_FREQUENCY},
+                            {'fitlogic': fitlogic})
+    savelogic = create_module(SaveLogic, 'savelogic', {'unix_data_directory': tempfile.mkdtemp(),
+                                                       'log_into_daily_directory': False})
+    logic = create_module(ConfocalLogic, 'confocal', {},
+                          {'confocalscanner1': scanner, 'savelogic': savelogic})
+    logic.set_clock_frequency(CLOCK_FREQUENCY)
+    logic.return_slowness = RETURN_SLOWNESS
+    logic.xy_resolution = RESOLUTION
+    logic.image_x_range = [20e-6, 40e-6]
+    logic.image_y_range = [20e-6, 40e-6]
+    logic.set_position('benchmark', z=50e-6)
+    return logic
+
+
+def scan_image(logic, bidirectional, skip_adjacent_ramp):
+    """ @return tuple(float, numpy.ndarray): image lines per second, counts of the first channel """
+    logic.bidirectional_scan = bidirectional
+    logic.skip_adjacent_ramp = skip_adjacent_ramp
+    updates = list()
+
+    def image_updated():
+        updates.append((time.perf_counter(), logic._scan_counter))
+
+    logic.signal_xy_image_updated.connect(image_updated)
+    logic.start_scanning()
+    process_events_until(lambda: logic.module_state() == 'locked')
+    process_events_until(lambda: logic.module_state() != 'locked')
+    logic.signal_xy_image_updated.disconnect(image_updated)
+    # from the first to the last line update, without setting up the scanner and the first approach
+    # (the update after the last line comes from stopping the scan)
+    updates = [update for update in updates if update[1] < logic.xy_image.shape[0]]
+    (first_time, first_line), (last_time, last_line) = updates[0], updates[-1]
+    return (last_line - first_line) / (last_time - first_time), logic.xy_image[:, :, 3].copy()
+
+
+if __name__ == '__main__':
+    logic = create_logic()
+    print('xy scan, {0} x {0} pixels, {1:.0f} Hz clock, return slowness {2}:'.format(
+        RESOLUTION, CLOCK_FREQUENCY, RETURN_SLOWNESS))
+    _, reference = scan_image(logic, False, False)
+    for name, bidirectional, skip_ramp in (('unidirectional', False, False),
+                                           ('bidirectional', True, False),
+                                           ('bidirectional, no ramp', True, True)):
+        lines_per_second, image = scan_image(logic, bidirectional, skip_ramp)
+        trace, retrace = [np.corrcoef(reference[rows].ravel(), image[rows].ravel())[0, 1]
+                          for rows in (slice(0, None, 2), slice(1, None, 2))]
+        print('  {0:24s}: {1:6.1f} lines/s, correlation of trace/retrace rows {2:.3f}/{3:.3f}'.format(
+            name, lines_per_second, trace, retrace))
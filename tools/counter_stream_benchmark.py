@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the sample processing of CounterLogic in continuous counting mode: np.roll of the
+count traces, np.median of the smoothing window and a list of saved samples (as the logic did
+before) against the circular traces with the running median and the chunked recording file.
+
+Run from the qudi directory:
+
+    python tools/counter_stream_benchmark.py
+
+Printed are the processing time per sample for several trace lengths, whether both give the same
+traces, and the memory allocated while saving a long count trace (without the text file written by
+save_data).
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmark_helpers import create_module
+
+from hardware.slow_counter_dummy import SlowCounterDummy
+from logic.counter_logic import CounterLogic
+from logic.save_logic import SaveLogic
+
+CHANNELS = 2
+SMOOTH_WINDOW = 10
+N_SAMPLES = 5000
+N_SAVED = 200000
+
+
+class RollingCounter:
+    """ The former continuous processing of CounterLogic. """
+
+    def __init__(self, count_length, smooth_window_length):
+        self.countdata = np.zeros([CHANNELS, count_length])
+        self.countdata_smoothed = np.zeros([CHANNELS, count_length])
+        self.smooth_window_length = smooth_window_length
+        self.saving = False
+        self.data_to_save = []
+        self.saving_start_time = time.time()
+
+    def process(self, rawdata):
+        for i in range(CHANNELS):
+            self.countdata[i, 0] = np.average(rawdata[i])
+        self.countdata = np.roll(self.countdata, -1, axis=1)
+        self.countdata_smoothed = np.roll(self.countdata_smoothed, -1, axis=1)
+        window = -int(self.smooth_window_length / 2) - 1
+        for i in range(CHANNELS):
+            self.countdata_smoothed[i, window:] = np.median(self.countdata[i, -self.smooth_window_length:])
+        if self.saving:
+            newdata = np.empty((CHANNELS + 1, ))
+            newdata[0] = time.time() - self.saving_start_time
+            for i in range(CHANNELS):
+                newdata[i + 1] = self.countdata[i, -1]
+            self.data_to_save.append(newdata)
+
+
+def create_logic():
+    counter = create_module(SlowCounterDummy, 'counter', {'source_channels': CHANNELS})
+    savelogic = create_module(SaveLogic, 'savelogic', {'unix_data_directory': tempfile.mkdtemp(),
+                                                       'log_into_daily_directory': False})
+    return create_module(CounterLogic, 'counterlogic', {}, {'counter1': counter, 'savelogic': savelogic})
+
+
+def process_logic(logic, rawdata):
+    logic.rawdata = rawdata
+    logic._process_data_continous()
+
+
+def compare_processing(logic, count_length):
+    samples = [np.random.poisson(1e5, size=(CHANNELS, 1)).astype(float) for _ in range(N_SAMPLES)]
+    rolling = RollingCounter(count_length, SMOOTH_WINDOW)
+    logic._count_length = count_length
+    logic._smooth_window_length = SMOOTH_WINDOW
+    logic._init_trace_buffers()
+    times = list()
+    for process in (rolling.process, lambda data: process_logic(logic, data)):
+        start = time.perf_counter()
+        for data in samples:
+            process(data)
+        times.append((time.perf_counter() - start) / N_SAMPLES)
+    same = (np.array_equal(logic.countdata, rolling.countdata)
+            and np.array_equal(logic.countdata_smoothed, rolling.countdata_smoothed))
+    print('  count_length {0:7d}: {1:8.1f} us/sample before, {2:6.1f} us/sample now, same traces: {3}'
+          ''.format(count_length, times[0] * 1e6, times[1] * 1e6, same))
+
+
+def saving_memory(logic):
+    """ @return tuple(float, float): allocated memory in MB after saving N_SAVED samples, before and now """
+    data = np.random.poisson(1e5, size=(CHANNELS, 1)).astype(float)
+    rolling = RollingCounter(300, SMOOTH_WINDOW)
+    rolling.saving = True
+    logic._count_length = 300
+    logic._init_trace_buffers()
+    allocated = list()
+    for start_saving, process in ((lambda: None, rolling.process),
+                                  (lambda: logic.start_saving(), lambda rawdata: process_logic(logic, rawdata))):
+        tracemalloc.start()
+        start_saving()
+        for _ in range(N_SAVED):
+            process(data)
+        allocated.append(tracemalloc.get_traced_memory()[0] / 2**20)
+        tracemalloc.stop()
+    saved = logic.get_saved_data()
+    print('  {0} samples saved (now {1} rows): {2:.1f} MB in memory before, {3:.2f} MB now'.format(
+        N_SAVED, len(saved), *allocated))
+    logic.stopCount()
+    logic.save_data(to_file=False)
+
+
+if __name__ == '__main__':
+    logic = create_logic()
+    print('Continuous processing, {0} channels, smoothing window {1}:'.format(CHANNELS, SMOOTH_WINDOW))
+    for count_length in (300, 10000, 100000):
+        compare_processing(logic, count_length)
+    print('Saving:')
+    saving_memory(logic)
+    # removes the temporary recording
+    logic.module_state.deactivate()
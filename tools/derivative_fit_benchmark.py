@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the derivative lineshape fits (logic/fitmethods/derivativelikemethods.py) with the
+analytic Jacobian against the finite differences lmfit uses by default, in fits per second.
+
+Run from the qudi directory:
+
+    python tools/derivative_fit_benchmark.py
+
+Noisy spectra with random line parameters are fitted with both paths, starting from the same
+estimates. The number of fits per second, the mean number of model evaluations per fit and the
+largest difference of the fitted centers between both paths are printed for every fit.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import time
+
+import numpy as np
+
+from benchmark_helpers import create_module
+from logic.fit_logic import FitLogic
+
+N_SPECTRA = 200
+N_POINTS = 500
+NOISE = 0.03
+
+# fit name -> function returning random true parameters
+SPECTRA = {
+    'lorentzianderivative': lambda rng: {'center': rng.uniform(338, 342), 'amplitude': rng.uniform(0.5, 2),
+                                         'width': rng.uniform(0.5, 2), 'offset': rng.uniform(-0.1, 0.1)},
+    'gaussianderivative': lambda rng: {'center': rng.uniform(338, 342), 'amplitude': rng.uniform(0.5, 2),
+                                       'width': rng.uniform(0.5, 2), 'offset': rng.uniform(-0.1, 0.1)},
+    'pseudovoigtderivative': lambda rng: {'center': rng.uniform(338, 342), 'amplitude': rng.uniform(0.5, 2),
+                                          'width': rng.uniform(0.5, 2), 'fraction': rng.uniform(0, 1),
+                                          'offset': rng.uniform(-0.1, 0.1)},
+    'lorentzianderivativedouble': lambda rng: {'l0_center': rng.uniform(334, 337), 'l0_amplitude': rng.uniform(0.5, 2),
+                                               'l0_width': rng.uniform(0.5, 2), 'l1_center': rng.uniform(343, 346),
+                                               'l1_amplitude': rng.uniform(0.5, 2), 'l1_width': rng.uniform(0.5, 2),
+                                               'offset': rng.uniform(-0.1, 0.1)},
+    'lorentzianderivativetriplet': lambda rng: {'center': rng.uniform(338, 342), 'splitting': rng.uniform(2, 4),
+                                                'amplitude': rng.uniform(0.5, 2), 'width': rng.uniform(0.3, 1),
+                                                'offset': rng.uniform(-0.1, 0.1)},
+}
+
+
+def benchmark(fitlogic, fit_name, x_axis, rng):
+    """ Fit N_SPECTRA noisy spectra with and without analytic Jacobian.
+
+    @return dict: for 'analytic' and 'finite differences' a tuple (fits/s, evaluations per fit),
+                  and 'center difference' the largest difference of the fitted centers
+    """
+    fit = fitlogic.fit_list['1d'][fit_name]
+    model, params = fit['make_model']()
+    spectra = []
+    for index in range(N_SPECTRA):
+        for name, value in SPECTRA[fit_name](rng).items():
+            params[name].value = value
+        spectra.append(model.eval(x=x_axis, params=params) + rng.normal(0, NOISE, len(x_axis)))
+
+    results = {}
+    centers = {}
+    for label, analytic in (('analytic', True), ('finite differences', False)):
+        evaluations = 0
+        centers[label] = []
+        start = time.perf_counter()
+        for data in spectra:
+            result = fit['make_fit'](x_axis, data, fit['zerocrossing'], analytic_jacobian=analytic)
+            evaluations += result.nfev
+            centers[label].append(result.params['l0_center' if 'double' in fit_name else 'center'].value)
+        results[label] = (N_SPECTRA / (time.perf_counter() - start), evaluations / N_SPECTRA)
+    results['center difference'] = np.max(np.abs(np.subtract(centers['analytic'], centers['finite differences'])))
+    return results
+
+
+if __name__ == '__main__':
+    fitlogic = create_module(FitLogic, 'fitlogic')
+    rng = np.random.default_rng(0)
+    x_axis = np.linspace(330, 350, N_POINTS)
+    print('{0} spectra of {1} points per fit'.format(N_SPECTRA, N_POINTS))
+    print('{0:30s} {1:>22s} {2:>22s} {3:>8s} {4:>12s}'.format(
+        'fit', 'analytic (fits/s, nfev)', 'finite diff. (fits/s, nfev)', 'speedup', 'max d center'))
+    for fit_name in SPECTRA:
+        results = benchmark(fitlogic, fit_name, x_axis, rng)
+        print('{0:30s} {1:12.1f} {2:9.1f} {3:12.1f} {4:9.1f} {5:8.2f} {6:12.2e}'.format(
+            fit_name, results['analytic'][0], results['analytic'][1], results['finite differences'][0],
+            results['finite differences'][1], results['analytic'][0] / results['finite differences'][0],
+            results['center difference']))
+    fitlogic.module_state.deactivate()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the EPRoC acquisition loop on dummy hardware: stepwise acquisition (one lockin sample
+per event loop pass) against the batched acquisition with hardware microwave sweep.
+
+Run from the qudi directory:
+
+    python tools/eproc_acquisition_benchmark.py
+
+The lockin waiting time is set to zero so that the fixed overhead per sample is measured.
+Afterwards every configured fit is run with do_fit on the spectrum of the last scan, as a check
+that the fits of the EPRoC logic work without the fit settings of the GUI.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import tempfile
+
+from benchmark_helpers import create_module, process_events_until
+
+from hardware.lockin.lockin_dummy import LockinDummy
+from hardware.magnet.magnet_bruker_dummy import MagnetBrukerDummy
+from hardware.microwave.mw_source_smbv_dummy import MicrowaveDummy
+from hardware.power_supply.power_supply_dummy import PowerSupplyDummy
+from logic.eproc.eproc_logic import EPRoCLogic
+from logic.fit_logic import FitLogic
+from logic.save_logic import SaveLogic
+
+
+def create_eproc_logic():
+    lockin = create_module(LockinDummy, 'lockin_dummy')
+    microwave = create_module(MicrowaveDummy, 'mw_source_dummy', {'gpib_address': 'dummy'})
+    magnet = create_module(MagnetBrukerDummy, 'magnet_bruker_dummy')
+    power_supply = create_module(PowerSupplyDummy, 'voltage_generator_dummy', {'address': 'dummy'})
+    savelogic = create_module(SaveLogic, 'savelogic', {'unix_data_directory': tempfile.mkdtemp(),
+                                                       'log_into_daily_directory': False})
+    fitlogic = create_module(FitLogic, 'fitlogic')
+    return create_module(EPRoCLogic, 'eproclogicdummy', {'scanmode': 'SWEEP'},
+                         {'microwave1': microwave, 'lockin': lockin, 'savelogic': savelogic,
+                          'magnet': magnet, 'powersupply1': power_supply,
+                          'powersupply2': power_supply, 'fitlogic': fitlogic})
+
+
+def run_scan(logic, n_points, n_accumulation, n_sweep, batch, batch_points=10):
+    logic.set_batch_acquisition(batch, batch_points)
+    logic.fs_on()
+    logic.set_fs_parameters(2800e6, 1e5, 2800e6 + (n_points - 1) * 1e5, 3480., -30)
+    logic.set_eproc_scan_parameters(n_sweep, n_accumulation)
+    logic.lia_tauA = logic.lia_tauB = 0.0002
+    logic.lia_waiting_time_factor = 0
+    logic.start_eproc()
+    elapsed = process_events_until(lambda: not logic.is_eproc_running)
+    return n_points * n_accumulation * n_sweep / elapsed
+
+
+if __name__ == '__main__':
+    logic = create_eproc_logic()
+    n_points, n_accumulation, n_sweep = 500, 10, 4
+    print('Scan: {0} points x {1} accumulations x {2} sweeps'.format(n_points, n_accumulation, n_sweep))
+    stepwise = run_scan(logic, n_points, n_accumulation, n_sweep, batch=False)
+    print('stepwise: {0:10.0f} samples/s'.format(stepwise))
+    for batch_points in (1, 10, 100):
+        batched = run_scan(logic, n_points, n_accumulation, n_sweep, batch=True, batch_points=batch_points)
+        print('batched ({0:3d} points per pass): {1:10.0f} samples/s ({2:.1f}x)'.format(
+            batch_points, batched, batched / stepwise))
+    for fit_name in logic.get_fit_functions():
+        fit_x, fit_y, result = logic.do_fit(fit_name)
+        print('do_fit({0!r}): {1}'.format(fit_name, 'no result' if result is None else
+                                          '{0} points fitted, success: {1}'.format(len(fit_x), result.success)))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Startup timing report of FitLogic: construction and activation of the module, and the first fit,
+with all fit method files imported at construction (lazy_fit_import: False, as before the fit
+method registry) against the lazy registry, with and without a cached manifest.
+
+Run from the qudi directory:
+
+    python tools/fit_logic_startup_benchmark.py
+
+Every measurement runs in a fresh python process, since imported modules stay cached. The median
+of several runs is printed, with the number of fit method files imported after the activation and
+after the first fit.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RUNS = 5
+
+
+def measure(lazy, manifest_file):
+    """ Runs in the child process: time FitLogic construction + activation and the first fit.
+
+    @return dict: times in s and the number of imported fit method files
+    """
+    from benchmark_helpers import create_module
+    from logic.fit_logic import FitLogic
+
+    start = time.perf_counter()
+    fitlogic = create_module(FitLogic, 'fitlogic', {'lazy_fit_import': lazy, 'fit_manifest_file': manifest_file})
+    activated = time.perf_counter()
+    x_axis = np.linspace(2.86e9, 2.88e9, 200)
+    data = 5e4 - 3000 / (1 + ((x_axis - 2.87e9) / 4e5) ** 2)
+    fit = fitlogic.fit_list['1d']['lorentzian']
+    fit['make_fit'](x_axis, data, fit['dip'])
+    fitted = time.perf_counter()
+    return {'activation': activated - start,
+            'first fit': fitted - activated,
+            'files imported at activation': len(fitlogic._fit_registry.loaded) if not lazy else 0,
+            'files imported after first fit': len(fitlogic._fit_registry.loaded)}
+
+
+def run(lazy, manifest_file, remove_manifest):
+    """ Measure in a fresh python process. """
+    if remove_manifest and os.path.exists(manifest_file):
+        os.remove(manifest_file)
+    output = subprocess.run([sys.executable, __file__, '--child', json.dumps([lazy, manifest_file])],
+                            stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        print(json.dumps(measure(*json.loads(sys.argv[2]))))
+        sys.exit(0)
+
+    manifest_file = os.path.join(tempfile.mkdtemp(), 'fit_method_manifest.json')
+    cases = (('all files imported at activation', False, False),
+             ('lazy, manifest built (no cache)', True, True),
+             ('lazy, cached manifest', True, False))
+    print('{0:35s} {1:>15s} {2:>15s} {3:>15s}'.format('', 'activation (ms)', 'first fit (ms)', 'files imported'))
+    for label, lazy, remove_manifest in cases:
+        results = [run(lazy, manifest_file, remove_manifest) for index in range(RUNS)]
+        print('{0:35s} {1:15.1f} {2:15.1f} {3:>15s}'.format(
+            label,
+            np.median([result['activation'] for result in results]) * 1e3,
+            np.median([result['first fit'] for result in results]) * 1e3,
+            '{0:d} / {1:d}'.format(results[0]['files imported at activation'],
+                                   results[0]['files imported after first fit'])))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the lockin_anfatec hardware module against the local stand-in server
+(tools/lockin_anfatec_server.py): one HTTP connection per request against the persistent
+session, the cached lockin.ini and the bulk read of samples.
+
+Run from the qudi directory:
+
+    python tools/lockin_anfatec_benchmark.py [latency in s]
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import sys
+import time
+
+import requests
+
+from benchmark_helpers import create_module
+from lockin_anfatec_server import AnfatecLockinServer
+
+from hardware.lockin.lockin_anfatec import LockinAnfatec
+
+
+def per_second(function, n):
+    start = time.perf_counter()
+    function(n)
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    server = AnfatecLockinServer(latency=float(sys.argv[1]) if len(sys.argv) > 1 else 0.)
+    server.start()
+    base_url = 'http://' + server.address
+    lockin = create_module(LockinAnfatec, 'lockin_anfatec', {'gpib_address': server.address})
+    n = 2000
+
+    def fresh_connection_reads(n):
+        for i in range(n):
+            requests.get(base_url + '/data/lia.dat')
+
+    def session_reads(n):
+        for i in range(n):
+            lockin.get_data_lia()
+
+    def fresh_ini_reads(n):
+        for i in range(n):
+            for line in requests.get(base_url + '/setup/lockin.ini').text.split('\n'):
+                if 'Phase0' in line:
+                    break
+
+    def cached_ini_reads(n):
+        for i in range(n):
+            lockin.get_actual_value('Phase0')
+
+    print('get_data_lia, new connection per request: {0:8.0f} reads/s'.format(
+        per_second(fresh_connection_reads, n)))
+    connections = server.connection_count
+    print('get_data_lia, persistent session:         {0:8.0f} reads/s'.format(per_second(session_reads, n)))
+    print('get_data_lia_block({0}):                {1:8.0f} reads/s'.format(
+        n, per_second(lockin.get_data_lia_block, n)))
+    print('    TCP connections opened for {0} session reads: {1}'.format(
+        2 * n, server.connection_count - connections))
+    print('get_actual_value, download per call:      {0:8.0f} calls/s'.format(per_second(fresh_ini_reads, n)))
+    print('get_actual_value, cached lockin.ini:      {0:8.0f} calls/s'.format(per_second(cached_ini_reads, n)))
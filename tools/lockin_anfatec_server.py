@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the web server of the Anfatec lockin, for testing and benchmarking the
+hardware module lockin_anfatec.LockinAnfatec without the instrument.
+
+It serves the endpoints used by the hardware module:
+
+    /cgi-bin/login.cgi?username=...&password=...
+    /cgi-bin/remote.cgi?<command>_<value>_
+    /setup/lockin.ini
+    /data/lia.dat
+
+Run from the qudi directory and point the 'gpib_address' of the lockin to it:
+
+    python tools/lockin_anfatec_server.py 8080
+
+    lockin_anfatec:
+        module.Class: 'lockin.lockin_anfatec.LockinAnfatec'
+        gpib_address: '127.0.0.1:8080'
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Remote command code -> lockin.ini entries changed by it
+COMMANDS = {
+    '899': ('InputRange',),
+    '89D': ('InputCouple',),
+    '8959': ('Timeconstant',),
+    '8955': ('TimeConstLoL',),
+    '895D': ('Sync0', 'SyncLoL'),
+    '891': ('Rolloff', 'RollOffLoL'),
+    '89A': ('InputMode',),
+    '8D9': ('Amplitude',),
+    '8DD': ('Frequency',),
+    '8D59': ('Phase',),
+    '8D5D': ('Phase0',),
+    '8D1': ('Harmonic',),
+    '8DA': ('RefInFlag',),
+}
+
+
+class AnfatecLockinServer(ThreadingHTTPServer):
+    """ HTTP server holding the state of the simulated lockin.
+
+    @param int port: port to listen on, 0 to pick a free one
+    @param float latency: optional, response time of the simulated instrument in s
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.):
+        super().__init__(('127.0.0.1', port), AnfatecLockinRequestHandler)
+        self.latency = latency
+        self.request_count = 0
+        self.connection_count = 0
+        self.settings = OrderedDict([
+            ('Amplitude', '0'), ('Frequency', '1000'), ('Timeconstant', '9'), ('Rolloff', '6'),
+            ('InputRange', '10'), ('Phase', '0'), ('Harmonic', '1'), ('AmplCaretPos', '0'),
+            ('FreqCaretPos', '0'), ('FreqCaretPosTail', '0'), ('PhaseCaretPos', '0'),
+            ('DisplayChannel', '0'), ('Channel1Type', '0'), ('Channel1Range', '0'),
+            ('Channel2Type', '0'), ('Channel2Range', '0'), ('Channel3Type', '0'),
+            ('Channel3Range', '0'), ('Channel4Type', '0'), ('Channel4Range', '0'),
+            ('InputCouple', '1'), ('InputMode', '2'), ('RefInFlag', '1'), ('TimeConstLoL', '2'),
+            ('RollOffLoL', '6'), ('SyncLoL', '0'), ('Sync0', '0'), ('Phase0', '0')])
+
+    @property
+    def address(self):
+        """ Address to configure as 'gpib_address' of the hardware module. """
+        return '{0}:{1}'.format(*self.server_address)
+
+    def lockin_ini(self):
+        return '\n'.join('{0} {1}'.format(key, value) for key, value in self.settings.items()) + '\n'
+
+    def execute(self, query):
+        """ Execute a remote command of the form <code>_<value>_. """
+        code, value = query.split('_')[:2]
+        for key in COMMANDS.get(code, ()):
+            self.settings[key] = value
+
+    def start(self):
+        """ Serve in a background thread. """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class AnfatecLockinRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection open unless the client closes it
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, do not let them wait for the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connection_count += 1
+
+    def do_GET(self):
+        self.server.request_count += 1
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        if url.path == '/cgi-bin/login.cgi':
+            body = 'ok'
+        elif url.path == '/cgi-bin/remote.cgi':
+            self.server.execute(url.query)
+            body = 'ok'
+        elif url.path == '/setup/lockin.ini':
+            body = self.server.lockin_ini()
+        elif url.path == '/data/lia.dat':
+            body = '\r\n'.join(' {0: .6E}'.format(random.uniform(-1, 1)) for i in range(4)) + '\r\n'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        return
+
+
+if __name__ == '__main__':
+    server = AnfatecLockinServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print('Anfatec lockin stand-in listening on {0}'.format(server.address))
+    server.serve_forever()
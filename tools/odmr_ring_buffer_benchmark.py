@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the per line update of the ODMR raw data: np.roll of the whole history with
+np.concatenate when it is full (as ODMRLogic did before) against the RingBuffer with spilling of the
+evicted lines to disk.
+
+Run from the qudi directory:
+
+    python tools/odmr_ring_buffer_benchmark.py
+
+The time per line is printed for blocks of lines, it stays constant for the ring buffer and grows
+with the number of acquired lines for np.roll (which is therefore only run for the first lines).
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from core.util.ring_buffer import RingBuffer
+
+N_CHANNELS = 2
+N_POINTS = 100
+NUMBER_OF_LINES = 50
+BUFFER_LINES = 1000
+
+
+def roll_lines(n_lines, block):
+    """ Old ODMRLogic update: roll the whole array, grow it by concatenation when full.
+
+    @return list: time per line in s for every block of lines
+    """
+    raw_data = np.zeros((BUFFER_LINES, N_CHANNELS, N_POINTS))
+    line = np.random.normal(size=(N_CHANNELS, N_POINTS))
+    times = []
+    start = time.perf_counter()
+    for index in range(n_lines):
+        if index == raw_data.shape[0] - 1:
+            raw_data = np.concatenate((raw_data, np.zeros(raw_data.shape)), axis=0)
+        raw_data = np.roll(raw_data, 1, axis=0)
+        raw_data[0] = line
+        plot_xy = raw_data[:NUMBER_OF_LINES]
+        if (index + 1) % block == 0:
+            times.append((time.perf_counter() - start) / block)
+            start = time.perf_counter()
+    return times
+
+
+def ring_buffer_lines(n_lines, block):
+    """ New ODMRLogic update: append to the ring buffer, spill to disk, zero-copy matrix view.
+
+    @return tuple(list, float): time per line in s for every block of lines, time to read back the
+                                whole history in s
+    """
+    raw_data = RingBuffer(BUFFER_LINES, (N_CHANNELS, N_POINTS), spill=True)
+    line = np.random.normal(size=(N_CHANNELS, N_POINTS))
+    times = []
+    start = time.perf_counter()
+    for index in range(n_lines):
+        raw_data.append(line)
+        plot_xy = raw_data.view(NUMBER_OF_LINES)
+        if (index + 1) % block == 0:
+            times.append((time.perf_counter() - start) / block)
+            start = time.perf_counter()
+    start = time.perf_counter()
+    raw_data.get_lines()
+    read_time = time.perf_counter() - start
+    raw_data.close()
+    return times, read_time
+
+
+if __name__ == '__main__':
+    print('{0} channels x {1} points per line, {2} lines in memory'.format(N_CHANNELS, N_POINTS, BUFFER_LINES))
+    print('np.roll + np.concatenate, 10^4 lines:')
+    for block, per_line in enumerate(roll_lines(10000, 1000)):
+        print('  lines {0:6d} - {1:6d}: {2:8.2f} us/line'.format(block * 1000, (block + 1) * 1000, per_line * 1e6))
+    print('RingBuffer with spilling to disk, 10^5 lines:')
+    times, read_time = ring_buffer_lines(100000, 10000)
+    for block, per_line in enumerate(times):
+        print('  lines {0:6d} - {1:6d}: {2:8.2f} us/line'.format(block * 10000, (block + 1) * 10000, per_line * 1e6))
+    print('  reading the whole history back: {0:.3f} s'.format(read_time))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the plot updates of EPRoCLogic with a slow plot slot: connected directly to
+sigEprocPlotsUpdated without rate limit (every data point is drawn, as the GUI did before) against
+the rate limited PlotUpdateBus (plot_updates.connect).
+
+Run from the qudi directory:
+
+    python tools/plot_update_bus_benchmark.py
+
+The logic and the plot slot share the event loop here, so drawing every point also slows the scan
+down. Printed are the scan rate, the number of redraws and how long the plot lags behind the end of
+the scan.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import time
+
+from qtpy import QtCore
+
+from benchmark_helpers import process_events_until
+from eproc_acquisition_benchmark import create_eproc_logic
+
+N_POINTS = 200
+N_ACCUMULATION = 5
+N_SWEEP = 2
+DRAW_TIME = 0.01
+
+
+class SlowPlot:
+    """ Plot slot which takes DRAW_TIME per redraw and counts the redraws. """
+
+    def __init__(self):
+        self.draws = 0
+
+    def update_plots(self, x, y):
+        time.sleep(DRAW_TIME)
+        self.draws += 1
+
+
+def run_scan(logic, plot, use_bus):
+    if use_bus:
+        logic.plot_updates.max_rate = 20
+        logic.plot_updates.connect('plots', plot.update_plots)
+    else:
+        # sigEprocPlotsUpdated is emitted for every data point without rate limit
+        logic.plot_updates.max_rate = 0
+        logic.sigEprocPlotsUpdated.connect(plot.update_plots, QtCore.Qt.QueuedConnection)
+    logic.fs_on()
+    logic.set_fs_parameters(2800e6, 1e5, 2800e6 + (N_POINTS - 1) * 1e5, 3480., -30)
+    logic.set_eproc_scan_parameters(N_SWEEP, N_ACCUMULATION)
+    logic.lia_tauA = logic.lia_tauB = 0.0002
+    logic.lia_waiting_time_factor = 0
+    start = time.perf_counter()
+    logic.start_eproc()
+    plot.draws = 0
+    process_events_until(lambda: not logic.is_eproc_running)
+    scan_time = time.perf_counter() - start
+    # drain the plot updates still queued after the scan
+    app = QtCore.QCoreApplication.instance()
+    while True:
+        draws = plot.draws
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        app.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        if plot.draws == draws:
+            break
+    lag = time.perf_counter() - start - scan_time
+    if use_bus:
+        logic.plot_updates.disconnect('plots')
+    else:
+        logic.sigEprocPlotsUpdated.disconnect(plot.update_plots)
+    return scan_time, lag
+
+
+if __name__ == '__main__':
+    logic = create_eproc_logic()
+    logic.set_batch_acquisition(False, 1)
+    samples = N_POINTS * N_ACCUMULATION * N_SWEEP
+    print('Scan: {0} points x {1} accumulations x {2} sweeps, {3:.0f} ms per redraw'.format(
+        N_POINTS, N_ACCUMULATION, N_SWEEP, DRAW_TIME * 1e3))
+    for use_bus in (False, True):
+        plot = SlowPlot()
+        scan_time, lag = run_scan(logic, plot, use_bus)
+        print('{0:24s}: {1:8.0f} samples/s, {2:5d} redraws, plot lag after the scan {3:.3f} s'.format(
+            'PlotUpdateBus ({0:.0f} Hz)'.format(logic.plot_updates.max_rate) if use_bus else 'direct signal',
+            samples / scan_time, plot.draws, lag))
+        if use_bus:
+            print('    ' + logic.plot_updates.statistics_message())
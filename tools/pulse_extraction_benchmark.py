@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the laser pulse extraction ungated_conv_deriv (BasicPulseExtractor) on long ungated
+fast counter traces: the single pass flank search against the previous implementation, which
+searched the whole trace once per rising and falling flank and copied the pulses in a loop.
+
+Run from the qudi directory:
+
+    python tools/pulse_extraction_benchmark.py
+
+A synthetic trace with 1000 laser pulses in 10^7 bins (Poisson noise, spin polarization dip at
+the start of every pulse) is extracted with both implementations. The times and whether both
+found the same flanks and pulses are printed.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from scipy import ndimage
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from logic.pulsed.pulse_extraction_methods.basic_extraction_methods import BasicPulseExtractor
+
+NUMBER_OF_LASERS = 1000
+TRACE_BINS = 10 ** 7
+LASER_BINS = 3000
+CONV_STD_DEV = 20.0
+
+
+def make_trace(number_of_lasers, trace_bins, laser_bins, seed=0):
+    """ Ungated timetrace with equally spaced laser pulses of slightly varying length.
+
+    @return tuple: (numpy.ndarray counts, numpy.ndarray rising bins, numpy.ndarray falling bins)
+    """
+    rng = np.random.default_rng(seed)
+    period = trace_bins // number_of_lasers
+    rising = np.arange(number_of_lasers) * period + period // 4
+    falling = rising + laser_bins - rng.integers(0, 50, number_of_lasers)
+    rate = np.full(trace_bins, 2.)
+    for start, stop in zip(rising, falling):
+        time_in_pulse = np.arange(stop - start)
+        rate[start:stop] = 40. - 10. * np.exp(-time_in_pulse / 300.)
+    return rng.poisson(rate).astype('int64'), rising, falling
+
+
+def previous_ungated_conv_deriv(count_data, number_of_lasers, conv_std_dev=20.0):
+    """ The previous implementation of ungated_conv_deriv: one search of the whole convolved
+    derivative per flank, the found flank is masked before the next search.
+    """
+    conv = ndimage.gaussian_filter1d(count_data.astype(float), conv_std_dev)
+    conv_deriv = np.gradient(conv)
+    conv = ndimage.gaussian_filter1d(count_data.astype(float), 10)
+    conv_deriv_ref = np.gradient(conv)
+
+    rising_ind = np.empty(number_of_lasers, dtype='int64')
+    falling_ind = np.empty(number_of_lasers, dtype='int64')
+    for i in range(number_of_lasers):
+        rising_ind[i] = np.argmax(conv_deriv)
+        start_ind = max(int(rising_ind[i] - conv_std_dev), 0)
+        stop_ind = min(int(rising_ind[i] + conv_std_dev), len(conv_deriv))
+        if start_ind == stop_ind:
+            stop_ind = start_ind + 1
+        rising_ind[i] = start_ind + np.argmax(conv_deriv_ref[start_ind:stop_ind])
+        del_ind_start = 0 if rising_ind[i] < 2 * conv_std_dev else rising_ind[i] - int(2 * conv_std_dev)
+        if (conv_deriv.size - rising_ind[i]) >= 2 * conv_std_dev:
+            conv_deriv[del_ind_start:rising_ind[i] + int(2 * conv_std_dev)] = 0
+
+        falling_ind[i] = np.argmin(conv_deriv)
+        start_ind = max(int(falling_ind[i] - conv_std_dev), 0)
+        stop_ind = min(int(falling_ind[i] + conv_std_dev), len(conv_deriv))
+        if start_ind == stop_ind:
+            stop_ind = start_ind + 1
+        falling_ind[i] = start_ind + np.argmin(conv_deriv_ref[start_ind:stop_ind])
+        del_ind_start = 0 if falling_ind[i] < 2 * conv_std_dev else falling_ind[i] - int(2 * conv_std_dev)
+        if (conv_deriv.size - falling_ind[i]) < 2 * conv_std_dev:
+            del_ind_stop = conv_deriv.size - 1
+        else:
+            del_ind_stop = falling_ind[i] + int(2 * conv_std_dev)
+        conv_deriv[del_ind_start:del_ind_stop] = 0
+
+    rising_ind.sort()
+    falling_ind.sort()
+    laser_length = np.max(falling_ind - rising_ind)
+    laser_arr = np.zeros((number_of_lasers, laser_length), dtype='int64')
+    for i in range(number_of_lasers):
+        if rising_ind[i] + laser_length > count_data.size:
+            lenarr = count_data[rising_ind[i]:].size
+            laser_arr[i, 0:lenarr] = count_data[rising_ind[i]:]
+        else:
+            laser_arr[i] = count_data[rising_ind[i]:rising_ind[i] + laser_length]
+    return {'laser_counts_arr': laser_arr,
+            'laser_indices_rising': rising_ind,
+            'laser_indices_falling': falling_ind}
+
+
+if __name__ == '__main__':
+    logic = SimpleNamespace(measurement_settings={'number_of_lasers': NUMBER_OF_LASERS},
+                            fast_counter_settings={'is_gated': False, 'bin_width': 1e-9},
+                            sampling_information={},
+                            log=logging.getLogger('pulse_extraction_benchmark'))
+    extractor = BasicPulseExtractor(logic)
+
+    for number_of_lasers, trace_bins in ((100, 10 ** 6), (NUMBER_OF_LASERS, TRACE_BINS)):
+        logic.measurement_settings['number_of_lasers'] = number_of_lasers
+        count_data, rising, falling = make_trace(number_of_lasers, trace_bins, LASER_BINS)
+        print('{0:d} lasers, {1:d} bins:'.format(number_of_lasers, trace_bins))
+
+        start = time.perf_counter()
+        new = extractor.ungated_conv_deriv(count_data, conv_std_dev=CONV_STD_DEV)
+        new_time = time.perf_counter() - start
+        start = time.perf_counter()
+        previous = previous_ungated_conv_deriv(count_data, number_of_lasers, conv_std_dev=CONV_STD_DEV)
+        previous_time = time.perf_counter() - start
+
+        print('  previous (search per flank): {0:8.3f} s'.format(previous_time))
+        print('  single pass:                 {0:8.3f} s ({1:.1f}x)'.format(new_time, previous_time / new_time))
+        print('  same flanks: {0}, same pulses: {1}, largest flank offset to the true one: {2:d} bins'.format(
+            np.array_equal(new['laser_indices_rising'], previous['laser_indices_rising'])
+            and np.array_equal(new['laser_indices_falling'], previous['laser_indices_falling']),
+            np.array_equal(new['laser_counts_arr'], previous['laser_counts_arr']),
+            int(max(np.max(np.abs(new['laser_indices_rising'] - rising)),
+                    np.max(np.abs(new['laser_indices_falling'] - falling))))))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the pulse analysis methods of BasicPulseAnalyzer (mean_norm, sum, mean and
+mean_reference): the window sums taken with one cumulative sum over the whole laser array against
+the previous implementation, which looped over the laser pulses.
+
+Run from the qudi directory:
+
+    python tools/pulsed_analysis_benchmark.py
+
+Synthetic laser arrays (Poisson counts with the spin polarization dip at the start of every pulse)
+of the sizes of small and large pulse sequences are analysed with both implementations and the
+default analysis windows at 1 ns bin width. The time per analysis and the largest relative
+deviation of the results are printed.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from logic.pulsed.pulsed_analysis_methods.basic_analysis_methods import BasicPulseAnalyzer
+
+BIN_WIDTH = 1e-9
+# (number of lasers, bins per laser)
+SIZES = ((100, 3000), (1000, 3000), (10000, 3000))
+REPETITIONS = 5
+
+
+def make_laser_data(number_of_lasers, laser_bins, seed=0):
+    """ Laser pulses as extracted from a fast counter after many sweeps.
+
+    @return numpy.ndarray: counts, dim 0: laser number; dim 1: time bin (dtype='int64')
+    """
+    rng = np.random.default_rng(seed)
+    time_in_pulse = np.arange(laser_bins)
+    contrast = rng.uniform(0., 0.3, size=(number_of_lasers, 1))
+    rate = 400. * (1. - contrast * np.exp(-time_in_pulse / 300.))
+    return rng.poisson(rate).astype('int64')
+
+
+def _windows(bin_width, *times):
+    return [round(t / bin_width) for t in times]
+
+
+def previous_mean_norm(laser_data, bin_width, signal_start=0.0, signal_end=200e-9, norm_start=300e-9,
+                       norm_end=500e-9):
+    """ The previous implementation of analyse_mean_norm: one loop iteration per laser pulse. """
+    signal_start_bin, signal_end_bin, norm_start_bin, norm_end_bin = _windows(
+        bin_width, signal_start, signal_end, norm_start, norm_end)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        tmp_data = laser_arr[norm_start_bin:norm_end_bin]
+        reference_sum = np.sum(tmp_data)
+        reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        tmp_data = laser_arr[signal_start_bin:signal_end_bin]
+        signal_sum = np.sum(tmp_data)
+        signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        if reference_mean > 0 and signal_mean >= 0:
+            signal_data[ii] = signal_mean / reference_mean
+        else:
+            signal_data[ii] = 0.0
+        if reference_sum > 0 and signal_sum > 0:
+            error_data[ii] = signal_data[ii] * np.sqrt(1 / signal_sum + 1 / reference_sum)
+        else:
+            error_data[ii] = 0.0
+    return signal_data, error_data
+
+
+def previous_sum(laser_data, bin_width, signal_start=0.0, signal_end=200e-9):
+    """ The previous implementation of analyse_sum. """
+    signal_start_bin, signal_end_bin = _windows(bin_width, signal_start, signal_end)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        signal = laser_arr[signal_start_bin:signal_end_bin].sum()
+        if signal < 0 or signal != signal:
+            signal_data[ii] = 0.0
+            error_data[ii] = 0.0
+        else:
+            signal_data[ii] = signal
+            error_data[ii] = np.sqrt(signal)
+    return signal_data, error_data
+
+
+def previous_mean(laser_data, bin_width, signal_start=0.0, signal_end=200e-9):
+    """ The previous implementation of analyse_mean. """
+    signal_start_bin, signal_end_bin = _windows(bin_width, signal_start, signal_end)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        signal = laser_arr[signal_start_bin:signal_end_bin].mean()
+        signal_sum = laser_arr[signal_start_bin:signal_end_bin].sum()
+        if signal < 0 or signal != signal:
+            signal_data[ii] = 0.0
+            error_data[ii] = 0.0
+        else:
+            signal_data[ii] = signal
+            error_data[ii] = np.sqrt(signal_sum) / (signal_end_bin - signal_start_bin)
+    return signal_data, error_data
+
+
+def previous_mean_reference(laser_data, bin_width, signal_start=0.0, signal_end=200e-9,
+                            norm_start=300e-9, norm_end=500e-9):
+    """ The previous implementation of analyse_mean_reference. """
+    signal_start_bin, signal_end_bin, norm_start_bin, norm_end_bin = _windows(
+        bin_width, signal_start, signal_end, norm_start, norm_end)
+    signal_data = np.empty(laser_data.shape[0], dtype=float)
+    error_data = np.empty(laser_data.shape[0], dtype=float)
+    for ii, laser_arr in enumerate(laser_data):
+        tmp_data = laser_arr[norm_start_bin:norm_end_bin]
+        reference_sum = np.sum(tmp_data)
+        reference_mean = (reference_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        tmp_data = laser_arr[signal_start_bin:signal_end_bin]
+        signal_sum = np.sum(tmp_data)
+        signal_mean = (signal_sum / len(tmp_data)) if len(tmp_data) != 0 else 0.0
+        signal_data[ii] = signal_mean - reference_mean
+        error_data[ii] = signal_data[ii] * np.sqrt(1 / abs(signal_sum) + 1 / abs(reference_sum))
+    return signal_data, error_data
+
+
+def timed(function, *args, **kwargs):
+    """ Best time of REPETITIONS calls and the result of the last one. """
+    best = np.inf
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def deviation(new, previous):
+    """ Largest relative deviation of signal and error between both implementations. """
+    return max(np.max(np.abs(n - p) / np.maximum(np.abs(p), 1e-300)) for n, p in zip(new, previous))
+
+
+if __name__ == '__main__':
+    logic = SimpleNamespace(measurement_settings={},
+                            fast_counter_settings={'is_gated': True, 'bin_width': BIN_WIDTH},
+                            sampling_information={},
+                            log=logging.getLogger('pulsed_analysis_benchmark'))
+    analyzer = BasicPulseAnalyzer(logic)
+    methods = (('mean_norm', analyzer.analyse_mean_norm, previous_mean_norm),
+               ('sum', analyzer.analyse_sum, previous_sum),
+               ('mean', analyzer.analyse_mean, previous_mean),
+               ('mean_reference', analyzer.analyse_mean_reference, previous_mean_reference))
+
+    for number_of_lasers, laser_bins in SIZES:
+        laser_data = make_laser_data(number_of_lasers, laser_bins)
+        print('{0:d} lasers x {1:d} bins:'.format(number_of_lasers, laser_bins))
+        for name, method, previous_method in methods:
+            new_time, new = timed(method, laser_data)
+            previous_time, previous = timed(previous_method, laser_data, BIN_WIDTH)
+            print('  {0:15s} loop: {1:8.2f} ms, whole array: {2:7.2f} ms ({3:5.1f}x), '
+                  'largest relative deviation: {4:.1e}'.format(name, previous_time * 1e3, new_time * 1e3,
+                                                             previous_time / new_time,
+                                                             deviation(new, previous)))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of SaveLogic.save_data: save time, load time and file size of the text, npz and hdf5
+file types for data of the size of EPRoC raw data and pulsed measurements.
+
+Run from the qudi directory (hdf5 needs h5py):
+
+    python tools/save_logic_benchmark.py
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_helpers import create_module
+
+from logic.save_logic import SaveLogic
+
+
+def save_and_load(savelogic, filepath, data, filetype, fmt):
+    """ Save data with the given file type into a new file and load it again.
+
+    @return tuple(float, float, float): save time in s, load time in s, file size in MB
+    """
+    # text files are appended to, so every run needs its own file
+    filename = 'benchmark_{0}_{1:d}.dat'.format(filetype, len(os.listdir(filepath)))
+    start = time.perf_counter()
+    savelogic.save_data(dict(data), filepath=filepath, parameters={'Benchmark': filetype},
+                        filename=filename, filetype=filetype, fmt=fmt)
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if filetype == 'text':
+        filename_saved = filename
+        np.loadtxt(os.path.join(filepath, filename_saved))
+    elif filetype == 'npz':
+        filename_saved = filename[:-4] + '.npz'
+        with np.load(os.path.join(filepath, filename_saved)) as npz:
+            [npz[key] for key in npz.files]
+    else:
+        filename_saved = filename[:-4] + '.h5'
+        savelogic.load_data(filename_saved, filepath)
+    load_time = time.perf_counter() - start
+    return save_time, load_time, os.path.getsize(os.path.join(filepath, filename_saved)) / 1e6
+
+
+if __name__ == '__main__':
+    filepath = tempfile.mkdtemp()
+    savelogic = create_module(SaveLogic, 'savelogic', {'unix_data_directory': filepath,
+                                                       'log_into_daily_directory': False})
+    cases = {
+        # 1000 points, 4 channels x 100 sweeps, as saved by save_eproc_data
+        'EPRoC raw data (1000 x 401)': {'Raw data': np.random.normal(size=(1000, 401))},
+        # 500 laser pulses of 4000 bins, as saved by the pulsed measurement
+        'pulsed laser data (500 x 4000)': {'Laser data': np.random.normal(size=(500, 4000))},
+    }
+    for case, data in cases.items():
+        print(case)
+        for filetype, fmt in (('text', '%.15e'), ('text', '%.6e'), ('npz', '%.15e'), ('hdf5', '%.15e')):
+            save_time, load_time, size = save_and_load(savelogic, filepath, data, filetype, fmt)
+            print('  {0:5s} {1:6s} save {2:7.3f} s  load {3:7.3f} s  size {4:7.1f} MB'.format(
+                filetype, fmt if filetype == 'text' else '', save_time, load_time, size))
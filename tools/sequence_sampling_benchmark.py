@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the sampling of pulse block ensembles (SequenceGeneratorLogic) with and without the
+sample cache, which reuses the analog samples of elements repeated in the ensemble or sampled
+before.
+
+Run from the qudi directory:
+
+    python tools/sequence_sampling_benchmark.py
+
+Large Rabi and XY8 ensembles are generated with the predefined methods and sampled to the dummy
+pulser (without its artificial write delay), once with the cache disabled and twice with the cache
+(the second run also reuses the chunks of the first one). The sampling time, the cache hit rate
+and whether the written samples are identical are printed.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import hashlib
+import tempfile
+import time
+
+from benchmark_helpers import create_module
+
+from hardware.pulser_dummy import PulserDummy
+from logic.pulsed.sampling_functions import SampleCache
+from logic.pulsed.sequence_generator_logic import SequenceGeneratorLogic
+
+ENSEMBLES = (('rabi', {'name': 'rabi', 'tau_start': 10e-9, 'tau_step': 10e-9, 'num_of_points': 200}),
+             ('xy8_tau', {'name': 'xy8_tau', 'tau_start': 0.5e-6, 'tau_step': 0.01e-6, 'num_of_points': 50,
+                          'xy8_order': 4, 'alternating': True}))
+
+
+def capture_samples(pulser):
+    """ Replace write_waveform of the dummy pulser by a version without the artificial delay of
+    the dummy, so that the sampling time is measured. If enabled, a hash of the samples is kept.
+
+    @return dict: 'enabled': bool, hash the samples; 'hashes': waveform name -> hash object,
+                  updated with every written chunk
+    """
+    capture = {'enabled': False, 'hashes': dict()}
+
+    def write_waveform(name, analog_samples, digital_samples, is_first_chunk, is_last_chunk,
+                       total_number_of_samples):
+        if capture['enabled']:
+            digest = capture['hashes'].setdefault(name, hashlib.sha1())
+            for chnl in sorted(analog_samples):
+                digest.update(analog_samples[chnl].tobytes())
+            for chnl in sorted(digital_samples):
+                digest.update(digital_samples[chnl].tobytes())
+        samples = next(iter(analog_samples.values() or digital_samples.values()))
+        return len(samples), [name]
+
+    pulser.write_waveform = write_waveform
+    return capture
+
+
+def sample(generator, name, capture=None):
+    """ Sample the ensemble.
+
+    @return tuple: time in s, hit rate of the sample cache, hashes of the written samples if capture
+    """
+    cache = generator._sample_cache
+    hits, misses = cache.hits, cache.misses
+    if capture is not None:
+        capture['enabled'] = True
+        capture['hashes'].clear()
+    start = time.perf_counter()
+    generator.sample_pulse_block_ensemble(name)
+    total = time.perf_counter() - start
+    hits, misses = cache.hits - hits, cache.misses - misses
+    hashes = None
+    if capture is not None:
+        capture['enabled'] = False
+        hashes = {wfm: digest.hexdigest() for wfm, digest in capture['hashes'].items()}
+    return total, hits / max(hits + misses, 1), hashes
+
+
+if __name__ == '__main__':
+    pulser = create_module(PulserDummy, 'pulser_dummy')
+    generator = create_module(SequenceGeneratorLogic, 'sequencegeneratorlogic',
+                              {'assets_storage_path': tempfile.mkdtemp()},
+                              {'pulsegenerator': pulser})
+    generator.set_pulse_generator_settings(sample_rate=12e9)
+    capture = capture_samples(pulser)
+    cache = generator._sample_cache
+    no_cache = SampleCache(0)
+
+    for method, kwargs in ENSEMBLES:
+        generator.generate_predefined_sequence(method, dict(kwargs))
+        name = kwargs['name']
+        info = generator.analyze_block_ensemble(generator.get_ensemble(name))
+        print('{0}: {1:d} elements, {2:.1f} M samples at 12 GS/s'.format(
+            name, len(info['elements_length_bins']), info['number_of_samples'] / 1e6))
+
+        generator._sample_cache = no_cache
+        uncached_time, _, _ = sample(generator, name)
+        _, _, uncached = sample(generator, name, capture)
+
+        generator._sample_cache = cache
+        cache.clear()
+        first_time, first_rate, _ = sample(generator, name)
+        second_time, second_rate, _ = sample(generator, name)
+        _, _, cached = sample(generator, name, capture)
+
+        print('  without cache:           {0:7.3f} s'.format(uncached_time))
+        print('  with cache, empty:       {0:7.3f} s ({1:4.1f}x), hit rate {2:5.1f} %'.format(
+            first_time, uncached_time / first_time, 100 * first_rate))
+        print('  with cache, second time: {0:7.3f} s ({1:4.1f}x), hit rate {2:5.1f} %'.format(
+            second_time, uncached_time / second_time, 100 * second_rate))
+        print('  identical samples: {0}, cache {1:d} chunks, {2:.1f} MB'.format(
+            uncached == cached, len(cache), cache.nbytes / 1024 ** 2))
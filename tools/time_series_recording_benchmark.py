@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the time series recording: collecting the frames in a list and concatenating them at
+the stop (as TimeSeriesReaderLogic did before) against writing them to disk while they arrive with
+StreamRecorder and DecimatedOverview.
+
+Run from the qudi directory:
+
+    python tools/time_series_recording_benchmark.py
+
+Printed are the time per frame while recording, the time of the stop (concatenation or closing
+the file and computing the overview) and the peak of the allocated memory. The text file and the
+figure saved at the stop are not included.
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from core.util.stream_recorder import StreamRecorder, DecimatedOverview
+
+CHANNELS = 4
+SAMPLES_PER_FRAME = 50000
+N_FRAMES = 200
+
+
+def record_in_memory(frame):
+    """ @return tuple(float, float): time per frame and time of the stop in s """
+    recorded = list()
+    start = time.perf_counter()
+    for _ in range(N_FRAMES):
+        recorded.append(frame.copy())
+    per_frame = (time.perf_counter() - start) / N_FRAMES
+    start = time.perf_counter()
+    data = np.concatenate(recorded, axis=1)
+    return per_frame, time.perf_counter() - start
+
+
+def record_to_disk(frame, directory):
+    """ @return tuple(float, float): time per frame and time of the stop in s """
+    recorder = StreamRecorder(directory, 'data_trace', ['ch{0:d}'.format(i) for i in range(CHANNELS)], 1e6,
+                              max_file_size=2**28)
+    overview = DecimatedOverview(CHANNELS)
+    start = time.perf_counter()
+    for _ in range(N_FRAMES):
+        recorder.write(frame)
+        overview.add(frame)
+    per_frame = (time.perf_counter() - start) / N_FRAMES
+    start = time.perf_counter()
+    recorder.close()
+    overview.get_envelope(1e6)
+    return per_frame, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    frame = np.random.normal(size=(CHANNELS, SAMPLES_PER_FRAME))
+    size = frame.nbytes * N_FRAMES / 2**20
+    print('{0} frames of {1} channels x {2} samples ({3:.0f} MB):'.format(N_FRAMES, CHANNELS, SAMPLES_PER_FRAME,
+                                                                         size))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, record in (('list + np.concatenate', record_in_memory),
+                             ('StreamRecorder', lambda data: record_to_disk(data, directory))):
+            tracemalloc.start()
+            per_frame, stop_time = record(frame)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('  {0:22s}: {1:6.2f} ms/frame ({2:6.0f} MB/s), stop {3:7.3f} s, {4:7.1f} MB allocated (peak)'
+                  ''.format(name, per_frame * 1e3, frame.nbytes / per_frame / 2**20, stop_time, peak / 2**20))
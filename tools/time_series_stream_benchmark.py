@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the frame processing of TimeSeriesReaderLogic: np.roll of the whole trace and
+np.convolve of the moving average (as the logic did before) against the preallocated circular trace
+buffer with the moving average from cumulative sums.
+
+Run from the qudi directory:
+
+    python tools/time_series_stream_benchmark.py
+
+Printed are the processing time per frame and the peak of the allocated memory for both, whether both give the
+same traces, and the sustained rate of the logic streaming from data_instream_dummy at MHz data
+rates (the dummy generates the samples when they are read, which is included in the loop time).
+
+Qudi is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Qudi is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Qudi. If not, see <http://www.gnu.org/licenses/>.
+
+Copyright (c) the Qudi Developers. See the COPYRIGHT.txt file at the
+top-level directory of this distribution and at <https://github.com/Ulm-IQO/qudi/>
+"""
+
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmark_helpers import create_module, process_events_until
+
+from hardware.data_instream_dummy import InStreamDummy
+from logic.save_logic import SaveLogic
+from logic.time_series_reader_logic import TimeSeriesReaderLogic
+
+DATA_RATE = 1e6
+TRACE_WINDOW = 6
+AVERAGE_WIDTH = 9
+FRAME_RATE = 20
+N_FRAMES = 40
+
+
+class RollingTrace:
+    """ The former frame processing of TimeSeriesReaderLogic. """
+
+    def __init__(self, channels, window_size, width):
+        self.trace = np.zeros([channels, window_size + width // 2])
+        self.averaged = np.zeros([channels, window_size - width // 2])
+        self.filter = np.full(width, 1 / width)
+
+    def process(self, data):
+        data = data[:, -self.trace.shape[1]:]
+        new_samples = data.shape[1]
+        self.trace = np.roll(self.trace, -new_samples, axis=1)
+        self.trace[:, -new_samples:] = data
+        self.averaged = np.roll(self.averaged, -new_samples, axis=1)
+        offset = new_samples + len(self.filter) - 1
+        for i in range(self.trace.shape[0]):
+            self.averaged[i, -new_samples:] = np.convolve(self.trace[i, -offset:], self.filter, mode='valid')
+
+
+def create_logic(max_frame_rate):
+    streamer = create_module(InStreamDummy, 'instreamer', {'digital_channels': ['digital 1'],
+                                                          'analog_channels': ['analog 1'],
+                                                          'digital_event_rates': [1e5],
+                                                          'analog_voltage_ranges': [5]})
+    savelogic = create_module(SaveLogic, 'savelogic', {'unix_data_directory': tempfile.mkdtemp(),
+                                                       'log_into_daily_directory': False})
+    return create_module(TimeSeriesReaderLogic, 'timeserieslogic',
+                         {'max_frame_rate': max_frame_rate, 'calc_digital_freq': False},
+                         {'_streamer_con': streamer, '_savelogic_con': savelogic})
+
+
+def time_frames(process, frames):
+    """ @return tuple(float, int): mean time per frame in s, peak of the allocated memory in bytes """
+    tracemalloc.start()
+    for frame in frames:
+        process(frame)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # time without tracemalloc overhead
+    start = time.perf_counter()
+    for frame in frames:
+        process(frame)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(frames), peak
+
+
+def compare_processing(logic):
+    logic.configure_settings(data_rate=DATA_RATE, trace_window_size=TRACE_WINDOW,
+                             moving_average_width=AVERAGE_WIDTH,
+                             averaged_channels=logic.active_channel_names)
+    samples_per_frame = int(DATA_RATE / FRAME_RATE)
+    frames = [np.random.normal(size=(2, samples_per_frame)) for _ in range(N_FRAMES)]
+    rolling = RollingTrace(2, logic.trace_window_size_samples, AVERAGE_WIDTH)
+    print('Frame processing, {0:.0e} Hz, {1} s window, {2} samples per frame, 2 channels:'.format(
+        DATA_RATE, TRACE_WINDOW, samples_per_frame))
+    for name, process in (('np.roll + np.convolve', rolling.process),
+                          ('TraceBuffer + cumsum', logic._process_trace_data)):
+        per_frame, peak = time_frames(process, frames)
+        print('  {0:22s}: {1:8.2f} ms/frame, {2:8.1f} MB allocated (peak)'.format(name, per_frame * 1e3,
+                                                                             peak / 2**20))
+    times, data = logic.trace_data
+    _, averaged = logic.averaged_trace_data
+    trace = np.array([data[ch] for ch in logic.active_channel_names])
+    trace_averaged = np.array([averaged[ch] for ch in logic.averaged_channel_names])
+    print('  same trace: {0}, max deviation of the moving average: {1:.1e}'.format(
+        np.array_equal(trace, rolling.trace[:, :times.size]), np.max(np.abs(trace_averaged - rolling.averaged))))
+
+
+def sustained_rate(logic, data_rate, duration=3):
+    """ @return float: fraction of the samples of the stream which were processed """
+    logic.configure_settings(data_rate=data_rate, trace_window_size=TRACE_WINDOW,
+                             moving_average_width=AVERAGE_WIDTH)
+    logic.start_reading()
+    start = time.perf_counter()
+    first_total = logic._trace_data.total
+    process_events_until(lambda: time.perf_counter() - start > duration)
+    processed = logic._trace_data.total - first_total
+    elapsed = time.perf_counter() - start
+    logic.stop_reading()
+    process_events_until(lambda: logic.module_state() != 'locked')
+    return processed / (data_rate * elapsed)
+
+
+if __name__ == '__main__':
+    logic = create_logic(FRAME_RATE)
+    compare_processing(logic)
+    print('Streaming from data_instream_dummy (2 channels, {0} Hz frames):'.format(FRAME_RATE))
+    for data_rate in (1e6, 2e6, 5e6):
+        print('  {0:.0e} Hz: {1:6.1%} of the samples processed'.format(data_rate, sustained_rate(logic, data_rate)))